@@ -0,0 +1,230 @@
+import math
+from decimal import Decimal
+from typing import Optional
+from sql_safety import tokenize
+from query_guard import strip_statement
+
+# 可以按抽样比例缩放的聚合
+SCALABLE_AGGREGATES = {"COUNT", "SUM", "AVG"}
+
+# 其他聚合(及窗口函数)无法从样本无偏估计, 出现时回退到精确执行
+OTHER_AGGREGATES = {
+    "MIN", "MAX", "STRING_AGG", "ARRAY_AGG", "JSON_AGG", "JSONB_AGG", "BOOL_AND", "BOOL_OR",
+    "EVERY", "BIT_AND", "BIT_OR", "STDDEV", "STDDEV_POP", "STDDEV_SAMP", "VARIANCE",
+    "VAR_POP", "VAR_SAMP", "PERCENTILE_CONT", "PERCENTILE_DISC", "MODE", "CORR",
+    "COVAR_POP", "COVAR_SAMP", "XMLAGG", "JSON_OBJECT_AGG", "JSONB_OBJECT_AGG",
+}
+
+CLAUSES = {"SELECT", "FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "OFFSET",
+           "FETCH", "UNION", "INTERSECT", "EXCEPT", "WINDOW", "FOR"}
+UNSUPPORTED_CLAUSES = {"HAVING", "UNION", "INTERSECT", "EXCEPT", "WINDOW", "FOR"}
+
+SAMPLE_METHODS = {"bernoulli": "BERNOULLI", "system": "SYSTEM"}
+
+Z_95 = 1.96
+
+
+class UnsupportedQuery(Exception):
+    """查询形状不适合近似计算"""
+
+
+def _significant(tokens: list) -> list:
+    return [(kind, text) for kind, text in tokens if kind != "ws"]
+
+
+def _split_top_level(tokens: list, separator: str = ",") -> list[list]:
+    parts, current, depth = [], [], 0
+    for kind, text in tokens:
+        if kind == "op" and text == "(":
+            depth += 1
+        elif kind == "op" and text == ")":
+            depth -= 1
+        if depth == 0 and kind == "op" and text == separator:
+            parts.append(current)
+            current = []
+        else:
+            current.append((kind, text))
+    parts.append(current)
+    return parts
+
+
+def _text(tokens: list) -> str:
+    return "".join(text for _, text in tokens).strip()
+
+
+class _Aggregate:
+    def __init__(self, position: int, function: str, argument: str):
+        self.position = position
+        self.function = function
+        self.argument = argument
+        self.helpers: list[str] = []
+
+
+class ApproximatePlan:
+    """抽样改写后的查询, 以及把样本结果还原为估计值和置信区间的方法"""
+
+    def __init__(self, sql: str, table: str, fraction: float, method: str,
+                 aggregates: list[_Aggregate], helper_count: int):
+        self.sql = sql
+        self.table = table
+        self.fraction = fraction
+        self.method = method
+        self.aggregates = aggregates
+        self.helper_count = helper_count
+
+    def _estimate(self, aggregate: _Aggregate, row: list, helpers: dict) -> tuple:
+        f = self.fraction
+        value = row[aggregate.position]
+        if value is None:
+            return None, None
+        value = float(value) if isinstance(value, Decimal) else value
+        if aggregate.function == "COUNT":
+            # Bernoulli抽样下 n ~ Binomial(N, f): Var(n/f) = N(1-f)/f ≈ n(1-f)/f²
+            return round(value / f), math.sqrt(value * (1 - f)) / f
+        if aggregate.function == "SUM":
+            sum_squares = float(helpers[aggregate.helpers[0]] or 0)
+            return value / f, math.sqrt((1 - f) * sum_squares) / f
+        # AVG: 比率估计, 标准误差约为 s/√n
+        variance, count = helpers[aggregate.helpers[0]], helpers[aggregate.helpers[1]]
+        if not count or variance is None:
+            return value, None
+        return value, math.sqrt(float(variance) / count)
+
+    def apply(self, columns: list[str], rows: list) -> tuple[list[str], list[list]]:
+        """缩放COUNT/SUM, 为每个聚合列追加95%置信区间列, 去掉辅助列"""
+        visible = len(columns) - self.helper_count
+        out_columns = columns[:visible] + [f"{columns[a.position]}_ci95" for a in self.aggregates]
+        out_rows = []
+        for row in rows:
+            row = list(row)
+            helpers = dict(zip(columns[visible:], row[visible:]))
+            intervals = []
+            for aggregate in self.aggregates:
+                estimate, error = self._estimate(aggregate, row, helpers)
+                row[aggregate.position] = estimate
+                if estimate is None or error is None:
+                    intervals.append(None)
+                else:
+                    low, high = estimate - Z_95 * error, estimate + Z_95 * error
+                    if aggregate.function == "COUNT":
+                        low = max(low, 0)
+                    intervals.append([round(low, 4), round(high, 4)])
+            out_rows.append(row[:visible] + intervals)
+        return out_columns, out_rows
+
+
+def rewrite(sql: str, sample_percent: float, method: str = "bernoulli") -> ApproximatePlan:
+    """把单表聚合查询改写为 TABLESAMPLE 抽样查询; 不支持的形状抛出 UnsupportedQuery"""
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"不支持的抽样方法:{method}")
+    if not 0 < sample_percent < 100:
+        raise UnsupportedQuery("抽样比例需在 (0, 100) 之间")
+
+    tokens = list(tokenize(strip_statement(sql)))
+
+    # 找出顶层子句的位置, 同时排除子查询、JOIN、DISTINCT和窗口函数
+    clauses = []
+    depth = 0
+    for index, (kind, text) in enumerate(tokens):
+        if kind == "op" and text == "(":
+            depth += 1
+        elif kind == "op" and text == ")":
+            depth -= 1
+        elif kind == "word":
+            word = text.upper()
+            if word == "SELECT" and depth > 0:
+                raise UnsupportedQuery("包含子查询")
+            if word in ("JOIN", "DISTINCT", "OVER", "LATERAL", "TABLESAMPLE"):
+                raise UnsupportedQuery(f"包含{word}")
+            if depth == 0 and word in CLAUSES:
+                if word in UNSUPPORTED_CLAUSES:
+                    raise UnsupportedQuery(f"包含{word}子句")
+                clauses.append((word, index))
+
+    names = [word for word, _ in clauses]
+    if not names or names[0] != "SELECT" or names.count("FROM") != 1 or names.count("SELECT") != 1:
+        raise UnsupportedQuery("不是单表SELECT查询")
+    from_at = names.index("FROM")
+    select_start = clauses[0][1] + 1
+    from_index = clauses[from_at][1]
+    from_end = clauses[from_at + 1][1] if from_at + 1 < len(clauses) else len(tokens)
+
+    # FROM 只能是单个表(可带别名)
+    from_tokens = tokens[from_index + 1:from_end]
+    source = _significant(from_tokens)
+    if len(source) >= 3 and source[1] == ("op", "."):
+        table_token, alias = source[2], source[3:]
+    else:
+        table_token, alias = (source[0], source[1:]) if source else (None, [])
+    if (table_token is None or table_token[0] not in ("word", "ident")
+            or len(alias) > 2 or any(kind not in ("word", "ident") for kind, _ in alias)
+            or (len(alias) == 2 and alias[0][1].upper() != "AS")):
+        raise UnsupportedQuery("FROM 只支持单个表")
+    table = table_token[1]
+    table = table[1:-1].replace('""', '"') if table_token[0] == "ident" else table.lower()
+
+    # 拆分SELECT列表, 识别可缩放的聚合
+    aggregates = []
+    helpers = []
+    items = _split_top_level(tokens[select_start:from_index])
+    for position, item in enumerate(items):
+        significant = _significant(item)
+        calls = [
+            text.upper() for i, (kind, text) in enumerate(significant)
+            if kind == "word" and i + 1 < len(significant) and significant[i + 1] == ("op", "(")
+            and text.upper() in SCALABLE_AGGREGATES | OTHER_AGGREGATES
+        ]
+        if not calls:
+            continue
+        function = calls[0]
+        if function not in SCALABLE_AGGREGATES:
+            raise UnsupportedQuery(f"聚合函数{function}无法从样本估计")
+        # 只支持 AGG(参数) [AS] [别名] 这种形式
+        depth, close = 0, None
+        for i, (kind, text) in enumerate(significant[1:], start=1):
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+                if depth == 0:
+                    close = i
+                    break
+        tail = significant[close + 1:] if close is not None else None
+        if (len(calls) > 1 or significant[0][1].upper() != function or tail is None
+                or len(tail) > 2 or (len(tail) == 2 and tail[0][1].upper() != "AS")
+                or any(kind not in ("word", "ident") for kind, _ in tail)):
+            raise UnsupportedQuery("聚合函数只能单独出现在SELECT列表中")
+        argument = _text(significant[2:close])
+        aggregate = _Aggregate(position, function, argument)
+        if function == "SUM":
+            aggregate.helpers = [f"__approx_{position}_sumsq"]
+            helpers.append(f"sum(({argument})::float8 ^ 2) AS {aggregate.helpers[0]}")
+        elif function == "AVG":
+            aggregate.helpers = [f"__approx_{position}_var", f"__approx_{position}_n"]
+            helpers.append(f"var_samp(({argument})::float8) AS {aggregate.helpers[0]}")
+            helpers.append(f"count({argument}) AS {aggregate.helpers[1]}")
+        aggregates.append(aggregate)
+
+    if not aggregates:
+        raise UnsupportedQuery("没有可缩放的聚合(COUNT/SUM/AVG)")
+
+    sampled_sql = (
+        _text(tokens[:from_index])
+        + (", " + ", ".join(helpers) if helpers else "")
+        + f" FROM {_text(from_tokens)} TABLESAMPLE {SAMPLE_METHODS[method]} ({float(sample_percent)}) "
+        + _text(tokens[from_end:])
+    ).strip()
+    return ApproximatePlan(sampled_sql, table, sample_percent / 100, method,
+                           aggregates, len(helpers))
+
+
+def approximate_note(plan: ApproximatePlan, row_estimate: Optional[int]) -> str:
+    note = (
+        f"≈ 近似结果: 对表 {plan.table} 按 {SAMPLE_METHODS[plan.method]} 抽样"
+        f"{plan.fraction * 100:g}%, COUNT/SUM已按比例放大, *_ci95列为95%置信区间"
+    )
+    if plan.method == "system":
+        note += "(SYSTEM按数据块抽样, 数据分布不均时区间偏窄)"
+    if row_estimate:
+        note += f", 表约{row_estimate}行"
+    return note
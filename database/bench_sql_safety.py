@@ -0,0 +1,38 @@
+"""SQLSafetyChecker 微基准: 统计每秒可完成的检查次数
+
+用法: python bench_sql_safety.py [次数]
+"""
+import sys
+import time
+from sql_safety import SQLSafetyChecker, _check_cached
+
+STATEMENTS = [
+    "SELECT * FROM orders WHERE status = 'completed'",
+    "SELECT region, SUM(amount) FROM orders GROUP BY region ORDER BY 2 DESC LIMIT 5",
+    "SELECT date_trunc('month', order_date) AS m, SUM(amount) FROM orders GROUP BY 1",
+    "SELECT * FROM orders WHERE note = 'a -- b # c; drop'",
+    "SELECT * FROM users; DROP TABLE users;",
+    "DELETE FROM orders",
+]
+
+
+def bench(label: str, count: int, make_sql, clear_cache: bool):
+    _check_cached.cache_clear()
+    start = time.perf_counter()
+    for i in range(count):
+        if clear_cache:
+            _check_cached.cache_clear()
+        SQLSafetyChecker.check(make_sql(i))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {count / elapsed:>12,.0f} 次/秒  ({elapsed * 1e6 / count:.2f} µs/次)")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    pick = lambda i: STATEMENTS[i % len(STATEMENTS)]
+    # 无缓存: 每次都完整扫描
+    bench("未命中缓存(完整扫描)", count, pick, clear_cache=True)
+    # 重复语句: 命中缓存
+    bench("重复语句(命中缓存)", count, pick, clear_cache=False)
+    # 每条语句都不同(条件值变化), 缓存无法命中
+    bench("不同语句(缓存淘汰)", count, lambda i: f"{pick(i)} AND id > {i}", clear_cache=False)
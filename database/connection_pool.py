@@ -0,0 +1,228 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """等待空闲连接超时"""
+
+
+class PooledConnection:
+    """连接池中的一个连接及其使用元数据"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        # 连接级别的附加状态(如预备语句缓存), 随连接一起销毁
+        self.state: dict = {}
+
+
+class ConnectionPool:
+    """有界PostgreSQL连接池
+
+    - min_size/max_size: 最少保留/最多创建的连接数
+    - idle_timeout: 超过min_size的空闲连接闲置多久(秒)后关闭
+    - health_check_interval: 连接闲置超过该秒数, 借出前先执行 SELECT 1 探活
+    - max_uses: 连接被借出N次后回收重建(0表示不限)
+    - acquire_timeout: 等待空闲连接的最长时间(秒)
+    """
+
+    def __init__(self, connect_kwargs: dict, min_size: int = 1, max_size: int = 10,
+                 idle_timeout: float = 300.0, health_check_interval: float = 5.0,
+                 max_uses: int = 1000, acquire_timeout: float = 30.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"连接池大小配置无效: min={min_size}, max={max_size}")
+        self.connect_kwargs = connect_kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.max_uses = max_uses
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: list[PooledConnection] = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+        }
+
+    def _connect(self) -> PooledConnection:
+        """新建一个物理连接"""
+        conn = psycopg2.connect(**self.connect_kwargs)
+        with self._cond:
+            self._stats["created"] += 1
+        return PooledConnection(conn)
+
+    def _close_quietly(self, pooled: PooledConnection):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, pooled: PooledConnection) -> bool:
+        """借出前的健康检查"""
+        conn = pooled.conn
+        if conn.closed:
+            return False
+        if self.max_uses and pooled.uses >= self.max_uses:
+            return False
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    def _reap_idle(self):
+        """关闭超出min_size且闲置过久的连接(需持有锁)"""
+        now = time.monotonic()
+        keep = []
+        for pooled in self._idle:
+            if (self._size > self.min_size
+                    and now - pooled.last_used > self.idle_timeout):
+                self._close_quietly(pooled)
+                self._size -= 1
+                self._stats["discarded"] += 1
+            else:
+                keep.append(pooled)
+        self._idle = keep
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """借出一个连接, 无空闲连接且已达上限时阻塞等待"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited_since = None
+
+        while True:
+            pooled = None
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("连接池已关闭")
+                self._reap_idle()
+                if self._idle:
+                    pooled = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    if waited_since is None:
+                        waited_since = time.monotonic()
+                        self._stats["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"等待数据库连接超时({timeout}秒)")
+                    self._cond.wait(remaining)
+                    continue
+
+            if create:
+                try:
+                    pooled = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(pooled):
+                self._close_quietly(pooled)
+                with self._cond:
+                    self._size -= 1
+                    self._stats["discarded"] += 1
+                continue
+
+            with self._cond:
+                if waited_since is not None:
+                    waited = time.monotonic() - waited_since
+                    self._stats["wait_time_total"] += waited
+                    self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+                self._stats["checkouts"] += 1
+            pooled.uses += 1
+            return pooled
+
+    def release(self, pooled: PooledConnection, discard: bool = False):
+        """归还连接; 连接异常或 discard=True 时直接关闭"""
+        conn = pooled.conn
+        if not discard and not conn.closed:
+            try:
+                # 回滚未结束的事务, 保证下一个使用者拿到干净的连接
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        with self._cond:
+            if discard or self._closed:
+                self._close_quietly(pooled)
+                self._size -= 1
+                self._stats["discarded"] += 1
+            else:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    @staticmethod
+    def should_discard(error: BaseException) -> bool:
+        """连接级错误需要丢弃连接; 被取消的查询(QueryCanceledError)回滚后可继续复用"""
+        return (isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+                and not isinstance(error, extensions.QueryCanceledError))
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """以上下文管理器方式借出连接, 出现连接级错误时丢弃该连接"""
+        pooled = self.acquire(timeout)
+        discard = False
+        try:
+            yield pooled
+        except BaseException as e:
+            discard = self.should_discard(e)
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def stats(self) -> dict:
+        """连接池统计信息"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            })
+        checkouts = stats["checkouts"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / stats["waits"] if stats["waits"] else 0.0
+        stats["wait_ratio"] = stats["waits"] / checkouts if checkouts else 0.0
+        return stats
+
+    def close(self):
+        """关闭所有空闲连接, 使用中的连接归还时关闭"""
+        with self._cond:
+            self._closed = True
+            for pooled in self._idle:
+                self._close_quietly(pooled)
+                self._size -= 1
+            self._idle = []
+            self._cond.notify_all()
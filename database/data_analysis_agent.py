@@ -22,12 +22,50 @@ class DataAnalysisAgent:
         
         # 执行查询工具
         tools.append(StructuredTool.from_function(
-            coroutine=lambda sql, limit=100: self.mcp_client.call_tool("execute_query", {"sql": sql, "limit": limit}),
-            func=lambda sql, limit=100: asyncio.run(
-                self.mcp_client.call_tool("execute_query", {"sql": sql, "limit": limit})
+            coroutine=lambda sql, params=None, limit=100, format="columnar", approximate=False: self.mcp_client.call_tool(
+                "execute_query", {"sql": sql, "params": params, "limit": limit, "format": format,
+                                  "approximate": approximate}
+            ),
+            func=lambda sql, params=None, limit=100, format="columnar", approximate=False: asyncio.run(
+                self.mcp_client.call_tool(
+                    "execute_query", {"sql": sql, "params": params, "limit": limit, "format": format,
+                                      "approximate": approximate}
+                )
             ),
             name="execute_query",
-            description="执行SQL查询并返回结果(仅支持SELECT)"
+            description="执行SQL查询并返回结果(仅支持SELECT); 条件值用 $1, $2 占位并通过params传入; format可选columnar(默认)/json/csv/markdown; 大表上的COUNT/SUM/AVG探索性汇总可设approximate=true抽样估计"
+        ))
+        
+        # 批量查询工具
+        tools.append(StructuredTool.from_function(
+            coroutine=lambda queries, limit=100, format="columnar", snapshot=False: self.mcp_client.call_tool(
+                "execute_queries",
+                {"queries": queries, "limit": limit, "format": format, "snapshot": snapshot}
+            ),
+            func=lambda queries, limit=100, format="columnar", snapshot=False: asyncio.run(
+                self.mcp_client.call_tool(
+                    "execute_queries",
+                    {"queries": queries, "limit": limit, "format": format, "snapshot": snapshot}
+                )
+            ),
+            name="execute_queries",
+            description="一次并发执行多条独立的SELECT查询并返回全部结果; queries为SQL字符串或{sql, params, label}列表; 需要各项结果彼此一致时设snapshot=true"
+        ))
+        
+        # 导出工具
+        tools.append(StructuredTool.from_function(
+            coroutine=lambda sql, params=None, format="csv", filename=None: self.mcp_client.call_tool(
+                "export_query",
+                {"sql": sql, "params": params, "format": format, "filename": filename}
+            ),
+            func=lambda sql, params=None, format="csv", filename=None: asyncio.run(
+                self.mcp_client.call_tool(
+                    "export_query",
+                    {"sql": sql, "params": params, "format": format, "filename": filename}
+                )
+            ),
+            name="export_query",
+            description="把查询结果导出为服务端文件(format可选csv/csv.gz/parquet), 只返回路径、行数和大小; 用户需要完整数据或明细下载时使用, 不要用execute_query读取大量明细"
         ))
         
         # 获取表结构工具
@@ -40,6 +78,32 @@ class DataAnalysisAgent:
             description="获取表的列名和数据类型"
         ))
         
+        # 批量获取表结构工具
+        tools.append(StructuredTool.from_function(
+            coroutine=lambda table_names=None: self.mcp_client.call_tool("describe_tables", {"table_names": table_names}),
+            func=lambda table_names=None: asyncio.run(
+                self.mcp_client.call_tool("describe_tables", {"table_names": table_names})
+            ),
+            name="describe_tables",
+            description="一次获取多张表(默认所有表)的列名、数据类型、主键和估计行数"
+        ))
+        
+        # 表概况统计工具
+        tools.append(StructuredTool.from_function(
+            coroutine=lambda table_name, columns=None, sample_percent=None: self.mcp_client.call_tool(
+                "profile_table",
+                {"table_name": table_name, "columns": columns, "sample_percent": sample_percent}
+            ),
+            func=lambda table_name, columns=None, sample_percent=None: asyncio.run(
+                self.mcp_client.call_tool(
+                    "profile_table",
+                    {"table_name": table_name, "columns": columns, "sample_percent": sample_percent}
+                )
+            ),
+            name="profile_table",
+            description="统计表各列的空值比例、不同值个数、范围、高频取值和数值分布, 适合回答分布类问题"
+        ))
+        
         # 列出所有表工具
         tools.append(StructuredTool.from_function(
             coroutine=lambda: self.mcp_client.call_tool("list_tables", {}),
@@ -58,10 +122,11 @@ class DataAnalysisAgent:
         
         prompt = ChatPromptTemplate.from_messages([
             ("system", """你是一个数据分析专家。用户会用自然语言提问,你需要:
-1. 使用list_tables了解有哪些表
-2. 使用get_table_schema了解表结构
-3. 编写SQL查询获取数据
-4. 分析数据并用通俗语言解释结果
+1. 使用describe_tables一次了解所有表及其结构
+2. 只需要单张表时使用get_table_schema
+3. 分布、构成类问题优先使用profile_table, 其他问题编写SQL查询获取数据
+4. 报表需要多个互不依赖的指标时, 用execute_queries一次取回
+5. 分析数据并用通俗语言解释结果
 
 注意:只能使用SELECT查询,不能修改数据。"""),
             ("human", "{input}"),
@@ -1,28 +1,180 @@
 import asyncio
+import contextlib
 import json
+import os
 import sys
-from typing import Any, Sequence
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Sequence
 from mcp.server import Server
 from mcp.types import Tool, TextContent
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from sql_safety import SQLSafetyChecker
+from connection_pool import ConnectionPool, PooledConnection
+from streaming import CursorRegistry, OpenCursor
+from schema_cache import SchemaCache
+from result_cache import ResultCache, identifiers
+from result_format import FORMATS, format_rows, size_note
+from query_guard import QueryGuard, QueryRejected, format_plan, strip_statement, wrap_limit
+from prepared import PreparedStatements, is_stale_plan_error, pyformat_params, to_pyformat
+from profiling import build_profile_query, format_profile, parse_profile
+from approximate import SAMPLE_METHODS, UnsupportedQuery, approximate_note, rewrite
+from mirror import MirrorUnavailable, create_mirror
+from export import EXPORT_FORMATS, copy_query, export_path
+
+# execute_query 可选的执行位置
+BACKENDS = ("postgres", "auto", "mirror")
+
+class _QueryHandle:
+    """记录工作线程中正在使用的连接, 用于取消后端查询"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.conn = None
+        self.cancelled = False
+    
+    def attach(self, conn):
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.conn = conn
+            return True
+    
+    def detach(self):
+        with self._lock:
+            self.conn = None
+    
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self.conn is not None:
+                # 向后端发送取消请求, 正在执行的语句会抛出 QueryCanceledError
+                with contextlib.suppress(Exception):
+                    self.conn.cancel()
 
 class DatabaseMCPServer:
-    def __init__(self, db_config: dict):
+    def __init__(self, db_config: dict, pool_config: dict | None = None,
+                 max_concurrency: int | None = None, max_open_cursors: int = 4,
+                 cursor_idle_timeout: float = 120.0, schema_cache_ttl: float = 300.0,
+                 result_cache_config: dict | None = None,
+                 query_guard_config: dict | None = None,
+                 max_prepared_per_connection: int = 64,
+                 profile_sample_rows: int = 1_000_000,
+                 approximate_sample_percent: float = 1.0,
+                 approximate_min_rows: int = 100_000,
+                 max_batch_queries: int = 20,
+                 mirror_config: dict | None = None,
+                 export_dir: str | None = None):
         self.server = Server("database-mcp-server")
         self.db_config = db_config
+        # 所有工具共享同一个连接池, 避免每次调用都重新建立连接
+        self.pool = ConnectionPool(
+            {
+                'host': self.db_config['host'],
+                'port': self.db_config['port'],
+                'database': self.db_config['database'],
+                'user': self.db_config['user'],
+                'password': self.db_config['password']
+            },
+            **(pool_config or {})
+        )
+        # 阻塞的psycopg2调用放到工作线程执行, 并发上限默认与连接池大小一致
+        self.max_concurrency = max_concurrency or self.pool.max_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="db-worker"
+        )
+        self._query_slots = asyncio.Semaphore(self.max_concurrency)
+        # 分页查询的服务端游标, 每个游标在读完前占用一条连接
+        self.cursors = CursorRegistry(
+            self.pool,
+            max_open=max_open_cursors,
+            idle_timeout=cursor_idle_timeout
+        )
+        # 表结构缓存, 通过比较系统表变更标记发现DDL
+        self.schema_cache = SchemaCache(ttl=schema_cache_ttl)
+        # 查询结果缓存(可选), 调用时传 cache=true 才会使用
+        self.result_cache = (
+            ResultCache(**result_cache_config) if result_cache_config is not None else None
+        )
+        # 执行计划预检查和语句超时
+        self.query_guard = QueryGuard(**(query_guard_config or {}))
+        # 每个连接上的预备语句缓存, 相同形状的查询跳过解析和规划
+        self.prepared = PreparedStatements(max_prepared_per_connection)
+        # profile_table 在估计行数超过该值且未指定抽样比例时自动抽样
+        self.profile_sample_rows = profile_sample_rows
+        # 近似查询的默认抽样比例; 估计行数低于 approximate_min_rows 的表直接精确执行
+        self.approximate_sample_percent = approximate_sample_percent
+        self.approximate_min_rows = approximate_min_rows
+        # execute_queries 单次最多包含的语句数
+        self.max_batch_queries = max_batch_queries
+        # export_query 的输出目录, 不配置时不允许导出
+        self.export_dir = export_dir
+        if export_dir is not None:
+            os.makedirs(export_dir, exist_ok=True)
+        # 本地列式镜像(可选), 查询显式指定 backend=auto/mirror 时才在镜像上执行, 不占用数据库
+        self.mirror = None
+        if mirror_config is not None:
+            try:
+                self.mirror = create_mirror(mirror_config)
+            except MirrorUnavailable as e:
+                print(f"本地镜像未启用: {e}", file=sys.stderr)
         self._register_handlers()
     
-    def _get_connection(self):
-        """获取数据库连接"""
-        return psycopg2.connect(
-            host=self.db_config['host'],
-            port=self.db_config['port'],
-            database=self.db_config['database'],
-            user=self.db_config['user'],
-            password=self.db_config['password']
-        )
+    def _run_attached(self, fn: Callable[[PooledConnection], Any],
+                      handle: _QueryHandle, pooled: PooledConnection) -> Any:
+        if not handle.attach(pooled.conn):
+            raise asyncio.CancelledError()
+        try:
+            return fn(pooled)
+        finally:
+            handle.detach()
+    
+    def _run_with_connection(self, fn: Callable[[PooledConnection], Any],
+                             handle: _QueryHandle,
+                             pooled: PooledConnection | None = None,
+                             keep: bool = False) -> Any:
+        """(工作线程)借出连接并执行fn
+        
+        - pooled: 使用调用方已持有的连接(如分页游标), 不负责归还
+        - keep: fn成功后连接继续由fn的结果持有, 仅在出错时归还
+        """
+        if pooled is not None:
+            return self._run_attached(fn, handle, pooled)
+        if not keep:
+            with self.pool.connection() as pooled:
+                return self._run_attached(fn, handle, pooled)
+        pooled = self.pool.acquire()
+        try:
+            return self._run_attached(fn, handle, pooled)
+        except BaseException as e:
+            self.pool.release(pooled, discard=ConnectionPool.should_discard(e))
+            raise
+    
+    async def _run_db(self, fn: Callable[[PooledConnection], Any],
+                      pooled: PooledConnection | None = None,
+                      keep: bool = False) -> Any:
+        """在工作线程池中执行数据库操作, 不阻塞事件循环
+        
+        调用被取消时会同时取消后端正在执行的查询, 并等待连接归还连接池
+        """
+        async with self._query_slots:
+            handle = _QueryHandle()
+            future = asyncio.wrap_future(
+                self._executor.submit(self._run_with_connection, fn, handle, pooled, keep)
+            )
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                handle.cancel()
+                with contextlib.suppress(BaseException):
+                    await future
+                raise
+    
+    async def _run_local(self, fn: Callable[[], Any]) -> Any:
+        """在工作线程池中执行不需要数据库连接的阻塞操作(如本地镜像查询)"""
+        async with self._query_slots:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn)
     
     def _is_safe_query(self, sql: str) -> bool:
         """SQL安全检查 - 使用SQLSafetyChecker"""
@@ -43,17 +195,189 @@ class DatabaseMCPServer:
                         "properties": {
                             "sql": {
                                 "type": "string",
-                                "description": "SQL查询语句"
+                                "description": "SQL查询语句, 可使用 $1, $2 ... 作为参数占位符"
+                            },
+                            "params": {
+                                "type": "array",
+                                "description": "占位符 $1, $2 ... 对应的参数值, 由服务端绑定"
                             },
                             "limit": {
                                 "type": "integer",
                                 "description": "限制返回行数(默认100)",
                                 "default": 100
+                            },
+                            "format": {
+                                "type": "string",
+                                "enum": list(FORMATS),
+                                "description": "输出格式: json(每行一个对象), columnar(列名只出现一次, 最省token), csv, markdown",
+                                "default": "json"
+                            },
+                            "cache": {
+                                "type": "boolean",
+                                "description": "使用结果缓存: 相同查询且相关表未被修改时直接返回缓存结果",
+                                "default": False
+                            },
+                            "explain": {
+                                "type": "boolean",
+                                "description": "执行前先检查执行计划, 成本或行数超过阈值时拒绝/警告并返回计划摘要(默认由服务端配置)"
+                            },
+                            "timeout_ms": {
+                                "type": "integer",
+                                "description": "本次查询的语句超时(毫秒), 不超过服务端上限"
+                            },
+                            "approximate": {
+                                "type": "boolean",
+                                "description": "近似模式: 对单表COUNT/SUM/AVG聚合查询按TABLESAMPLE抽样执行, 放大结果并返回95%置信区间; 不支持的查询自动精确执行",
+                                "default": False
+                            },
+                            "sample_percent": {
+                                "type": "number",
+                                "description": "近似模式的抽样比例(0-100), 默认由服务端配置"
+                            },
+                            "sample_method": {
+                                "type": "string",
+                                "enum": list(SAMPLE_METHODS),
+                                "description": "近似模式的抽样方法: bernoulli(逐行, 更准确) 或 system(按数据块, 更快)",
+                                "default": "bernoulli"
+                            },
+                            "backend": {
+                                "type": "string",
+                                "enum": list(BACKENDS),
+                                "description": (
+                                    "执行位置: postgres(主库, 默认), auto(只涉及已镜像的表时使用本地镜像, 否则查询主库), "
+                                    "mirror(强制使用镜像)。镜像是DuckDB副本, 数据可能落后主库, "
+                                    "函数和类型语义与PostgreSQL不完全相同, 只适合可以接受这些差异的分析查询"
+                                ),
+                                "default": "postgres"
+                            },
+                            "stream": {
+                                "type": "boolean",
+                                "description": "分页模式: 通过服务端游标逐页返回结果, 忽略limit, 用fetch_more读取后续页",
+                                "default": False
+                            },
+                            "page_size": {
+                                "type": "integer",
+                                "description": "分页模式下每页行数(默认100)",
+                                "default": 100
+                            }
+                        },
+                        "required": ["sql"]
+                    }
+                ),
+                Tool(
+                    name="execute_queries",
+                    description="批量执行多条独立的SELECT查询(并发执行, 可选一致性快照), 一次返回全部结果和每条查询的耗时",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "queries": {
+                                "type": "array",
+                                "description": "查询列表, 每项为SQL字符串或 {sql, params, limit, label} 对象",
+                                "items": {
+                                    "anyOf": [
+                                        {"type": "string"},
+                                        {
+                                            "type": "object",
+                                            "properties": {
+                                                "sql": {"type": "string"},
+                                                "params": {"type": "array"},
+                                                "limit": {"type": "integer"},
+                                                "label": {"type": "string", "description": "结果标题, 默认使用序号"}
+                                            },
+                                            "required": ["sql"]
+                                        }
+                                    ]
+                                }
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "每条查询默认的返回行数上限(默认100)",
+                                "default": 100
+                            },
+                            "format": {
+                                "type": "string",
+                                "enum": list(FORMATS),
+                                "description": "输出格式, 同execute_query",
+                                "default": "json"
+                            },
+                            "snapshot": {
+                                "type": "boolean",
+                                "description": "所有查询共享同一个REPEATABLE READ快照, 保证各项结果彼此一致(如总额与分项之和)",
+                                "default": False
+                            },
+                            "explain": {
+                                "type": "boolean",
+                                "description": "执行前检查每条查询的执行计划(默认由服务端配置)"
+                            },
+                            "timeout_ms": {
+                                "type": "integer",
+                                "description": "每条查询的语句超时(毫秒), 不超过服务端上限"
+                            }
+                        },
+                        "required": ["queries"]
+                    }
+                ),
+                Tool(
+                    name="export_query",
+                    description="把查询结果直接导出为服务端文件(CSV/CSV.GZ/Parquet), 只返回文件路径、行数、大小和耗时, 适合全量数据提取",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "sql": {
+                                "type": "string",
+                                "description": "SQL查询语句, 可使用 $1, $2 ... 作为参数占位符"
+                            },
+                            "params": {
+                                "type": "array",
+                                "description": "占位符 $1, $2 ... 对应的参数值"
+                            },
+                            "format": {
+                                "type": "string",
+                                "enum": list(EXPORT_FORMATS),
+                                "description": "文件格式: csv, csv.gz(gzip压缩), parquet(需要duckdb)",
+                                "default": "csv"
+                            },
+                            "filename": {
+                                "type": "string",
+                                "description": "文件名(不含目录), 不传则自动生成; 不会覆盖已有文件"
+                            },
+                            "header": {
+                                "type": "boolean",
+                                "description": "CSV是否包含表头",
+                                "default": True
+                            },
+                            "timeout_ms": {
+                                "type": "integer",
+                                "description": "导出语句超时(毫秒), 不超过服务端上限"
                             }
                         },
                         "required": ["sql"]
                     }
                 ),
+                Tool(
+                    name="fetch_more",
+                    description="读取分页查询的下一页结果",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "cursor_id": {
+                                "type": "string",
+                                "description": "execute_query分页模式返回的cursor_id"
+                            },
+                            "page_size": {
+                                "type": "integer",
+                                "description": "本页行数(默认100)",
+                                "default": 100
+                            },
+                            "close": {
+                                "type": "boolean",
+                                "description": "不再需要后续数据时设为true, 立即关闭游标",
+                                "default": False
+                            }
+                        },
+                        "required": ["cursor_id"]
+                    }
+                ),
                 Tool(
                     name="get_table_schema",
                     description="获取表结构信息",
@@ -68,10 +392,91 @@ class DatabaseMCPServer:
                         "required": ["table_name"]
                     }
                 ),
+                Tool(
+                    name="describe_tables",
+                    description="一次获取多张表的结构(列、类型、主键、估计行数), 不指定表名时返回所有表",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "table_names": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "表名列表(可选, 默认所有表)"
+                            },
+                            "refresh": {
+                                "type": "boolean",
+                                "description": "忽略缓存重新读取表结构",
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="profile_table",
+                    description="在数据库内统计表的各列概况(空值比例、不同值个数、最小/最大/平均值、Top-K取值、数值分布), 一次调用代替多次拉取原始数据",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "table_name": {
+                                "type": "string",
+                                "description": "表名"
+                            },
+                            "columns": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "只统计这些列(默认所有列)"
+                            },
+                            "sample_percent": {
+                                "type": "number",
+                                "description": "按百分比抽样(TABLESAMPLE SYSTEM), 大表默认自动抽样"
+                            },
+                            "top_k": {
+                                "type": "integer",
+                                "description": "每个分类列返回的高频取值个数(默认5)",
+                                "default": 5
+                            },
+                            "buckets": {
+                                "type": "integer",
+                                "description": "数值列直方图的分桶数(默认10)",
+                                "default": 10
+                            }
+                        },
+                        "required": ["table_name"]
+                    }
+                ),
                 Tool(
                     name="list_tables",
                     description="列出所有表名",
                     inputSchema={"type": "object", "properties": {}}
+                ),
+                Tool(
+                    name="refresh_mirror",
+                    description="从主库同步本地镜像中的表(按表配置增量或整表, full=true时强制整表重建), 返回同步结果",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "table_names": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "要同步的表, 不传则同步全部镜像表"
+                            },
+                            "full": {
+                                "type": "boolean",
+                                "description": "强制整表重建",
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="get_mirror_status",
+                    description="查看本地镜像的表、行数和数据新鲜度",
+                    inputSchema={"type": "object", "properties": {}}
+                ),
+                Tool(
+                    name="get_pool_stats",
+                    description="查看数据库连接池状态(使用中/空闲连接数、等待次数和等待时间)",
+                    inputSchema={"type": "object", "properties": {}}
                 )
             ]
         
@@ -80,16 +485,80 @@ class DatabaseMCPServer:
             if name == "execute_query":
                 return await self._execute_query(
                     arguments.get("sql"),
-                    arguments.get("limit", 100)
+                    arguments.get("limit", 100),
+                    params=arguments.get("params"),
+                    stream=arguments.get("stream", False),
+                    page_size=arguments.get("page_size", 100),
+                    cache=arguments.get("cache", False),
+                    fmt=arguments.get("format", "json"),
+                    explain=arguments.get("explain"),
+                    timeout_ms=arguments.get("timeout_ms"),
+                    approximate=arguments.get("approximate", False),
+                    sample_percent=arguments.get("sample_percent"),
+                    sample_method=arguments.get("sample_method", "bernoulli"),
+                    backend=arguments.get("backend", "postgres")
+                )
+            elif name == "execute_queries":
+                return await self._execute_queries(
+                    arguments.get("queries") or [],
+                    arguments.get("limit", 100),
+                    fmt=arguments.get("format", "json"),
+                    snapshot=arguments.get("snapshot", False),
+                    explain=arguments.get("explain"),
+                    timeout_ms=arguments.get("timeout_ms")
+                )
+            elif name == "export_query":
+                return await self._export_query(
+                    arguments.get("sql"),
+                    arguments.get("params"),
+                    fmt=arguments.get("format", "csv"),
+                    filename=arguments.get("filename"),
+                    header=arguments.get("header", True),
+                    timeout_ms=arguments.get("timeout_ms")
+                )
+            elif name == "fetch_more":
+                return await self._fetch_more(
+                    arguments.get("cursor_id"),
+                    arguments.get("page_size", 100),
+                    arguments.get("close", False)
                 )
             elif name == "get_table_schema":
                 return await self._get_table_schema(arguments.get("table_name"))
+            elif name == "describe_tables":
+                return await self._describe_tables(
+                    arguments.get("table_names"),
+                    arguments.get("refresh", False)
+                )
+            elif name == "profile_table":
+                return await self._profile_table(
+                    arguments.get("table_name"),
+                    arguments.get("columns"),
+                    arguments.get("sample_percent"),
+                    arguments.get("top_k", 5),
+                    arguments.get("buckets", 10)
+                )
             elif name == "list_tables":
                 return await self._list_tables()
+            elif name == "refresh_mirror":
+                return await self._refresh_mirror(
+                    arguments.get("table_names"),
+                    arguments.get("full", False)
+                )
+            elif name == "get_mirror_status":
+                return await self._get_mirror_status()
+            elif name == "get_pool_stats":
+                return await self._get_pool_stats()
             else:
                 raise ValueError(f"Unknown tool: {name}")
     
-    async def _execute_query(self, sql: str, limit: int) -> Sequence[TextContent]:
+    async def _execute_query(self, sql: str, limit: int, params: list | None = None,
+                             stream: bool = False,
+                             page_size: int = 100, cache: bool = False,
+                             fmt: str = "json", explain: bool | None = None,
+                             timeout_ms: int | None = None, approximate: bool = False,
+                             sample_percent: float | None = None,
+                             sample_method: str = "bernoulli",
+                             backend: str = "postgres") -> Sequence[TextContent]:
         """执行SQL查询"""
         # 安全检查
         if not self._is_safe_query(sql):
@@ -98,69 +567,530 @@ class DatabaseMCPServer:
                 text="❌ 安全检查失败:只允许SELECT查询"
             )]
         
+        if fmt not in FORMATS:
+            return [TextContent(
+                type="text",
+                text=f"❌ 不支持的输出格式:{fmt}, 可选:{', '.join(FORMATS)}"
+            )]
+        
+        if explain is None:
+            explain = self.query_guard.explain
+        
+        if backend not in BACKENDS:
+            return [TextContent(
+                type="text",
+                text=f"❌ 不支持的执行位置:{backend}, 可选:{', '.join(BACKENDS)}"
+            )]
+        
+        if stream:
+            return await self._open_stream(sql, page_size, fmt, explain, timeout_ms, params)
+        
+        fallback_notes = []
+        # 镜像只在显式指定时使用; 近似模式只用于主库
+        if backend == "mirror" and self.mirror is None:
+            return [TextContent(type="text", text="❌ 本地镜像未启用")]
+        if self.mirror is not None and (backend == "mirror" or (backend == "auto" and not approximate)):
+            covered = False
+            try:
+                tables = identifiers(sql) & (await self._get_catalog()).keys()
+                covered = self.mirror.covers(tables)
+                if covered:
+                    return await self._execute_on_mirror(sql, limit, params, fmt, tables)
+            except Exception as e:
+                if backend == "mirror":
+                    return [TextContent(type="text", text=f"❌ 镜像查询失败:{str(e)}")]
+                fallback_notes.append(f"⚠️ 本地镜像执行失败({str(e).splitlines()[0]}), 已改为查询主库")
+            if not covered and backend == "mirror":
+                return [TextContent(type="text", text="❌ 查询涉及未镜像的表")]
+        
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            # approximate_notes 描述结果本身(如近似值和置信区间), 与结果一起缓存
+            plan, approximate_notes = None, []
+            if approximate:
+                plan, approximate_notes = await self._plan_approximate(sql, sample_percent, sample_method)
+            query_sql = plan.sql if plan is not None else sql
             
-            # 添加LIMIT限制
-            if 'LIMIT' not in sql.upper():
-                sql = f"{sql} LIMIT {limit}"
+            cache_key = versions = None
+            if cache and self.result_cache is not None:
+                cache_key = self.result_cache.make_key(
+                    query_sql, limit, fmt, json.dumps(params or [], default=str), approximate
+                )
+                versions = await self._table_versions(sql)
+                if not self.result_cache.cacheable(versions):
+                    # 写入无法使缓存失效, 只能等TTL过期, 宁可不缓存
+                    cache_key = None
+                else:
+                    cached = self.result_cache.get(cache_key, versions)
+                    if cached is not None:
+                        cached += self._cache_note(True)
+                        cached += "".join(f"\n{note}" for note in fallback_notes)
+                        return [TextContent(type="text", text=cached)]
             
-            cursor.execute(sql)
-            results = cursor.fetchall()
+            # 以子查询方式限制返回行数
+            limited_sql = wrap_limit(query_sql, limit)
             
-            cursor.close()
-            conn.close()
+            columns, results, notes, prepared = await self._run_db(
+                lambda pooled: self._fetch_limited(pooled, limited_sql, params, explain, timeout_ms)
+            )
+            notes.append(self._prepared_note(prepared))
+            if plan is not None:
+                # 样本结果放大为估计值, 辅助列替换为置信区间
+                columns, results = plan.apply(columns, results)
+            notes = fallback_notes + notes
             
             # 格式化结果
+            payload = format_rows(columns, results, fmt)
             result_text = f"✅ 查询成功,返回{len(results)}行:\n"
-            result_text += json.dumps(results, indent=2, default=str)
+            result_text += payload + "\n" + size_note(fmt, payload)
+            result_text += "".join(f"\n{note}" for note in approximate_notes)
+            
+            if cache_key is not None:
+                self.result_cache.put(cache_key, result_text, versions)
+                result_text += self._cache_note(False)
+            elif cache and self.result_cache is None:
+                result_text += "\n🗄️ 结果缓存未启用"
+            elif cache:
+                result_text += "\n🗄️ 查询引用了无法跟踪变更的对象(非public模式、外部表等)或未引用表, 结果未缓存"
             
+            result_text += "".join(f"\n{note}" for note in notes)
             return [TextContent(type="text", text=result_text)]
         
+        except QueryRejected as e:
+            return [TextContent(type="text", text=self._rejected_text(e))]
+        except Exception as e:
+            return [TextContent(
+                type="text",
+                text=f"❌ 查询失败:{str(e)}"
+            )]
+
+    async def _execute_queries(self, queries: list, limit: int = 100, fmt: str = "json",
+                               snapshot: bool = False, explain: bool | None = None,
+                               timeout_ms: int | None = None) -> Sequence[TextContent]:
+        """并发执行一批查询; snapshot=True时所有查询读取同一个导出的快照"""
+        if not queries:
+            return [TextContent(type="text", text="❌ queries 不能为空")]
+        if len(queries) > self.max_batch_queries:
+            return [TextContent(
+                type="text",
+                text=f"❌ 单次最多执行{self.max_batch_queries}条查询, 收到{len(queries)}条"
+            )]
+        if fmt not in FORMATS:
+            return [TextContent(
+                type="text",
+                text=f"❌ 不支持的输出格式:{fmt}, 可选:{', '.join(FORMATS)}"
+            )]
+        if explain is None:
+            explain = self.query_guard.explain
+        
+        # 先校验全部语句, 任何一条不安全则整批拒绝
+        batch = []
+        for index, query in enumerate(queries, start=1):
+            if isinstance(query, str):
+                query = {"sql": query}
+            sql = query.get("sql") if isinstance(query, dict) else None
+            if not sql or not self._is_safe_query(sql):
+                return [TextContent(
+                    type="text",
+                    text=f"❌ 安全检查失败:第{index}条查询不是安全的SELECT语句, 整批未执行"
+                )]
+            batch.append({
+                "label": query.get("label") or f"#{index}",
+                "sql": wrap_limit(sql, query.get("limit", limit)),
+                "params": query.get("params"),
+            })
+        
+        if snapshot and self.pool.max_size < 2:
+            return [TextContent(type="text", text="❌ 一致性快照需要连接池至少2个连接")]
+        
+        leader = snapshot_id = None
+        started = time.perf_counter()
+        try:
+            if snapshot:
+                # 一条连接开启REPEATABLE READ事务并导出快照, 在整批结束前保持事务打开且不执行查询:
+                # 导出事务一旦因出错中止, 尚未导入的查询就无法再导入该快照
+                def export(pooled):
+                    with pooled.conn.cursor() as cursor:
+                        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                        cursor.execute("SELECT pg_export_snapshot()")
+                        return pooled, cursor.fetchone()[0]
+                leader, snapshot_id = await self._run_db(export, keep=True)
+            
+            async def run_one(index: int, item: dict) -> tuple[Any, float]:
+                query_started = time.perf_counter()
+                try:
+                    # 每条查询都在导入快照的连接上执行
+                    result = await self._run_db(
+                        lambda pooled: self._fetch_limited(
+                            pooled, item["sql"], item["params"], explain, timeout_ms, snapshot_id
+                        )
+                    )
+                except Exception as e:
+                    result = e
+                return result, (time.perf_counter() - query_started) * 1000
+            
+            outcomes = await asyncio.gather(*(run_one(i, item) for i, item in enumerate(batch)))
+        except Exception as e:
+            return [TextContent(type="text", text=f"❌ 批量查询失败:{str(e)}")]
+        finally:
+            if leader is not None:
+                self.pool.release(leader)
+        
+        elapsed = (time.perf_counter() - started) * 1000
+        succeeded = sum(not isinstance(result, Exception) for result, _ in outcomes)
+        sections = [
+            f"✅ 批量查询完成: 共{len(batch)}条, 成功{succeeded}条, 总耗时{elapsed:.1f}ms"
+            f"({'共享REPEATABLE READ快照' if snapshot else '各自独立读取'})"
+        ]
+        for item, (result, query_ms) in zip(batch, outcomes):
+            header = f"\n### {item['label']} ({query_ms:.1f}ms)"
+            if isinstance(result, QueryRejected):
+                sections.append(f"{header}\n{self._rejected_text(result)}")
+                continue
+            if isinstance(result, Exception):
+                sections.append(f"{header}\n❌ 查询失败:{str(result)}")
+                continue
+            columns, rows, notes, _ = result
+            payload = format_rows(columns, rows, fmt)
+            sections.append(
+                f"{header} 返回{len(rows)}行:\n{payload}"
+                + "".join(f"\n{note}" for note in notes)
+            )
+        payload_text = "\n".join(sections)
+        return [TextContent(type="text", text=payload_text + "\n" + size_note(fmt, payload_text))]
+    
+    async def _export_query(self, sql: str, params: list | None = None, fmt: str = "csv",
+                            filename: str | None = None, header: bool = True,
+                            timeout_ms: int | None = None) -> Sequence[TextContent]:
+        """以COPY流式导出查询结果到导出目录, 结果不经过Agent上下文"""
+        if not self._is_safe_query(sql):
+            return [TextContent(
+                type="text",
+                text="❌ 安全检查失败:只允许SELECT查询"
+            )]
+        if self.export_dir is None:
+            return [TextContent(type="text", text="❌ 服务端未配置导出目录, 无法导出")]
+        
+        try:
+            path = export_path(self.export_dir, filename, fmt)
+            
+            def run(pooled):
+                with pooled.conn.cursor() as cursor:
+                    self.query_guard.apply_timeout(cursor, timeout_ms)
+                    # COPY不支持服务端参数, 参数由psycopg2在客户端安全转义后嵌入
+                    query = sql
+                    if params:
+                        query = cursor.mogrify(to_pyformat(sql), pyformat_params(params)).decode()
+                    return copy_query(cursor, query, path, fmt, header)
+            
+            started = time.perf_counter()
+            rows = await self._run_db(run)
+            elapsed = (time.perf_counter() - started) * 1000
+            return [TextContent(
+                type="text",
+                text=(
+                    f"✅ 导出完成: {path}\n"
+                    f"格式={fmt}, {rows}行, {os.path.getsize(path)}字节, 耗时{elapsed:.0f}ms"
+                )
+            )]
+        
+        except Exception as e:
+            return [TextContent(
+                type="text",
+                text=f"❌ 导出失败:{str(e)}"
+            )]
+    
+    def _fetch_limited(self, pooled: PooledConnection, limited_sql: str, params: list | None,
+                       explain: bool, timeout_ms: int | None,
+                       snapshot: str | None = None) -> tuple[list, list, list, str | None]:
+        """(工作线程)执行已限制行数的查询, 返回(列名, 行, 说明, 预备语句状态)
+        
+        snapshot: 导入的快照ID, 在同一一致性视图中执行(必须是事务中的第一条语句)
+        复用的预备语句因DDL失效时, 回滚事务后重新预备并重试一次(重新导入快照)
+        预备语句状态: "hit"复用, "new"新建, None 第一次出现未预备
+        """
+        for attempt in range(2):
+            with pooled.conn.cursor() as cursor:
+                if snapshot is not None:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+                self.query_guard.apply_timeout(cursor, timeout_ms)
+                # 按语句文本复用该连接上的预备语句, 参数在EXECUTE时绑定
+                name, reused = self.prepared.prepare(pooled, cursor, limited_sql)
+                execute_sql, bind_params = self.prepared.statement(name, limited_sql, params)
+                try:
+                    notes = self._explain_query(cursor, execute_sql, explain, bind_params)
+                    cursor.execute(execute_sql, bind_params)
+                except Exception as e:
+                    if not (reused and is_stale_plan_error(e)):
+                        raise
+                    # 表结构变化后缓存的计划已失效: 丢弃该语句, 回滚后重新预备
+                    self.prepared.discard(pooled, limited_sql)
+                    if attempt:
+                        raise
+                    pooled.conn.rollback()
+                    continue
+                columns = [column.name for column in cursor.description]
+                status = None if name is None else "hit" if reused else "new"
+                return columns, cursor.fetchall(), notes, status
+    
+    async def _execute_on_mirror(self, sql: str, limit: int, params: list | None,
+                                 fmt: str, tables: set) -> Sequence[TextContent]:
+        """在本地镜像上执行查询, 过期的表先增量同步; 主库不可用时使用已有数据"""
+        notes = []
+        stale = sorted(table for table in tables if self.mirror.is_stale(table))
+        if stale:
+            try:
+                synced = await self._run_db(
+                    lambda pooled: [self.mirror.refresh(pooled.conn, table) for table in stale]
+                )
+                notes.extend(self._mirror_sync_note(result) for result in synced)
+            except Exception as e:
+                if any(self.mirror.age(table) is None for table in stale):
+                    raise
+                notes.append(f"⚠️ 镜像同步失败({str(e).splitlines()[0]}), 使用上次同步的数据")
+        
+        columns, results = await self._run_local(
+            lambda: self.mirror.execute(wrap_limit(sql, limit), params)
+        )
+        payload = format_rows(columns, results, fmt)
+        result_text = f"✅ 查询成功,返回{len(results)}行:\n"
+        result_text += payload + "\n" + size_note(fmt, payload)
+        freshness = ", ".join(
+            f"{table}同步于{self.mirror.age(table):.0f}秒前"
+            + ("(只追加同步, 不含之后的更新)" if self.mirror.sync_mode(table) == "append_only" else "")
+            for table in sorted(tables)
+        )
+        result_text += (
+            f"\n🪞 本地镜像(DuckDB)执行: {freshness}; "
+            f"结果可能落后主库最多{self.mirror.refresh_interval:g}秒, 需要最新数据时用 backend=postgres"
+        )
+        result_text += "".join(f"\n{note}" for note in notes)
+        return [TextContent(type="text", text=result_text)]
+    
+    def _mirror_sync_note(self, result: dict) -> str:
+        mode = "增量" if result["mode"] == "incremental" else "整表"
+        return (
+            f"🔄 {result['table']}: {mode}同步{result['changed']}行, "
+            f"镜像共{result['rows']}行, 耗时{result['elapsed_ms']:.0f}ms"
+        )
+    
+    async def _plan_approximate(self, sql: str, sample_percent: float | None,
+                                sample_method: str):
+        """改写为抽样查询; 返回(改写结果或None, 需要附加的说明), None表示精确执行"""
+        try:
+            plan = rewrite(sql, sample_percent or self.approximate_sample_percent, sample_method)
+        except UnsupportedQuery as e:
+            return None, [f"⚠️ 近似查询不支持该语句({e}), 已精确执行"]
+        row_estimate = ((await self._get_catalog()).get(plan.table) or {}).get('row_estimate')
+        if (sample_percent is None and row_estimate is not None
+                and row_estimate < self.approximate_min_rows):
+            return None, [f"ℹ️ 表 {plan.table} 约{row_estimate}行, 数据量较小, 已精确执行"]
+        return plan, [approximate_note(plan, row_estimate)]
+    
+    def _explain_query(self, cursor, sql: str, explain: bool, params=None) -> list[str]:
+        """(工作线程)按需检查执行计划; 返回需要附加给Agent的说明"""
+        if not explain:
+            return []
+        summary, problems = self.query_guard.check(cursor, sql, params)
+        notes = [format_plan(summary)]
+        if problems:
+            notes.append(f"⚠️ 执行计划超过阈值: {'; '.join(problems)}")
+        return notes
+    
+    def _prepared_note(self, status: str | None) -> str:
+        stats = self.prepared.snapshot()
+        label = {"hit": "复用", "new": "新建"}.get(status, "首次出现, 直接执行")
+        return (
+            f"♻️ 预备语句: {label}"
+            f"(命中率{stats['hit_rate']:.0%}, 命中{stats['hits']}次/未命中{stats['misses']}次)"
+        )
+    
+    def _rejected_text(self, error: QueryRejected) -> str:
+        return (
+            f"❌ 查询被拒绝:{error}\n{format_plan(error.plan)}\n"
+            "请增加过滤条件、减少关联的表或先聚合再查询"
+        )
+    
+    async def _table_versions(self, sql: str) -> dict:
+        """查询引用到的表及其当前版本(失效信号), 结果在缓存命中判断中使用
+
+        视图按其依赖的底层表计算版本; 标识符交给数据库解析, 不限于目录缓存中的表。
+        """
+        names = identifiers(sql)
+        versions = self.result_cache.cached_versions(names)
+        if versions is None:
+            versions = await self._run_db(
+                lambda pooled: self.result_cache.table_versions(pooled.conn, names)
+            )
+        return versions
+    
+    def _cache_note(self, hit: bool) -> str:
+        stats = self.result_cache.stats
+        return (
+            f"\n🗄️ 结果缓存: {'命中' if hit else '未命中'}"
+            f"(累计命中{stats['hits']}次, 未命中{stats['misses']}次)"
+        )
+    
+    def _format_page(self, open_cursor: OpenCursor, rows: list, has_more: bool) -> str:
+        page_text = (
+            f"✅ 第{open_cursor.pages}页, 返回{len(rows)}行"
+            f"(累计{open_cursor.rows_fetched}行)"
+        )
+        if has_more:
+            page_text += f", 还有更多数据, 使用fetch_more读取: cursor_id={open_cursor.token}\n"
+        else:
+            page_text += ", 数据已全部返回\n"
+        payload = format_rows(open_cursor.columns, rows, open_cursor.fmt)
+        page_text += payload + "\n" + size_note(open_cursor.fmt, payload)
+        return page_text
+    
+    def _read_page(self, open_cursor: OpenCursor, page_size: int) -> tuple[list, bool]:
+        """(工作线程)读取一页, 读完或出错时关闭游标, 否则放回等待下一次读取"""
+        try:
+            rows, has_more = open_cursor.fetch_page(page_size)
+        except BaseException as e:
+            self.cursors.close(open_cursor, error=e)
+            raise
+        if has_more:
+            self.cursors.checkin(open_cursor)
+        else:
+            self.cursors.close(open_cursor)
+        return rows, has_more
+    
+    async def _open_stream(self, sql: str, page_size: int, fmt: str = "json",
+                           explain: bool = False, timeout_ms: int | None = None,
+                           params: list | None = None) -> Sequence[TextContent]:
+        """以服务端游标执行查询并返回第一页"""
+        page_size = max(1, page_size)
+        sql = strip_statement(sql)
+        # 游标无法基于预备语句声明, 参数改为由psycopg2在客户端绑定
+        bind_params = None
+        if params:
+            sql, bind_params = to_pyformat(sql), pyformat_params(params)
+        try:
+            def run(pooled):
+                self.cursors.reap()
+                with pooled.conn.cursor() as cursor:
+                    # 超时对游标所在事务内的后续fetch_more同样生效
+                    self.query_guard.apply_timeout(cursor, timeout_ms)
+                    # 游标被遗弃时, 数据库端也会结束空闲事务, 不会长期阻碍vacuum
+                    cursor.execute(
+                        "SELECT set_config('idle_in_transaction_session_timeout', %s, true)",
+                        (str(self.cursors.transaction_timeout_ms),)
+                    )
+                    notes = self._explain_query(cursor, sql, explain, bind_params)
+                open_cursor = self.cursors.open(pooled, sql, bind_params, fmt=fmt)
+                return open_cursor, self._read_page(open_cursor, page_size), notes
+            
+            open_cursor, (rows, has_more), notes = await self._run_db(run, keep=True)
+            page_text = self._format_page(open_cursor, rows, has_more)
+            page_text += "".join(f"\n{note}" for note in notes)
+            return [TextContent(type="text", text=page_text)]
+        
+        except QueryRejected as e:
+            return [TextContent(type="text", text=self._rejected_text(e))]
         except Exception as e:
             return [TextContent(
                 type="text",
                 text=f"❌ 查询失败:{str(e)}"
             )]
+    
+    async def _fetch_more(self, cursor_id: str, page_size: int,
+                          close: bool = False) -> Sequence[TextContent]:
+        """读取分页查询的下一页"""
+        # 顺便回收其他闲置过期的游标(后台线程也会定期回收)
+        await self._run_local(self.cursors.reap)
+        open_cursor = self.cursors.checkout(cursor_id)
+        if open_cursor is None:
+            return [TextContent(
+                type="text",
+                text=f"❌ 游标不存在、已读完或已过期:{cursor_id}"
+            )]
+        
+        try:
+            if close:
+                await self._run_db(lambda pooled: self.cursors.close(open_cursor),
+                                   pooled=open_cursor.pooled)
+                return [TextContent(
+                    type="text",
+                    text=f"✅ 游标已关闭, 共读取{open_cursor.rows_fetched}行"
+                )]
+            
+            rows, has_more = await self._run_db(
+                lambda pooled: self._read_page(open_cursor, max(1, page_size)),
+                pooled=open_cursor.pooled
+            )
+            return [TextContent(type="text", text=self._format_page(open_cursor, rows, has_more))]
+        
+        except asyncio.CancelledError:
+            # 读取开始前被取消时游标仍处于占用状态, 关闭它以归还连接
+            if self.cursors.is_busy(open_cursor.token):
+                self._executor.submit(self.cursors.close, open_cursor, asyncio.CancelledError())
+            raise
+        except Exception as e:
+            return [TextContent(
+                type="text",
+                text=f"❌ 读取失败:{str(e)}"
+            )]
 
+    async def _get_catalog(self, refresh: bool = False) -> dict:
+        """读取表结构缓存, 仅在缓存需要校验或重新加载时才占用连接"""
+        if not refresh:
+            tables = self.schema_cache.peek()
+            if tables is not None:
+                return tables
+        return await self._run_db(lambda pooled: self.schema_cache.get(pooled.conn, refresh))
+    
+    def _format_table_schema(self, table_name: str, table: dict) -> str:
+        schema_text = f"📊 表 '{table_name}' 结构"
+        if table['row_estimate'] is not None:
+            schema_text += f"(约{table['row_estimate']}行)"
+        schema_text += ":\n\n"
+        for col in table['columns']:
+            schema_text += f"- {col['column_name']}: {col['data_type']}"
+            if col['column_name'] in table['primary_key']:
+                schema_text += " (PRIMARY KEY)"
+            elif col['is_nullable'] == 'NO':
+                schema_text += " (NOT NULL)"
+            schema_text += "\n"
+        return schema_text
+    
     async def _get_table_schema(self, table_name: str) -> Sequence[TextContent]:
         """获取表结构"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            # 查询表结构
-            cursor.execute("""
-                SELECT 
-                    column_name,
-                    data_type,
-                    is_nullable,
-                    column_default
-                FROM information_schema.columns
-                WHERE table_name = %s
-                ORDER BY ordinal_position
-            """, (table_name,))
-            
-            columns = cursor.fetchall()
-            cursor.close()
-            conn.close()
-            
-            if not columns:
+            table = (await self._get_catalog()).get(table_name)
+            
+            if not table or not table['columns']:
                 return [TextContent(
                     type="text",
                     text=f"❌ 表 '{table_name}' 不存在"
                 )]
             
-            # 格式化输出
-            schema_text = f"📊 表 '{table_name}' 结构:\n\n"
-            for col in columns:
-                schema_text += f"- {col['column_name']}: {col['data_type']}"
-                if col['is_nullable'] == 'NO':
-                    schema_text += " (NOT NULL)"
-                schema_text += "\n"
+            return [TextContent(type="text", text=self._format_table_schema(table_name, table))]
+        
+        except Exception as e:
+            return [TextContent(
+                type="text",
+                text=f"❌ 获取表结构失败:{str(e)}"
+            )]
+    
+    async def _describe_tables(self, table_names: list[str] | None = None,
+                               refresh: bool = False) -> Sequence[TextContent]:
+        """一次返回多张表(默认全部)的结构"""
+        try:
+            catalog = await self._get_catalog(refresh)
+            names = table_names or list(catalog)
+            missing = [name for name in names if name not in catalog]
+            
+            describe_text = f"📚 共{len(names) - len(missing)}个表的结构:\n\n"
+            describe_text += "\n".join(
+                self._format_table_schema(name, catalog[name])
+                for name in names if name in catalog
+            )
+            if missing:
+                describe_text += f"\n❌ 以下表不存在: {', '.join(missing)}"
             
-            return [TextContent(type="text", text=schema_text)]
+            return [TextContent(type="text", text=describe_text)]
         
         except Exception as e:
             return [TextContent(
@@ -168,22 +1098,64 @@ class DatabaseMCPServer:
                 text=f"❌ 获取表结构失败:{str(e)}"
             )]
     
-    async def _list_tables(self) -> Sequence[TextContent]:
-        """列出所有表"""
+    async def _profile_table(self, table_name: str, columns: list[str] | None = None,
+                             sample_percent: float | None = None, top_k: int = 5,
+                             buckets: int = 10) -> Sequence[TextContent]:
+        """在数据库内一次扫描计算各列统计"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            table = (await self._get_catalog()).get(table_name)
+            if not table or not table['columns']:
+                return [TextContent(
+                    type="text",
+                    text=f"❌ 表 '{table_name}' 不存在"
+                )]
             
-            cursor.execute("""
-                SELECT table_name
-                FROM information_schema.tables
-                WHERE table_schema = 'public'
-                ORDER BY table_name
-            """)
+            selected = table['columns']
+            if columns:
+                known = {col['column_name'] for col in selected}
+                missing = [name for name in columns if name not in known]
+                if missing:
+                    return [TextContent(
+                        type="text",
+                        text=f"❌ 表 '{table_name}' 中不存在列: {', '.join(missing)}"
+                    )]
+                selected = [col for col in selected if col['column_name'] in columns]
             
-            tables = [row[0] for row in cursor.fetchall()]
-            cursor.close()
-            conn.close()
+            row_estimate = table['row_estimate']
+            if (sample_percent is None and row_estimate
+                    and row_estimate > self.profile_sample_rows):
+                sample_percent = max(0.01, round(100 * self.profile_sample_rows / row_estimate, 2))
+            if sample_percent is not None and not 0 < sample_percent <= 100:
+                return [TextContent(
+                    type="text",
+                    text="❌ sample_percent 需在 (0, 100] 之间"
+                )]
+            
+            top_k, buckets = max(1, top_k), max(1, buckets)
+            query = build_profile_query(table_name, selected, sample_percent, top_k, buckets)
+            
+            def run(pooled):
+                with pooled.conn.cursor() as cursor:
+                    self.query_guard.apply_timeout(cursor, None)
+                    cursor.execute(query)
+                    return cursor.fetchone()
+            
+            profile = parse_profile(await self._run_db(run), selected, buckets)
+            return [TextContent(
+                type="text",
+                text=format_profile(table_name, profile, sample_percent, row_estimate)
+            )]
+        
+        except Exception as e:
+            return [TextContent(
+                type="text",
+                text=f"❌ 统计表概况失败:{str(e)}"
+            )]
+    
+    async def _list_tables(self) -> Sequence[TextContent]:
+        """列出所有表"""
+        try:
+            tables = list(await self._get_catalog())
             
             table_text = f"📋 数据库中有{len(tables)}个表:\n"
             table_text += "\n".join(f"- {table}" for table in tables)
@@ -196,6 +1168,65 @@ class DatabaseMCPServer:
                 text=f"❌ 列出表失败:{str(e)}"
             )]
 
+    async def _refresh_mirror(self, table_names: list[str] | None = None,
+                              full: bool = False) -> Sequence[TextContent]:
+        """同步本地镜像"""
+        if self.mirror is None:
+            return [TextContent(type="text", text="❌ 本地镜像未启用")]
+        tables = table_names or list(self.mirror.tables)
+        unknown = [table for table in tables if table not in self.mirror.tables]
+        if unknown:
+            return [TextContent(
+                type="text",
+                text=f"❌ 以下表未配置镜像: {', '.join(unknown)}"
+            )]
+        try:
+            synced = await self._run_db(
+                lambda pooled: [self.mirror.refresh(pooled.conn, table, full) for table in tables]
+            )
+        except Exception as e:
+            return [TextContent(type="text", text=f"❌ 镜像同步失败:{str(e)}")]
+        lines = [self._mirror_sync_note(result) for result in synced]
+        return [TextContent(type="text", text="\n".join(lines))]
+    
+    async def _get_mirror_status(self) -> Sequence[TextContent]:
+        if self.mirror is None:
+            return [TextContent(type="text", text="本地镜像未启用")]
+        lines = [f"🪞 本地镜像({self.mirror.path}), 超过{self.mirror.refresh_interval:g}秒未同步的表在查询前自动同步:"]
+        for table in self.mirror.status():
+            if table["sync_mode"] == "updated_at":
+                sync = f"按{table['updated_at']}增量同步(当前最大值{table['watermark']})"
+            elif table["sync_mode"] == "append_only":
+                sync = f"按{table['key']}只追加同步(当前最大值{table['watermark']}), 不含之后的更新"
+            else:
+                sync = "每次整表重建"
+            if table["age"] is None:
+                lines.append(f"- {table['table']}: 尚未同步, {sync}")
+            else:
+                lines.append(
+                    f"- {table['table']}: {table['rows']}行, 同步于{table['age']:.0f}秒前, {sync}"
+                )
+        return [TextContent(type="text", text="\n".join(lines))]
+    
+    async def _get_pool_stats(self) -> Sequence[TextContent]:
+        """连接池状态"""
+        stats = self.pool.stats()
+        stats_text = (
+            f"🔌 连接池: 使用中{stats['in_use']}/上限{stats['max_size']}, "
+            f"空闲{stats['idle']}, 等待{stats['waits']}次, "
+            f"查询并发上限{self.max_concurrency}\n"
+        )
+        stats_text += json.dumps(stats, indent=2)
+        return [TextContent(type="text", text=stats_text)]
+
+    def close(self):
+        """释放工作线程池和数据库连接"""
+        self.cursors.close_all()
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+        if self.mirror is not None:
+            self.mirror.close()
+
 async def main():
     db_config = {
         'host': 'localhost',
@@ -205,16 +1236,50 @@ async def main():
         'password': '123456'
     }
     
-    server = DatabaseMCPServer(db_config)
+    pool_config = {
+        'min_size': 1,
+        'max_size': 10,
+        'idle_timeout': 300,
+        'max_uses': 1000
+    }
+    
+    result_cache_config = {
+        'max_bytes': 32 * 1024 * 1024,
+        'ttl': 300
+    }
+    
+    server = DatabaseMCPServer(
+        db_config,
+        pool_config,
+        max_concurrency=8,
+        export_dir='exports',
+        result_cache_config=result_cache_config,
+        mirror_config={
+            'engine': 'duckdb',
+            'path': 'sales_mirror.duckdb',
+            # orders 没有更新时间列, 每次整表重建
+            'tables': {'orders': {'key': 'id'}},
+            'refresh_interval': 60
+        },
+        query_guard_config={
+            'explain': True,
+            'max_cost': 1_000_000,
+            'action': 'reject',
+            'statement_timeout_ms': 30000
+        }
+    )
     
     # 使用stdio传输
     from mcp.server.stdio import stdio_server
-    async with stdio_server() as (read_stream, write_stream):
-        await server.server.run(
-            read_stream,
-            write_stream,
-            server.server.create_initialization_options()
-        )
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.server.run(
+                read_stream,
+                write_stream,
+                server.server.create_initialization_options()
+            )
+    finally:
+        server.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
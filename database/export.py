@@ -0,0 +1,116 @@
+import contextlib
+import gzip
+import os
+import re
+import secrets
+import time
+from typing import Optional
+from mirror import CSV_NULL, duckdb_type
+from query_guard import strip_statement
+
+try:
+    import duckdb
+except ImportError:  # 可选依赖: 仅导出parquet时需要
+    duckdb = None
+
+EXPORT_FORMATS = {"csv": ".csv", "csv.gz": ".csv.gz", "parquet": ".parquet"}
+
+_FILENAME_RE = re.compile(r"^[\w\-.]+$")
+
+
+class ExportError(Exception):
+    """导出参数不合法或导出失败"""
+
+
+# 按OID查询类型名, 与format_type()的输出一致, 用于确定parquet列类型
+TYPE_NAMES_SQL = "SELECT oid, format_type(oid, NULL) FROM pg_type WHERE oid = ANY(%s)"
+
+
+def export_path(export_dir: str, filename: Optional[str], fmt: str) -> str:
+    """在导出目录下确定目标文件路径; 文件名只能是不含路径的简单名称, 不覆盖已有文件
+
+    这里只是提前报错, 真正防止覆盖的是 copy_query 发布文件时的硬链接。
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"不支持的导出格式:{fmt}, 可选:{', '.join(EXPORT_FORMATS)}")
+    suffix = EXPORT_FORMATS[fmt]
+    if filename:
+        if not _FILENAME_RE.match(filename) or filename.startswith("."):
+            raise ExportError(f"文件名只能包含字母、数字、下划线、横线和点:{filename}")
+        if not filename.endswith(suffix):
+            filename += suffix
+    else:
+        filename = f"export_{time.strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(3)}{suffix}"
+    path = os.path.join(os.path.realpath(export_dir), filename)
+    if os.path.exists(path):
+        raise ExportError(f"文件已存在:{filename}")
+    return path
+
+
+def _parquet_columns(cursor, sql: str) -> str:
+    """(工作线程)按查询结果的列类型生成 read_csv 的 columns 参数, 避免类型推断丢失精度
+
+    无法无损映射为DuckDB类型的列(不限精度numeric、json、数组等)按文本保存。
+    """
+    cursor.execute(f"SELECT * FROM ({sql}) AS q LIMIT 0")
+    description = cursor.description
+    cursor.execute(TYPE_NAMES_SQL, (sorted({column.type_code for column in description}),))
+    type_names = dict(cursor.fetchall())
+    columns, seen = [], set()
+    for column in description:
+        pg_type = type_names.get(column.type_code, "")
+        if pg_type == "numeric" and column.precision is not None and column.precision > 0:
+            pg_type = f"numeric({column.precision},{column.scale})"
+        # 同名列(如两个count)加序号区分
+        name, number = column.name, 1
+        while name in seen:
+            number += 1
+            name = f"{column.name}_{number}"
+        seen.add(name)
+        columns.append(f"'{name.replace(chr(39), chr(39) * 2)}': '{duckdb_type(pg_type) or 'VARCHAR'}'")
+    return "{" + ", ".join(columns) + "}"
+
+
+def copy_query(cursor, sql: str, path: str, fmt: str, header: bool = True) -> int:
+    """(工作线程)以 COPY (查询) TO STDOUT 流式写入文件, 返回行数
+
+    数据按块写入磁盘, 内存占用与结果大小无关; 先写入临时文件, 完成后以硬链接发布,
+    目标文件已存在时报错而不覆盖, 失败时不会留下不完整的导出文件。
+    parquet 先写CSV(显式NULL标记)再由DuckDB按查询的列类型转换。
+    """
+    sql = strip_statement(sql)
+    if fmt == "parquet":
+        if duckdb is None:
+            raise ExportError("导出parquet需要安装duckdb(pip install duckdb)")
+        columns = _parquet_columns(cursor, sql)
+        options = f"FORMAT csv, NULL '{CSV_NULL}'"
+    else:
+        options = f"FORMAT csv{', HEADER true' if header else ''}"
+    copy_sql = f"COPY ({sql}) TO STDOUT WITH ({options})"
+    # 临时文件名带随机后缀, 同名的并发导出互不干扰
+    partial = f"{path}.{secrets.token_hex(4)}.partial"
+    staging = f"{partial}.csv" if fmt == "parquet" else partial
+    try:
+        # gzip默认压缩级别9很慢, 6的压缩率相近而速度快得多
+        file = gzip.open(staging, "wb", compresslevel=6) if fmt == "csv.gz" else open(staging, "wb")
+        with file:
+            cursor.copy_expert(copy_sql, file)
+        rows = cursor.rowcount
+        if fmt == "parquet":
+            quoted = staging.replace("'", "''")
+            target = partial.replace("'", "''")
+            with contextlib.closing(duckdb.connect()) as db:
+                db.execute(
+                    f"COPY (SELECT * FROM read_csv('{quoted}', header = false, auto_detect = false, "
+                    f"nullstr = '{CSV_NULL}', allow_quoted_nulls = false, columns = {columns})) "
+                    f"TO '{target}' (FORMAT parquet)"
+                )
+        try:
+            os.link(partial, path)
+        except FileExistsError:
+            raise ExportError(f"文件已存在:{os.path.basename(path)}")
+        return rows
+    finally:
+        for leftover in {partial, staging}:
+            with contextlib.suppress(OSError):
+                os.remove(leftover)
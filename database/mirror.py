@@ -0,0 +1,311 @@
+import contextlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional
+from psycopg2 import sql
+
+try:
+    import duckdb
+except ImportError:  # 可选依赖: 未安装时不启用本地镜像
+    duckdb = None
+
+SOURCE_COLUMNS_SQL = """
+    SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+    FROM pg_attribute a
+    JOIN pg_class c ON c.oid = a.attrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relname = %s
+      AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attnum
+"""
+
+# COPY导出的NULL标记: 默认的空字段无法与空字符串区分; 与标记相同的文本值会被COPY加引号
+CSV_NULL = r"\N"
+
+# 删除信号: 累计删除行数和存储文件编号(TRUNCATE不计入n_tup_del, 但会更换存储文件)
+DELETE_SIGNAL_SQL = """
+    SELECT concat_ws(':', s.n_tup_del, c.relfilenode)
+    FROM pg_class c
+    LEFT JOIN pg_stat_all_tables s ON s.relid = c.oid
+    WHERE c.oid = %s::regclass
+"""
+
+_DUCKDB_TYPES = {
+    'smallint': 'SMALLINT',
+    'integer': 'INTEGER',
+    'bigint': 'BIGINT',
+    'real': 'REAL',
+    'double precision': 'DOUBLE',
+    'boolean': 'BOOLEAN',
+    'date': 'DATE',
+    'timestamp without time zone': 'TIMESTAMP',
+    'timestamp with time zone': 'TIMESTAMPTZ',
+    'time without time zone': 'TIME',
+    'uuid': 'UUID',
+    'text': 'VARCHAR',
+    'character varying': 'VARCHAR',
+}
+
+
+def duckdb_type(pg_type: str) -> Optional[str]:
+    """把 format_type() 给出的PostgreSQL类型映射为DuckDB类型; 无法无损对应时返回None
+
+    不限精度或超过38位的numeric、interval、json/jsonb、数组等类型不做近似映射(转DOUBLE或文本
+    会改变计算结果), 由镜像配置的 types 显式指定。
+    """
+    if pg_type.startswith("numeric"):
+        match = re.match(r"numeric\((\d+),(\d+)\)", pg_type)
+        if match and int(match.group(1)) <= 38:
+            return f"DECIMAL({match.group(1)},{match.group(2)})"
+        return None
+    return _DUCKDB_TYPES.get(re.sub(r"\(\d+\)", "", pg_type))
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class MirrorUnavailable(Exception):
+    """本地镜像不可用(未安装duckdb或配置错误)"""
+
+
+class DuckDBMirror:
+    """把选定的表镜像到本地DuckDB列式库, 供只读分析查询使用
+
+    tables: {表名: {"key": 主键列, "updated_at": 更新时间列(可选), "append_only": 只追加(可选),
+                    "types": {列名: DuckDB类型}(可选)}}
+    - 首次同步整表复制; 之后按 updated_at >= 上次最大值(按主键覆盖)增量同步;
+      没有 updated_at 时每次整表重建, 只有声明 append_only 的表才按主键 > 上次最大值追加
+      (这类表源库中的更新不会同步)
+    - 源表的删除计数(n_tup_del)或存储文件(TRUNCATE后变化)与上次同步时不同, 才在增量同步后
+      精确比较源表与镜像的行数, 不一致时改为整表重建; 删除信号不变时不扫描源表
+      (统计计数由各会话延迟上报, 刚发生的删除可能在下一次同步时才被发现)
+    - 列类型无法无损映射时拒绝镜像该表, 除非在 types 中显式指定
+    - 镜像按PostgreSQL的整数除法执行 /, 其余函数和类型语义仍以DuckDB为准
+    - 数据经 COPY ... TO STDOUT 写入临时CSV再由DuckDB批量读取, 内存占用与表大小无关
+    - 镜像库禁止访问外部文件(临时目录除外), 用户查询无法通过 read_csv 等函数读取本地文件
+    """
+
+    def __init__(self, path: str = ":memory:", tables: Optional[dict] = None,
+                 refresh_interval: float = 60.0):
+        if duckdb is None:
+            raise MirrorUnavailable("未安装duckdb, 无法启用本地镜像(pip install duckdb)")
+        self.tables = {}
+        for name, config in (tables or {}).items():
+            if not config.get("key"):
+                raise MirrorUnavailable(f"镜像表 {name} 缺少 key 配置")
+            self.tables[name] = dict(config)
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._staging_dir = tempfile.mkdtemp(prefix="mcp_mirror_")
+        self._db = duckdb.connect(path)
+        self._db.execute(f"SET allowed_directories = ['{self._staging_dir}/']")
+        self._db.execute("SET enable_external_access = false")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS _mcp_mirror_state (
+                table_name VARCHAR PRIMARY KEY,
+                synced_at DOUBLE,
+                watermark VARCHAR,
+                row_count BIGINT
+            )
+        """)
+        self._state = {
+            name: {"synced_at": synced_at, "watermark": watermark, "rows": rows}
+            for name, synced_at, watermark, rows in
+            self._db.execute("SELECT * FROM _mcp_mirror_state").fetchall()
+        }
+        self._locks = {name: threading.Lock() for name in self.tables}
+        # 表名 -> 上次同步开始时的删除信号; 重启后首次增量同步总是精确比较一次行数
+        self._delete_signals: dict[str, str] = {}
+
+    def covers(self, tables: set) -> bool:
+        return bool(tables) and tables <= self.tables.keys()
+
+    def age(self, table: str) -> Optional[float]:
+        """距上次同步的秒数, 从未同步返回None"""
+        state = self._state.get(table)
+        return time.time() - state["synced_at"] if state else None
+
+    def is_stale(self, table: str) -> bool:
+        age = self.age(table)
+        return age is None or age > self.refresh_interval
+
+    def sync_mode(self, table: str) -> str:
+        """例行同步方式: "updated_at" 按更新时间增量, "append_only" 只追加, "full" 整表重建"""
+        config = self.tables[table]
+        if config.get("updated_at"):
+            return "updated_at"
+        return "append_only" if config.get("append_only") else "full"
+
+    def _column_types(self, table: str, columns: list) -> list[tuple[str, str]]:
+        overrides = self.tables[table].get("types") or {}
+        mapped, lossy = [], []
+        for name, pg_type in columns:
+            target = overrides.get(name) or duckdb_type(pg_type)
+            if target is None:
+                lossy.append(f"{name}({pg_type})")
+            mapped.append((name, target))
+        if lossy:
+            raise MirrorUnavailable(
+                f"表 {table} 的列无法无损镜像: {', '.join(lossy)}; 可在镜像配置的 types 中显式指定DuckDB类型"
+            )
+        return mapped
+
+    def refresh(self, conn, table: str, full: bool = False) -> dict:
+        """(工作线程)从PostgreSQL同步一张表, conn为源库连接"""
+        with self._locks[table]:
+            # 在复制数据之前读取, 同步期间发生的删除会在下次同步时发现
+            with conn.cursor() as cursor:
+                cursor.execute(DELETE_SIGNAL_SQL, (sql.Identifier('public', table).as_string(conn),))
+                signal = cursor.fetchone()[0]
+            result = self._refresh(conn, table, full)
+            if result["mode"] == "incremental" and signal != self._delete_signals.get(table):
+                # 增量同步发现不了删除的行, 可能有删除时才精确比较行数, 对不上时整表重建
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.SQL("SELECT count(*) FROM {}.{}").format(
+                        sql.Identifier('public'), sql.Identifier(table)
+                    ))
+                    source_rows = cursor.fetchone()[0]
+                if source_rows != result["rows"]:
+                    elapsed_ms = result["elapsed_ms"]
+                    result = self._refresh(conn, table, True)
+                    result["elapsed_ms"] += elapsed_ms
+            self._delete_signals[table] = signal
+            return result
+
+    def _refresh(self, conn, table: str, full: bool) -> dict:
+        """(需持有表锁)同步一次: 满足条件时增量, 否则整表重建"""
+        started = time.perf_counter()
+        config = self.tables[table]
+        with conn.cursor() as cursor:
+            cursor.execute(SOURCE_COLUMNS_SQL, (table,))
+            columns = self._column_types(table, cursor.fetchall())
+        if not columns:
+            raise MirrorUnavailable(f"源库中不存在表 {table}")
+
+        db = self._db.cursor()
+        try:
+            existing = [row[0] for row in db.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = 'main' AND table_name = ? ORDER BY ordinal_position",
+                [table]
+            ).fetchall()]
+            state = self._state.get(table)
+            # 源表列有变化时无法增量合并, 改为整表重建
+            incremental = (not full and state is not None and self.sync_mode(table) != "full"
+                           and existing == [name for name, _ in columns])
+            watermark_column = config.get("updated_at") or config["key"]
+
+            query = sql.SQL("SELECT {} FROM {}.{}").format(
+                sql.SQL(", ").join(sql.Identifier(name) for name, _ in columns),
+                sql.Identifier('public'), sql.Identifier(table)
+            )
+            if incremental and state["watermark"] is not None:
+                query = sql.SQL("{} WHERE {} {} {}").format(
+                    query, sql.Identifier(watermark_column),
+                    sql.SQL(">=" if config.get("updated_at") else ">"),
+                    sql.Literal(state["watermark"])
+                )
+
+            staging = os.path.join(self._staging_dir, f"{table}.csv")
+            with open(staging, "wb") as file, conn.cursor() as cursor:
+                cursor.copy_expert(
+                    sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, NULL {})").format(
+                        query, sql.Literal(CSV_NULL)
+                    ).as_string(conn),
+                    file
+                )
+            column_types = ", ".join(
+                f"'{name.replace(chr(39), chr(39) * 2)}': '{column_type}'"
+                for name, column_type in columns
+            )
+            source = (
+                f"read_csv('{staging}', header = false, auto_detect = false, "
+                f"nullstr = '{CSV_NULL}', allow_quoted_nulls = false, "
+                f"columns = {{{column_types}}})"
+            )
+
+            target, key = _quote(table), _quote(config["key"])
+            db.execute("BEGIN")
+            try:
+                if incremental:
+                    db.execute(f"CREATE TEMP TABLE _mcp_stage AS SELECT * FROM {source}")
+                    changed = db.execute("SELECT count(*) FROM _mcp_stage").fetchone()[0]
+                    db.execute(f"DELETE FROM {target} WHERE {key} IN (SELECT {key} FROM _mcp_stage)")
+                    db.execute(f"INSERT INTO {target} SELECT * FROM _mcp_stage")
+                    db.execute("DROP TABLE _mcp_stage")
+                else:
+                    db.execute(f"CREATE OR REPLACE TABLE {target} AS SELECT * FROM {source}")
+                    changed = None
+                watermark, rows = db.execute(
+                    f"SELECT max({_quote(watermark_column)})::VARCHAR, count(*) FROM {target}"
+                ).fetchone()
+                synced_at = time.time()
+                db.execute(
+                    "INSERT OR REPLACE INTO _mcp_mirror_state VALUES (?, ?, ?, ?)",
+                    [table, synced_at, watermark, rows]
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            finally:
+                with contextlib.suppress(OSError):
+                    os.remove(staging)
+        finally:
+            db.close()
+
+        self._state[table] = {"synced_at": synced_at, "watermark": watermark, "rows": rows}
+        return {
+            "table": table,
+            "mode": "incremental" if incremental else "full",
+            "changed": rows if changed is None else changed,
+            "rows": rows,
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+        }
+
+    def execute(self, query: str, params: Optional[list] = None) -> tuple[list[str], list]:
+        """(工作线程)在镜像上执行只读查询, 占位符 $1, $2 ... 由DuckDB绑定"""
+        db = self._db.cursor()
+        try:
+            # 与PostgreSQL一致: 整数相除结果为整数(7/2 = 3); 该设置按连接生效
+            db.execute("SET integer_division = true")
+            db.execute(query, params or None)
+            columns = [column[0] for column in db.description]
+            return columns, db.fetchall()
+        finally:
+            db.close()
+
+    def status(self) -> list[dict]:
+        return [
+            {
+                "table": name,
+                "rows": (self._state.get(name) or {}).get("rows"),
+                "watermark": (self._state.get(name) or {}).get("watermark"),
+                "age": self.age(name),
+                "key": config["key"],
+                "updated_at": config.get("updated_at"),
+                "sync_mode": self.sync_mode(name),
+            }
+            for name, config in self.tables.items()
+        ]
+
+    def close(self):
+        self._db.close()
+        shutil.rmtree(self._staging_dir, ignore_errors=True)
+
+
+# 可用的镜像引擎, 通过 mirror_config["engine"] 选择
+MIRROR_ENGINES = {"duckdb": DuckDBMirror}
+
+
+def create_mirror(config: dict):
+    config = dict(config)
+    engine = config.pop("engine", "duckdb")
+    if engine not in MIRROR_ENGINES:
+        raise MirrorUnavailable(f"不支持的镜像引擎:{engine}")
+    return MIRROR_ENGINES[engine](**config)
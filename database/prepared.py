@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+from connection_pool import PooledConnection
+from sql_safety import tokenize
+
+
+def to_pyformat(sql: str) -> str:
+    """把 $1 形式的占位符改写为psycopg2的 %(p1)s 形式, 其余 % 转义, 用于客户端绑定参数"""
+    parts = []
+    for kind, text in tokenize(sql):
+        if kind == "param":
+            parts.append(f"%(p{text[1:]})s")
+        else:
+            parts.append(text.replace("%", "%%"))
+    return "".join(parts)
+
+
+def pyformat_params(params: Sequence) -> dict:
+    return {f"p{index}": value for index, value in enumerate(params, start=1)}
+
+
+# DDL之后, 已缓存的预备语句执行时可能报这些错误, 重新预备一次即可恢复
+STALE_PLAN_ERRORS = {
+    "0A000",  # cached plan must not change result type
+    "42P01",  # undefined_table: 表被删除后重建
+    "42703",  # undefined_column
+}
+
+
+def is_stale_plan_error(error: Exception) -> bool:
+    return getattr(error, "pgcode", None) in STALE_PLAN_ERRORS
+
+
+class PreparedStatements:
+    """按语句文本缓存每个连接上的预备语句(PREPARE/EXECUTE)
+
+    相同形状的查询(只有参数不同)在同一连接上只解析一次; 每个连接最多保留
+    max_per_connection 条, 超出时按LRU淘汰并 DEALLOCATE。
+    预备语句属于会话级状态, 不受事务回滚影响, 因此可以跨调用复用。
+    语句文本第一次出现时直接执行, 不预备: 一次性查询不多付一次PREPARE往返;
+    最近 max_seen 条出现过的语句文本再次出现时才预备。
+    """
+
+    def __init__(self, max_per_connection: int = 64, max_seen: int = 1024):
+        self.max_per_connection = max_per_connection
+        self.max_seen = max_seen
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "direct": 0, "evictions": 0, "replans": 0}
+
+    def _statements(self, pooled: PooledConnection) -> OrderedDict:
+        return pooled.state.setdefault("prepared", OrderedDict())
+
+    def prepare(self, pooled: PooledConnection, cursor, sql: str) -> tuple[Optional[str], bool]:
+        """(工作线程)确保语句已在该连接上预备, 返回(语句名, 是否命中缓存)
+
+        语句第一次出现时不预备, 返回的语句名为None, 由 statement 改写为直接执行。
+        """
+        # 上次执行失败而丢弃的语句, 在事务恢复正常后再释放
+        for stale in pooled.state.pop("prepared_garbage", []):
+            cursor.execute(f"DEALLOCATE {stale}")
+        statements = self._statements(pooled)
+        name = statements.get(sql)
+        if name is not None:
+            statements.move_to_end(sql)
+            with self._lock:
+                self.stats["hits"] += 1
+            return name, True
+
+        with self._lock:
+            if sql not in self._seen:
+                self._seen[sql] = None
+                while len(self._seen) > self.max_seen:
+                    self._seen.popitem(last=False)
+                self.stats["direct"] += 1
+                return None, False
+            self._seen.move_to_end(sql)
+            self._next_id += 1
+            name = f"mcp_ps_{self._next_id}"
+            self.stats["misses"] += 1
+        # 不传参数执行, psycopg2不会解析语句中的 %
+        cursor.execute(f"PREPARE {name} AS {sql}")
+        statements[sql] = name
+        while len(statements) > self.max_per_connection:
+            _, evicted = statements.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {evicted}")
+            with self._lock:
+                self.stats["evictions"] += 1
+        return name, False
+
+    def discard(self, pooled: PooledConnection, sql: str):
+        """(工作线程)丢弃执行失败的预备语句, 下次调用时重新预备
+
+        所在事务已中止, 无法立即 DEALLOCATE, 留到该连接下次 prepare 时释放。
+        """
+        name = self._statements(pooled).pop(sql, None)
+        if name is not None:
+            pooled.state.setdefault("prepared_garbage", []).append(name)
+            with self._lock:
+                self.stats["replans"] += 1
+
+    @staticmethod
+    def execute_sql(name: str, params: Optional[Sequence]) -> str:
+        if not params:
+            return f"EXECUTE {name}"
+        return f"EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+
+    @classmethod
+    def statement(cls, name: Optional[str], sql: str,
+                  params: Optional[Sequence]) -> tuple[str, Optional[Sequence | dict]]:
+        """要执行的(语句, 参数): 已预备时为EXECUTE, 否则直接执行原语句, 参数在客户端绑定"""
+        if name is not None:
+            return cls.execute_sql(name, params), params or None
+        if not params:
+            return sql, None
+        return to_pyformat(sql), pyformat_params(params)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"] + self.stats["direct"]
+            return {**self.stats, "hit_rate": self.stats["hits"] / total if total else 0.0}
@@ -0,0 +1,146 @@
+from typing import Optional
+from psycopg2 import sql
+
+NUMERIC_TYPES = {
+    'smallint', 'integer', 'bigint', 'numeric', 'decimal', 'real', 'double precision'
+}
+TEMPORAL_TYPES = {
+    'date', 'timestamp without time zone', 'timestamp with time zone',
+    'time without time zone', 'time with time zone'
+}
+CATEGORICAL_TYPES = {
+    'character varying', 'character', 'text', 'boolean', 'uuid', 'USER-DEFINED'
+}
+
+
+def column_kind(data_type: str) -> str:
+    """列的统计类别: numeric(直方图), temporal(范围), categorical(Top-K), other(仅空值)"""
+    if data_type in NUMERIC_TYPES:
+        return "numeric"
+    if data_type in TEMPORAL_TYPES:
+        return "temporal"
+    if data_type in CATEGORICAL_TYPES:
+        return "categorical"
+    return "other"
+
+
+def build_profile_query(table_name: str, columns: list[dict], sample_percent: Optional[float],
+                        top_k: int, buckets: int) -> sql.Composed:
+    """构造单条统计SQL: 表(或抽样)只扫描一次, 物化后在内存中计算各列统计"""
+    source = sql.SQL("{}.{}").format(sql.Identifier('public'), sql.Identifier(table_name))
+    if sample_percent is not None:
+        source = sql.SQL("{} TABLESAMPLE SYSTEM ({})").format(source, sql.Literal(float(sample_percent)))
+
+    aggregates = [sql.SQL("count(*) AS n")]
+    top_values = []
+    histograms = []
+    for index, column in enumerate(columns):
+        col = sql.Identifier(column['column_name'])
+        kind = column_kind(column['data_type'])
+        aggregates.append(sql.SQL("count({}) AS {}").format(col, sql.Identifier(f"nonnull_{index}")))
+        if kind == "other":
+            continue
+        aggregates.append(sql.SQL("count(DISTINCT {}) AS {}").format(col, sql.Identifier(f"distinct_{index}")))
+        if kind in ("numeric", "temporal"):
+            aggregates.append(sql.SQL("min({})::text AS {}").format(col, sql.Identifier(f"min_{index}")))
+            aggregates.append(sql.SQL("max({})::text AS {}").format(col, sql.Identifier(f"max_{index}")))
+        if kind == "numeric":
+            aggregates.append(sql.SQL("avg({})::float8 AS {}").format(col, sql.Identifier(f"avg_{index}")))
+            lo, hi = sql.Identifier(f"lo_{index}"), sql.Identifier(f"hi_{index}")
+            aggregates.append(sql.SQL("min({})::float8 AS {}").format(col, lo))
+            aggregates.append(sql.SQL("max({})::float8 AS {}").format(col, hi))
+            histograms.append(sql.SQL("""
+                {key}, (SELECT jsonb_agg(jsonb_build_array(b, cnt) ORDER BY b) FROM (
+                    SELECT CASE WHEN basic.{hi} = basic.{lo} THEN 1
+                                ELSE least(width_bucket({col}::float8, basic.{lo}, basic.{hi}, {buckets}), {buckets})
+                           END AS b,
+                           count(*) AS cnt
+                    FROM s WHERE {col} IS NOT NULL GROUP BY 1
+                ) h)
+            """).format(key=sql.Literal(str(index)), col=col, lo=lo, hi=hi, buckets=sql.Literal(buckets)))
+        elif kind == "categorical":
+            top_values.append(sql.SQL("""
+                {key}, (SELECT jsonb_agg(jsonb_build_array(v, cnt) ORDER BY cnt DESC, v) FROM (
+                    SELECT {col}::text AS v, count(*) AS cnt
+                    FROM s WHERE {col} IS NOT NULL
+                    GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT {k}
+                ) t)
+            """).format(key=sql.Literal(str(index)), col=col, k=sql.Literal(top_k)))
+
+    select_list = sql.SQL(", ").join(sql.Identifier(column['column_name']) for column in columns)
+    return sql.SQL("""
+        WITH s AS MATERIALIZED (SELECT {select_list} FROM {source}),
+        basic AS (SELECT {aggregates} FROM s)
+        SELECT row_to_json(basic)::jsonb,
+               jsonb_build_object({top_values}),
+               jsonb_build_object({histograms})
+        FROM basic
+    """).format(
+        select_list=select_list,
+        source=source,
+        aggregates=sql.SQL(", ").join(aggregates),
+        top_values=sql.SQL(", ").join(top_values),
+        histograms=sql.SQL(", ").join(histograms),
+    )
+
+
+def parse_profile(row: tuple, columns: list[dict], buckets: int) -> dict:
+    """把统计SQL的结果整理为 {"rows": n, "columns": [...]}"""
+    basic, top_values, histograms = row
+    total = basic["n"]
+    profile = {"rows": total, "columns": []}
+    for index, column in enumerate(columns):
+        kind = column_kind(column['data_type'])
+        nonnull = basic[f"nonnull_{index}"]
+        stats = {
+            "name": column['column_name'],
+            "type": column['data_type'],
+            "null_fraction": round(1 - nonnull / total, 4) if total else None,
+        }
+        if kind != "other":
+            stats["distinct"] = basic[f"distinct_{index}"]
+        if kind in ("numeric", "temporal"):
+            stats["min"] = basic[f"min_{index}"]
+            stats["max"] = basic[f"max_{index}"]
+        if kind == "numeric":
+            stats["avg"] = basic[f"avg_{index}"]
+            lo, hi = basic[f"lo_{index}"], basic[f"hi_{index}"]
+            width = (hi - lo) / buckets if lo is not None and hi != lo else 0
+            stats["histogram"] = [
+                [round(lo + (bucket - 1) * width, 4), round(lo + bucket * width, 4), count]
+                for bucket, count in (histograms.get(str(index)) or [])
+            ]
+        elif kind == "categorical":
+            stats["top_values"] = top_values.get(str(index)) or []
+        profile["columns"].append(stats)
+    return profile
+
+
+def format_profile(table_name: str, profile: dict, sample_percent: Optional[float],
+                   row_estimate: Optional[int]) -> str:
+    if sample_percent is None:
+        header = f"📈 表 '{table_name}' 概况: 全表{profile['rows']}行"
+    else:
+        header = (
+            f"📈 表 '{table_name}' 概况: 抽样{sample_percent:g}%, 样本{profile['rows']}行"
+            f"(估计总行数{row_estimate if row_estimate is not None else '未知'}, 不同值计数基于样本)"
+        )
+    lines = [header]
+    for stats in profile["columns"]:
+        parts = []
+        if stats["null_fraction"] is not None:
+            parts.append(f"空值{stats['null_fraction']:.1%}")
+        if "distinct" in stats:
+            parts.append(f"不同值{stats['distinct']}")
+        if stats.get("min") is not None:
+            parts.append(f"范围[{stats['min']}, {stats['max']}]")
+        if stats.get("avg") is not None:
+            parts.append(f"平均{stats['avg']:.6g}")
+        if stats.get("histogram"):
+            parts.append("分布 " + " ".join(
+                f"[{low:.6g},{high:.6g}):{count}" for low, high, count in stats["histogram"]
+            ))
+        if stats.get("top_values"):
+            parts.append("Top " + ", ".join(f"{value}({count})" for value, count in stats["top_values"]))
+        lines.append(f"- {stats['name']} ({stats['type']}): " + ", ".join(parts))
+    return "\n".join(lines)
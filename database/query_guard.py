@@ -0,0 +1,133 @@
+from typing import Optional
+from sql_safety import tokenize
+
+
+class QueryRejected(Exception):
+    """执行计划超过阈值, 查询被拒绝"""
+
+    def __init__(self, message: str, plan: dict):
+        super().__init__(message)
+        self.plan = plan
+
+
+def strip_statement(sql: str) -> str:
+    """去掉语句末尾的分号和空白, 便于作为子查询嵌套"""
+    tokens = list(tokenize(sql))
+    while tokens and tokens[-1][0] in ("ws", "semicolon"):
+        tokens.pop()
+    return "".join(text for _, text in tokens)
+
+
+def wrap_limit(sql: str, limit: int) -> str:
+    """把用户查询包装为子查询再限制行数, 不依赖对原SQL做字符串拼接"""
+    return f"SELECT * FROM ({strip_statement(sql)}) AS _mcp_query LIMIT {int(limit)}"
+
+
+_BLOCKING_NODES = {"Sort", "Hash", "HashAggregate", "SetOp", "Materialize"}
+
+
+def summarize_plan(plan: dict) -> dict:
+    """从 EXPLAIN (FORMAT JSON) 的结果中提取摘要"""
+    root = plan["Plan"]
+    summary = {
+        "node_type": root["Node Type"],
+        "total_cost": root["Total Cost"],
+        "result_rows": root["Plan Rows"],
+        "max_node_rows": 0,
+        "seq_scans": [],
+        "sorts": 0,
+    }
+    # Limit 之下的节点通常不会执行完, 按 Limit 与子节点的成本比例折算实际处理行数
+    stack = [(root, 1.0)]
+    while stack:
+        node, fraction = stack.pop()
+        rows = int(node.get("Plan Rows", 0) * fraction)
+        summary["max_node_rows"] = max(summary["max_node_rows"], rows)
+        if node["Node Type"] == "Seq Scan":
+            summary["seq_scans"].append({
+                "relation": node.get("Relation Name"),
+                "rows": rows,
+            })
+        elif node["Node Type"] in ("Sort", "Incremental Sort"):
+            summary["sorts"] += 1
+        for child in node.get("Plans", []):
+            if (node["Node Type"] in _BLOCKING_NODES
+                    or (node["Node Type"] == "Aggregate" and node.get("Strategy") != "Sorted")):
+                # 排序/哈希等节点必须先读完全部输入
+                child_fraction = 1.0
+            elif node["Node Type"] == "Limit":
+                run_cost = child["Total Cost"] - child["Startup Cost"]
+                used = node["Total Cost"] - child["Startup Cost"]
+                child_fraction = fraction * (min(1.0, max(used, 0.0) / run_cost) if run_cost > 0 else 1.0)
+            else:
+                child_fraction = fraction
+            stack.append((child, child_fraction))
+    return summary
+
+
+def format_plan(summary: dict) -> str:
+    text = (
+        f"🧭 执行计划: {summary['node_type']}, 估计成本{summary['total_cost']:.0f}, "
+        f"估计返回{summary['result_rows']}行, 单个节点最多处理{summary['max_node_rows']}行"
+    )
+    if summary["seq_scans"]:
+        scans = ", ".join(f"{scan['relation']}(约{scan['rows']}行)" for scan in summary["seq_scans"])
+        text += f", 全表扫描: {scans}"
+    if summary["sorts"]:
+        text += f", 排序{summary['sorts']}次"
+    return text
+
+
+class QueryGuard:
+    """基于执行计划的查询保护
+
+    - explain: 默认是否在执行前先运行 EXPLAIN (FORMAT JSON)
+    - max_cost: 计划总成本上限, None表示不限
+    - max_rows: 计划中任一节点估计处理行数的上限, None表示不限
+    - action: 超过阈值时 "reject"(拒绝执行) 或 "warn"(执行并附带警告)
+    - statement_timeout_ms: 默认语句超时(毫秒), 0表示不限
+    - max_statement_timeout_ms: 调用方可请求的最大超时
+    """
+
+    def __init__(self, explain: bool = False, max_cost: Optional[float] = None,
+                 max_rows: Optional[int] = None, action: str = "reject",
+                 statement_timeout_ms: int = 30000, max_statement_timeout_ms: int = 300000):
+        if action not in ("reject", "warn"):
+            raise ValueError(f"action只能是reject或warn: {action}")
+        self.explain = explain
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.action = action
+        self.statement_timeout_ms = statement_timeout_ms
+        self.max_statement_timeout_ms = max_statement_timeout_ms
+
+    def timeout_for(self, requested_ms: Optional[int]) -> int:
+        timeout = self.statement_timeout_ms if requested_ms is None else int(requested_ms)
+        if self.max_statement_timeout_ms:
+            timeout = min(timeout, self.max_statement_timeout_ms) if timeout > 0 else self.max_statement_timeout_ms
+        return max(timeout, 0)
+
+    def apply_timeout(self, cursor, requested_ms: Optional[int] = None):
+        """(工作线程)为当前事务设置statement_timeout, 事务结束(连接归还时回滚)后自动失效"""
+        cursor.execute("SELECT set_config('statement_timeout', %s, true)",
+                       (str(self.timeout_for(requested_ms)),))
+
+    def violations(self, summary: dict) -> list[str]:
+        problems = []
+        if self.max_cost is not None and summary["total_cost"] > self.max_cost:
+            problems.append(f"估计成本{summary['total_cost']:.0f}超过上限{self.max_cost:.0f}")
+        if self.max_rows is not None and summary["max_node_rows"] > self.max_rows:
+            problems.append(f"估计处理{summary['max_node_rows']}行超过上限{self.max_rows}")
+        return problems
+
+    def check(self, cursor, sql: str, params=None) -> tuple[dict, list[str]]:
+        """(工作线程)执行EXPLAIN并按阈值判定; action=reject时超限抛出QueryRejected
+
+        返回: (计划摘要, 警告列表)
+        """
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        summary = summarize_plan(cursor.fetchone()[0][0])
+        problems = self.violations(summary)
+        if problems and self.action == "reject":
+            raise QueryRejected("; ".join(problems), summary)
+        return summary, problems
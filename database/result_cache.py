@@ -0,0 +1,211 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+from sql_safety import tokenize
+
+# 默认失效信号: 表的增删改计数, 任何写入都会让计数变化
+# - 视图递归展开为其依赖的表(pg_rewrite的依赖), 分区表展开为各分区, 版本为所有底层表计数的组合
+# - 外部表、没有统计信息的关系, 以及与非public模式同名的标识符返回NULL, 表示无法跟踪,
+#   引用它们的查询不缓存
+DEFAULT_VERSION_SQL = """
+    WITH RECURSIVE names AS (
+        SELECT unnest(%s::text[]) AS name
+    ), edges AS (
+        SELECT r.ev_class AS parent, d.refobjid AS child
+        FROM pg_rewrite r
+        JOIN pg_depend d
+            ON d.classid = 'pg_rewrite'::regclass AND d.objid = r.oid
+            AND d.refclassid = 'pg_class'::regclass AND d.refobjid <> r.ev_class
+        UNION
+        SELECT inhparent, inhrelid FROM pg_inherits
+    ), deps AS (
+        SELECT c.relname::text AS name, c.oid AS relid
+        FROM pg_class c
+        JOIN names n ON n.name = c.relname
+        WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+        UNION
+        SELECT deps.name, edges.child
+        FROM deps
+        JOIN edges ON edges.parent = deps.relid
+    )
+    SELECT deps.name,
+           CASE WHEN bool_or(c.relkind = 'f' OR (c.relkind IN ('r', 'm') AND s.relid IS NULL))
+                THEN NULL
+                ELSE string_agg(
+                    deps.relid::text || '=' || concat_ws(':', s.n_tup_ins, s.n_tup_upd,
+                                                         s.n_tup_del, s.n_live_tup),
+                    ',' ORDER BY deps.relid
+                ) FILTER (WHERE s.relid IS NOT NULL)
+           END
+    FROM deps
+    JOIN pg_class c ON c.oid = deps.relid
+    LEFT JOIN pg_stat_all_tables s ON s.relid = deps.relid AND c.relkind IN ('r', 'm')
+    GROUP BY deps.name
+    UNION ALL
+    SELECT nspname::text, NULL
+    FROM pg_namespace
+    JOIN names ON names.name = nspname
+    WHERE nspname <> 'public'
+"""
+
+# 标识符不是可跟踪的关系(关键字、列名等)时在版本缓存中的占位
+_NOT_A_TABLE = object()
+
+def normalize_sql(sql: str) -> str:
+    """规范化SQL用作缓存键: 合并字符串常量之外的空白, 去掉末尾分号"""
+    return "".join(
+        " " if kind == "ws" else text
+        for kind, text in tokenize(sql.strip().rstrip(';').strip())
+    )
+
+
+def identifiers(sql: str) -> set[str]:
+    """SQL中出现的所有标识符(未加引号的转小写), 不含字符串常量内的内容"""
+    names = set()
+    for kind, text in tokenize(sql):
+        if kind == "word":
+            names.add(text.lower())
+        elif kind == "ident":
+            names.add(text[1:-1].replace('""', '"'))
+    return names
+
+
+class _Entry:
+    __slots__ = ("payload", "size", "versions", "expires_at")
+
+    def __init__(self, payload: str, versions: dict, expires_at: float):
+        self.payload = payload
+        self.size = len(payload.encode('utf-8'))
+        self.versions = versions
+        self.expires_at = expires_at
+
+
+class ResultCache:
+    """按字节预算淘汰的查询结果LRU缓存
+
+    - max_bytes: 缓存结果的总字节上限
+    - max_entry_bytes: 单个结果超过该大小不缓存
+    - ttl: 结果最长有效期(秒)
+    - version_sql: 失效信号查询, 参数为标识符数组, 返回(表名, 版本)行, 版本为NULL表示
+      无法跟踪; 默认使用底层表在pg_stat_all_tables中的增删改计数
+    - check_interval: 表版本的复用时间(秒), 避免每次调用都查询失效信号
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_entry_bytes: Optional[int] = None,
+                 ttl: float = 300.0, version_sql: str = DEFAULT_VERSION_SQL,
+                 check_interval: float = 1.0):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self.ttl = ttl
+        self.version_sql = version_sql
+        self.check_interval = check_interval
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._bytes = 0
+        # 标识符 -> (版本, 查询时间); 版本为None表示无法跟踪, _NOT_A_TABLE表示不是表
+        self._versions: dict[str, tuple[object, float]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(sql: str, *options) -> tuple:
+        return (normalize_sql(sql), *options)
+
+    @staticmethod
+    def cacheable(versions: dict) -> bool:
+        """至少引用了一个表, 且所有表都有版本时结果才能缓存; 否则写入后只能等TTL过期"""
+        return bool(versions) and all(version is not None for version in versions.values())
+
+    def _collect(self, names: Iterable[str], now: float) -> Optional[dict]:
+        """(需持有锁)check_interval内的版本; 任一标识符需要重新查询时返回None"""
+        versions = {}
+        for name in names:
+            cached = self._versions.get(name)
+            if cached is None or now - cached[1] >= self.check_interval:
+                return None
+            if cached[0] is not _NOT_A_TABLE:
+                versions[name] = cached[0]
+        return versions
+
+    def cached_versions(self, names: Iterable[str]) -> Optional[dict]:
+        """所有标识符的版本都在check_interval内时直接返回, 否则返回None"""
+        with self._lock:
+            return self._collect(names, time.monotonic())
+
+    def table_versions(self, conn, names: Iterable[str]) -> dict:
+        """(工作线程)读取SQL标识符中各个表的当前版本, check_interval内复用上次结果
+
+        返回 {表名: 版本}, 不是表的标识符不出现在结果中; 版本为None表示无法跟踪。
+        """
+        now = time.monotonic()
+        names = sorted(set(names))
+        with self._lock:
+            stale = [
+                name for name in names
+                if name not in self._versions
+                or now - self._versions[name][1] >= self.check_interval
+            ]
+        if stale:
+            with conn.cursor() as cursor:
+                cursor.execute(self.version_sql, (stale,))
+                fresh = {
+                    name: None if version is None else str(version)
+                    for name, version in cursor.fetchall()
+                }
+            with self._lock:
+                for name in stale:
+                    self._versions[name] = (fresh.get(name, _NOT_A_TABLE), now)
+        with self._lock:
+            return self._collect(names, float("-inf")) or {}
+
+    def get(self, key: tuple, versions: dict) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > time.monotonic() and entry.versions == versions:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry.payload
+                self._remove(key)
+                self.stats["invalidations"] += 1
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: tuple, payload: str, versions: dict):
+        entry = _Entry(payload, versions, time.monotonic() + self.ttl)
+        if entry.size > self.max_entry_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def invalidate_tables(self, tables: Iterable[str]):
+        """主动失效引用了指定表的结果"""
+        tables = set(tables)
+        with self._lock:
+            for table in tables:
+                self._versions.pop(table, None)
+            for key in [k for k, e in self._entries.items() if tables & e.versions.keys()]:
+                self._remove(key)
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._bytes = 0
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes}
@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Sequence
+
+FORMATS = ("json", "columnar", "csv", "markdown")
+
+
+def _decimal(value: Decimal):
+    # 15位有效数字以内的小数可以无损转为JSON数字, 否则保留字符串以免丢失精度
+    if value.is_finite() and len(value.as_tuple().digits) <= 15:
+        return int(value) if value == value.to_integral_value() and value.as_tuple().exponent >= 0 else float(value)
+    return str(value)
+
+
+# 按类型直接查表转换, 避免 json.dumps(default=str) 对每个值的回退调用
+_CONVERTERS = {
+    Decimal: _decimal,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    time: time.isoformat,
+    timedelta: str,
+    uuid.UUID: str,
+    memoryview: lambda value: value.tobytes().hex(),
+    bytes: bytes.hex,
+}
+
+
+def convert_value(value: Any) -> Any:
+    """把数据库返回的值转为JSON原生类型"""
+    converter = _CONVERTERS.get(type(value))
+    if converter is not None:
+        return converter(value)
+    if isinstance(value, (list, tuple)):
+        return [convert_value(item) for item in value]
+    return value
+
+
+def convert_rows(rows: Sequence[Sequence]) -> list[list]:
+    return [[convert_value(value) for value in row] for row in rows]
+
+
+def _to_json(columns: list[str], rows: list[list]) -> str:
+    return json.dumps([dict(zip(columns, row)) for row in rows], indent=2, ensure_ascii=False)
+
+
+def _to_columnar(columns: list[str], rows: list[list]) -> str:
+    return json.dumps({"columns": columns, "rows": rows},
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def _to_csv(columns: list[str], rows: list[list]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    writer.writerows(
+        [json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else value
+         for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().rstrip('\n')
+
+
+def _markdown_cell(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value, ensure_ascii=False)
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def _to_markdown(columns: list[str], rows: list[list]) -> str:
+    lines = [
+        "| " + " | ".join(_markdown_cell(column) for column in columns) + " |",
+        "|" + "---|" * len(columns),
+    ]
+    lines.extend("| " + " | ".join(_markdown_cell(value) for value in row) + " |" for row in rows)
+    return "\n".join(lines)
+
+
+_FORMATTERS = {
+    "json": _to_json,
+    "columnar": _to_columnar,
+    "csv": _to_csv,
+    "markdown": _to_markdown,
+}
+
+
+def format_rows(columns: list[str], rows: Sequence[Sequence], fmt: str = "json") -> str:
+    """按指定格式序列化结果集
+
+    - json: 每行一个对象(兼容原有输出)
+    - columnar: 列名只出现一次, 行以数组表示
+    - csv / markdown: 表格文本
+    """
+    formatter = _FORMATTERS.get(fmt)
+    if formatter is None:
+        raise ValueError(f"不支持的输出格式:{fmt}, 可选:{', '.join(FORMATS)}")
+    return formatter(columns, convert_rows(rows))
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计token数: ASCII约4个字符一个token, 其他字符(如中文)约一个字符一个token"""
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def size_note(fmt: str, payload: str) -> str:
+    return f"📦 格式={fmt}, {len(payload.encode('utf-8'))}字节, 约{estimate_tokens(payload)} tokens"
@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Optional
+from psycopg2.extras import RealDictCursor
+
+# 目录变更标记: public模式下表/索引/列在系统表中的xmin, 任何DDL(以及ANALYZE)都会改变它
+CATALOG_MARKER_SQL = """
+    SELECT md5(coalesce(string_agg(marker, ',' ORDER BY marker), ''))
+    FROM (
+        SELECT c.oid::text || ':' || c.xmin::text AS marker
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm', 'i')
+        UNION ALL
+        SELECT a.attrelid::text || '.' || a.attnum::text || ':' || a.xmin::text
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm')
+          AND a.attnum > 0 AND NOT a.attisdropped
+    ) m
+"""
+
+TABLES_SQL = """
+    SELECT t.table_name, t.table_type, c.reltuples::bigint AS row_estimate
+    FROM information_schema.tables t
+    LEFT JOIN pg_class c
+        ON c.relname = t.table_name
+        AND c.relnamespace = 'public'::regnamespace
+    WHERE t.table_schema = 'public'
+    ORDER BY t.table_name
+"""
+
+COLUMNS_SQL = """
+    SELECT table_name, column_name, data_type, is_nullable, column_default
+    FROM information_schema.columns
+    WHERE table_schema = 'public'
+    ORDER BY table_name, ordinal_position
+"""
+
+PRIMARY_KEYS_SQL = """
+    SELECT tc.table_name, kcu.column_name
+    FROM information_schema.table_constraints tc
+    JOIN information_schema.key_column_usage kcu
+        ON kcu.constraint_schema = tc.constraint_schema
+        AND kcu.constraint_name = tc.constraint_name
+    WHERE tc.table_schema = 'public' AND tc.constraint_type = 'PRIMARY KEY'
+    ORDER BY tc.table_name, kcu.ordinal_position
+"""
+
+
+class SchemaCache:
+    """public模式的表结构缓存
+
+    - ttl: 缓存最长有效期(秒), 过期后无条件重新加载
+    - check_interval: 有效期内每隔多少秒比较一次目录变更标记, 标记变化即重新加载
+    """
+
+    def __init__(self, ttl: float = 300.0, check_interval: float = 5.0):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._tables: Optional[dict] = None
+        self._marker: Optional[str] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "checks": 0, "reloads": 0}
+
+    def invalidate(self):
+        with self._lock:
+            self._tables = None
+
+    def _read_marker(self, conn) -> str:
+        with conn.cursor() as cursor:
+            cursor.execute(CATALOG_MARKER_SQL)
+            return cursor.fetchone()[0]
+
+    def _load(self, conn) -> dict:
+        """一次性读取所有表、列、主键和行数估计"""
+        tables = {}
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(TABLES_SQL)
+            for row in cursor.fetchall():
+                estimate = row['row_estimate']
+                tables[row['table_name']] = {
+                    "table_type": row['table_type'],
+                    # reltuples为-1表示从未ANALYZE过
+                    "row_estimate": estimate if estimate is not None and estimate >= 0 else None,
+                    "primary_key": [],
+                    "columns": [],
+                }
+            cursor.execute(COLUMNS_SQL)
+            for row in cursor.fetchall():
+                table = tables.get(row['table_name'])
+                if table is not None:
+                    table["columns"].append({
+                        "column_name": row['column_name'],
+                        "data_type": row['data_type'],
+                        "is_nullable": row['is_nullable'],
+                        "column_default": row['column_default'],
+                    })
+            cursor.execute(PRIMARY_KEYS_SQL)
+            for row in cursor.fetchall():
+                table = tables.get(row['table_name'])
+                if table is not None:
+                    table["primary_key"].append(row['column_name'])
+        return tables
+
+    def peek(self) -> Optional[dict]:
+        """无需访问数据库即可确认有效时直接返回缓存, 否则返回None"""
+        with self._lock:
+            now = time.monotonic()
+            if (self._tables is not None
+                    and now - self._loaded_at < self.ttl
+                    and now - self._checked_at < self.check_interval):
+                self.stats["hits"] += 1
+                return self._tables
+            return None
+
+    def get(self, conn, refresh: bool = False) -> dict:
+        """(工作线程)返回 {表名: 表结构}, 必要时使用conn校验或重新加载"""
+        with self._lock:
+            now = time.monotonic()
+            if (not refresh and self._tables is not None
+                    and now - self._loaded_at < self.ttl):
+                if now - self._checked_at < self.check_interval:
+                    self.stats["hits"] += 1
+                    return self._tables
+                self.stats["checks"] += 1
+                marker = self._read_marker(conn)
+                self._checked_at = time.monotonic()
+                if marker == self._marker:
+                    self.stats["hits"] += 1
+                    return self._tables
+            else:
+                marker = self._read_marker(conn)
+
+            self.stats["reloads"] += 1
+            self._tables = self._load(conn)
+            self._marker = marker
+            self._loaded_at = self._checked_at = time.monotonic()
+            return self._tables
@@ -1,51 +1,113 @@
 import re
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Iterator, Tuple
+
+# 单次扫描的SQL词法规则(预编译), 按顺序匹配:
+# 字符串常量/美元引用/带引号标识符作为整体识别, 其中的内容不会被当作关键字、注释或分号
+_TOKEN_RE = re.compile(r"""
+      (?P<ws>\s+)
+    | (?P<comment>--|/\*|\#)
+    | (?P<string>[Ee]'(?:[^'\\]|''|\\.)*'|'(?:[^']|'')*')
+    | (?P<dollar>\$(?P<tag>[A-Za-z_][A-Za-z0-9_]*|)\$.*?\$(?P=tag)\$)
+    | (?P<ident>"(?:[^"]|"")*")
+    | (?P<unterminated>['"]|\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[Ee][+-]?\d+)?)
+    | (?P<param>\$\d+)
+    | (?P<semicolon>;)
+    | (?P<op>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+def tokenize(sql: str) -> Iterator[Tuple[str, str]]:
+    """把SQL切分为(类型, 文本)序列
+
+    类型: ws, comment, string, dollar, ident, unterminated, word, number, param, semicolon, op
+    """
+    for match in _TOKEN_RE.finditer(sql):
+        yield match.lastgroup, match.group()
+
 
 class SQLSafetyChecker:
     """SQL安全检查器"""
-    
+
     # 允许的SQL操作(白名单)
     ALLOWED_OPERATIONS = {'SELECT'}
-    
+
     # 危险关键字(黑名单)
     DANGEROUS_KEYWORDS = {
         'DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER',
         'CREATE', 'TRUNCATE', 'GRANT', 'REVOKE', 'EXEC'
     }
-    
+
     @classmethod
     def check(cls, sql: str) -> Tuple[bool, str]:
         """
         检查SQL是否安全
         返回: (是否安全, 错误信息)
         """
-        sql_upper = sql.upper().strip()
-        
-        # 1. 检查是否以允许的操作开头
-        operation = sql_upper.split()[0]
-        if operation not in cls.ALLOWED_OPERATIONS:
-            return False, f"不允许的操作:{operation}"
-        
-        # 2. 检查危险关键字
-        for keyword in cls.DANGEROUS_KEYWORDS:
-            if re.search(rf'\b{keyword}\b', sql_upper):
+        return _check_cached(cls, sql)
+
+    @classmethod
+    def _check(cls, sql: str) -> Tuple[bool, str]:
+        operation = None
+        seen_semicolon = False
+        for kind, text in tokenize(sql):
+            if kind == "ws":
+                continue
+
+            # 1. 检查注释注入(--、/*或#), 字符串常量中的同样字符不受影响
+            if kind == "comment":
+                return False, "不允许使用SQL注释"
+
+            if kind == "unterminated":
+                return False, "SQL不完整:存在未闭合的字符串或标识符"
+
+            # 2. 检查多语句(;), 只允许末尾出现分号
+            if seen_semicolon:
+                if kind == "semicolon":
+                    continue
+                return False, "不允许执行多条SQL语句"
+            if kind == "semicolon":
+                seen_semicolon = True
+                continue
+
+            if kind != "word":
+                if operation is None:
+                    return False, f"不允许的操作:{text}"
+                continue
+
+            keyword = text.upper()
+
+            # 3. 检查是否以允许的操作开头
+            if operation is None:
+                if keyword not in cls.ALLOWED_OPERATIONS:
+                    return False, f"不允许的操作:{keyword}"
+                operation = keyword
+                continue
+
+            # 4. 检查危险关键字(只检查裸关键字, 字符串常量和带引号标识符不算)
+            if keyword in cls.DANGEROUS_KEYWORDS:
                 return False, f"包含危险关键字:{keyword}"
-        
-        # 3. 检查注释注入(--或#)
-        if '--' in sql or '#' in sql:
-            return False, "不允许使用SQL注释"
-        
-        # 4. 检查多语句(;)
-        if sql.count(';') > 1:
-            return False, "不允许执行多条SQL语句"
-        
+
+        if operation is None:
+            return False, "SQL语句为空"
+
         return True, "安全检查通过"
 
-# 使用示例
-safe_sql = "SELECT * FROM orders WHERE status = 'completed'"
-is_safe, msg = SQLSafetyChecker.check(safe_sql)
-print(f"✅ {msg}")  # 安全检查通过
 
-unsafe_sql = "SELECT * FROM users; DROP TABLE users;"
-is_safe, msg = SQLSafetyChecker.check(unsafe_sql)
-print(f"❌ {msg}")  # 不允许执行多条SQL语句
\ No newline at end of file
+@lru_cache(maxsize=1024)
+def _check_cached(checker: type, sql: str) -> Tuple[bool, str]:
+    """缓存最近检查过的语句的结论, Agent经常重复提交相同的SQL"""
+    return checker._check(sql)
+
+
+if __name__ == "__main__":
+    # 使用示例
+    safe_sql = "SELECT * FROM orders WHERE status = 'completed'"
+    is_safe, msg = SQLSafetyChecker.check(safe_sql)
+    print(f"✅ {msg}")  # 安全检查通过
+
+    unsafe_sql = "SELECT * FROM users; DROP TABLE users;"
+    is_safe, msg = SQLSafetyChecker.check(unsafe_sql)
+    print(f"❌ {msg}")  # 不允许执行多条SQL语句
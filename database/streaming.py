@@ -0,0 +1,142 @@
+import threading
+import time
+import uuid
+from typing import Optional
+from connection_pool import ConnectionPool, PooledConnection
+
+
+class OpenCursor:
+    """一个打开的服务端游标, 独占一条连接直到读完或过期"""
+
+    def __init__(self, token: str, pooled: PooledConnection, cursor, sql: str,
+                 fmt: str = "json", lookahead: list | None = None):
+        self.token = token
+        self.pooled = pooled
+        self.cursor = cursor
+        self.sql = sql
+        self.fmt = fmt
+        self.columns = [column.name for column in cursor.description or []]
+        self.rows_fetched = 0
+        self.pages = 0
+        self._lookahead: list = lookahead or []
+        self.last_used = time.monotonic()
+
+    def fetch_page(self, page_size: int) -> tuple[list, bool]:
+        """读取下一页, 返回(行, 是否还有数据); 多读一行作为预读, 以便准确判断是否读完"""
+        rows = self._lookahead + self.cursor.fetchmany(page_size + 1 - len(self._lookahead))
+        self._lookahead = rows[page_size:]
+        rows = rows[:page_size]
+        self.rows_fetched += len(rows)
+        self.pages += 1
+        self.last_used = time.monotonic()
+        return rows, bool(self._lookahead)
+
+
+class CursorRegistry:
+    """管理分页查询的服务端游标(continuation token -> OpenCursor)
+
+    - max_open: 同时打开的游标上限, 每个游标占用连接池中的一条连接
+    - idle_timeout: 游标闲置超过该秒数后自动关闭并归还连接; 后台线程定期检查,
+      不依赖下一次打开游标
+    """
+
+    def __init__(self, pool: ConnectionPool, max_open: int = 4, idle_timeout: float = 120.0):
+        self.pool = pool
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self._cursors: dict[str, OpenCursor] = {}
+        self._busy: set[str] = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, name="db-cursor-reaper", daemon=True)
+        self._reaper.start()
+
+    @property
+    def transaction_timeout_ms(self) -> int:
+        """游标所在事务的 idle_in_transaction_session_timeout: 比闲置超时多留30秒余量,
+        服务进程异常退出、后台线程来不及回收时, 由数据库端结束空闲事务"""
+        return int((self.idle_timeout + 30) * 1000)
+
+    def _reap_loop(self):
+        interval = min(max(self.idle_timeout / 4, 1.0), 30.0)
+        while not self._stop_event.wait(interval):
+            try:
+                self.reap()
+            except Exception:
+                continue
+
+    def open(self, pooled: PooledConnection, sql: str, params=None, fmt: str = "json") -> OpenCursor:
+        """(工作线程)在已借出的连接上声明命名游标并执行查询"""
+        token = uuid.uuid4().hex
+        with self._lock:
+            if len(self._cursors) + len(self._busy) >= self.max_open:
+                raise RuntimeError(
+                    f"打开的分页游标已达上限({self.max_open}), 请先读完或关闭已有游标"
+                )
+            self._busy.add(token)
+        try:
+            # 命名游标即服务端游标, 结果集留在数据库端按页拉取
+            cursor = pooled.conn.cursor(name=f"mcp_{token}")
+            cursor.execute(sql, params)
+            # 命名游标执行后description为空, 预读一行拿到列信息
+            lookahead = cursor.fetchmany(1)
+        except BaseException:
+            with self._lock:
+                self._busy.discard(token)
+            raise
+        return OpenCursor(token, pooled, cursor, sql, fmt, lookahead)
+
+    def checkout(self, token: str) -> Optional[OpenCursor]:
+        """取出游标独占使用, 不存在或正被使用时返回None"""
+        with self._lock:
+            open_cursor = self._cursors.pop(token, None)
+            if open_cursor is not None:
+                self._busy.add(token)
+            return open_cursor
+
+    def checkin(self, open_cursor: OpenCursor):
+        """使用完毕后放回, 等待下一次fetch_more"""
+        with self._lock:
+            self._busy.discard(open_cursor.token)
+            self._cursors[open_cursor.token] = open_cursor
+
+    def close(self, open_cursor: OpenCursor, error: Optional[BaseException] = None):
+        """(工作线程)关闭游标并归还连接"""
+        with self._lock:
+            self._busy.discard(open_cursor.token)
+            self._cursors.pop(open_cursor.token, None)
+        # 出错时事务已中止, 直接归还(回滚)即可释放服务端游标
+        discard = error is not None and ConnectionPool.should_discard(error)
+        if error is None:
+            try:
+                open_cursor.cursor.close()
+            except Exception:
+                discard = True
+        self.pool.release(open_cursor.pooled, discard=discard)
+
+    def reap(self):
+        """(工作线程)关闭闲置过期的游标"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                self._cursors.pop(token)
+                for token, open_cursor in list(self._cursors.items())
+                if now - open_cursor.last_used > self.idle_timeout
+            ]
+        for open_cursor in expired:
+            self.close(open_cursor)
+
+    def is_busy(self, token: str) -> bool:
+        with self._lock:
+            return token in self._busy
+
+    def close_all(self):
+        self._stop_event.set()
+        with self._lock:
+            cursors = list(self._cursors.values())
+        for open_cursor in cursors:
+            self.close(open_cursor)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cursors) + len(self._busy)
@@ -0,0 +1,112 @@
+"""JSON-RPC编码基准: 比较原实现(结果序列化为文本后再整体序列化)与单次编码、批量请求的吞吐量和响应大小
+
+用法: python bench_jsonrpc.py [请求数] [文件KB]
+"""
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import filesystem_server
+from filesystem_server import FilesystemMCPServer, _json_bytes, _json_loads
+
+LINE = "2024-06-01 12:00:00 INFO 订单服务 处理请求 user=\"alice\" path=/api/orders?id=42\tstatus=200\n"
+
+
+def make_file(directory: str, size_kb: int) -> str:
+    path = os.path.join(directory, "sample.log")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(LINE * (size_kb * 1024 // len(LINE.encode("utf-8")) + 1))
+    return path
+
+
+def call(request_id: int, path: str) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+            "params": {"name": "read_file", "arguments": {"path": path}}}
+
+
+def report(label: str, count: int, elapsed: float, total_bytes: int):
+    print(f"{label:<32} {count / elapsed:>9.0f} req/s  {total_bytes / count:>10.0f} 字节/响应")
+
+
+async def bench_encoding(directory: str, path: str, count: int):
+    """进程内: 处理请求 + 服务端编码 + 客户端解码, 不含管道传输"""
+    server = FilesystemMCPServer([directory], use_index=False, process_workers=0)
+    try:
+        # 原实现: 结果先 json.dumps 为文本, 响应再整体 json.dumps(非ASCII转义), 客户端解析两次
+        started, total = time.perf_counter(), 0
+        for i in range(count):
+            result = await server.read_file(path)
+            response = {"jsonrpc": "2.0", "id": i, "result": {
+                "content": [{"type": "text", "text": json.dumps(result, ensure_ascii=False)}]}}
+            line = json.dumps(response).encode("utf-8")
+            total += len(line)
+            json.loads(json.loads(line)["result"]["content"][0]["text"])
+        report("原实现(文本, 二次编码)", count, time.perf_counter() - started, total)
+
+        for label, version, text_content in (("文本(快速JSON)", "2024-11-05", True),
+                                             ("structuredContent+文本", "2025-06-18", True),
+                                             ("仅structuredContent", "2025-06-18", False)):
+            server.text_content = text_content
+            await server.handle_request({"jsonrpc": "2.0", "id": 0, "method": "initialize",
+                                         "params": {"protocolVersion": version}})
+            started, total = time.perf_counter(), 0
+            for i in range(count):
+                line = _json_bytes(await server.handle_request(call(i, path)))
+                total += len(line)
+                result = _json_loads(line)["result"]
+                if "structuredContent" not in result:
+                    _json_loads(result["content"][0]["text"])
+            report(label, count, time.perf_counter() - started, total)
+    finally:
+        server.close()
+
+
+def bench_stdio(directory: str, path: str, count: int, batch_size: int, version: str) -> tuple[float, int]:
+    """通过标准输入输出驱动服务器进程; batch_size=1 时逐条请求, 否则按批发送"""
+    process = subprocess.Popen(
+        [sys.executable, filesystem_server.__file__, directory],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        def send(message):
+            process.stdin.write(json.dumps(message).encode("utf-8") + b"\n")
+            process.stdin.flush()
+
+        send({"jsonrpc": "2.0", "id": 0, "method": "initialize", "params": {"protocolVersion": version}})
+        process.stdout.readline()
+        started, total, request_id = time.perf_counter(), 0, 1
+        while request_id <= count:
+            size = min(batch_size, count - request_id + 1)
+            requests = [call(request_id + i, path) for i in range(size)]
+            send(requests[0] if batch_size == 1 else requests)
+            line = process.stdout.readline()
+            total += len(line)
+            json.loads(line)
+            request_id += size
+        return time.perf_counter() - started, total
+    finally:
+        process.stdin.close()
+        process.wait()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    size_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    directory = tempfile.mkdtemp(prefix="bench_jsonrpc_")
+    try:
+        path = make_file(directory, size_kb)
+        print(f"read_file {size_kb}KB, {count}次, JSON后端: {'orjson' if filesystem_server.orjson else 'json'}")
+        print("-- 进程内(处理+编码+客户端解码)")
+        asyncio.run(bench_encoding(directory, path, count))
+        print("-- 标准输入输出(含进程间传输, 客户端按标准库json解析)")
+        for label, batch_size, version in (("逐条, 文本", 1, "2024-11-05"),
+                                           ("逐条, structuredContent+文本", 1, "2025-06-18"),
+                                           ("批量50, structuredContent+文本", 50, "2025-06-18")):
+            elapsed, total = bench_stdio(directory, path, count, batch_size, version)
+            report(label, count, elapsed, total)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
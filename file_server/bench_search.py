@@ -0,0 +1,80 @@
+"""搜索匹配引擎基准: 比较逐文件解码+转小写与mmap字节匹配(单进程/进程池)的吞吐量
+
+用法: python bench_search.py [文件数] [每个文件KB]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from matcher import scan_file, scan_files
+
+WORDS = ["error", "warning", "request", "timeout", "用户", "订单", "connection", "retry", "Ärger", "cache"]
+
+
+def make_corpus(directory: str, count: int, size_kb: int) -> list[str]:
+    rng = random.Random(42)
+    paths = []
+    for i in range(count):
+        lines = []
+        size = 0
+        while size < size_kb * 1024:
+            line = " ".join(rng.choice(WORDS) for _ in range(12)) + f" id={rng.randrange(10**6)}"
+            lines.append(line)
+            size += len(line.encode("utf-8")) + 1
+        if i % 10 == 0:
+            lines.insert(len(lines) // 2, "FATAL: disk full on /dev/sda1")
+        path = os.path.join(directory, f"log_{i:05d}.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines))
+        paths.append(path)
+    return paths
+
+
+def baseline(path: str, keyword: str) -> int:
+    """原实现: 整体解码为str, 转小写后判断并计数"""
+    content = open(path, encoding="utf-8").read()
+    if keyword.lower() in content.lower():
+        return content.lower().count(keyword.lower())
+    return 0
+
+
+def bench(label: str, total_bytes: int, run):
+    start = time.perf_counter()
+    found = run()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<30} {total_bytes / elapsed / 1e6:>10.1f} MB/s  ({elapsed:.3f}s, 匹配文件{found}个)")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    size_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    directory = tempfile.mkdtemp(prefix="bench_search_")
+    try:
+        paths = make_corpus(directory, count, size_kb)
+        total = sum(os.path.getsize(path) for path in paths)
+        print(f"语料: {count}个文件, 共{total / 1e6:.1f} MB")
+        # 先读一遍, 让各项都在页缓存命中的条件下比较
+        for path in paths:
+            open(path, "rb").read()
+
+        bench("解码+转小写(原实现)", total,
+              lambda: sum(1 for path in paths if baseline(path, "fatal: disk")))
+        bench("mmap字面量(单进程)", total,
+              lambda: sum(1 for path in paths if scan_file(path, "fatal: disk").count))
+        bench("mmap字面量, 非ASCII", total,
+              lambda: sum(1 for path in paths if scan_file(path, "ärger", max_snippets=0).count))
+        bench("mmap正则(单进程)", total,
+              lambda: sum(1 for path in paths if scan_file(path, r"fatal:\s+disk \w+", regex=True).count))
+        with ProcessPoolExecutor() as pool:
+            # 预热: 启动子进程
+            list(scan_files(paths[:os.cpu_count()], "x", pool=pool, chunk_size=1))
+            bench(f"mmap字面量(进程池x{os.cpu_count()})", total,
+                  lambda: sum(1 for match in scan_files(paths, "fatal: disk", pool=pool) if match.count))
+            bench(f"mmap正则(进程池x{os.cpu_count()})", total,
+                  lambda: sum(1 for match in scan_files(paths, r"fatal:\s+disk \w+", regex=True, pool=pool)
+                              if match.count))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
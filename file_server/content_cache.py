@@ -0,0 +1,125 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class ContentCache:
+    """按字节预算淘汰的LRU文件内容缓存
+
+    - 键为 (解析后的路径, st_mtime_ns, st_size): 每个路径只保留最新版本, 读取时
+      stat 比较 mtime/size, 文件被外部修改后旧内容自动失效
+    - 总字节数超过 max_bytes 时淘汰最久未使用的条目; 超过 max_entry_bytes 的
+      文件不缓存(大文件由 read_file 直接内存映射分段读取)
+    - 服务器内部写入(write_file)后调用 invalidate, 不依赖mtime的时间精度
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(4 * 1024 * 1024, max_bytes // 4) if max_entry_bytes is None else max_entry_bytes
+        self._lock = threading.Lock()
+        # 路径 -> (mtime_ns, size, 内容)
+        self._entries: OrderedDict[str, tuple[int, int, bytes]] = OrderedDict()
+        self._bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "search_hits": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "bytes_read": 0,
+        }
+
+    def _lookup(self, path: str, stat: os.stat_result) -> Optional[bytes]:
+        """(需持有锁)内容仍有效时返回并移到LRU末尾, 已过期时删除"""
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        if entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+            self._drop(path)
+            return None
+        self._entries.move_to_end(path)
+        return entry[2]
+
+    def _drop(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._bytes -= len(entry[2])
+
+    def put(self, path: str, stat: os.stat_result, data: bytes):
+        if not self.max_bytes or len(data) > self.max_entry_bytes:
+            return
+        with self._lock:
+            self._drop(path)
+            self._entries[path] = (stat.st_mtime_ns, stat.st_size, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def read(self, path: str, stat: os.stat_result | None = None) -> Optional[bytes]:
+        """读取文件内容, 优先使用缓存; 文件超过 max_entry_bytes 时返回None, 由调用方另行读取"""
+        if stat is None:
+            stat = os.stat(path)
+        with self._lock:
+            data = self._lookup(path, stat)
+            if data is not None:
+                self.stats["hits"] += 1
+                return data
+            self.stats["misses"] += 1
+        return self._load(path, stat)
+
+    def warm(self, path: str):
+        """预先读入缓存(搜索匹配到的文件), 不计入命中/未命中"""
+        stat = os.stat(path)
+        with self._lock:
+            if self._lookup(path, stat) is not None:
+                return
+        self._load(path, stat)
+
+    def _load(self, path: str, stat: os.stat_result) -> Optional[bytes]:
+        if not self.max_bytes or stat.st_size > self.max_entry_bytes:
+            return None
+        with open(path, "rb") as file:
+            data = file.read()
+        with self._lock:
+            self.stats["bytes_read"] += len(data)
+        # 读取期间文件被修改时不缓存, 避免把新内容记在旧的mtime/size下
+        after = os.stat(path)
+        if (after.st_mtime_ns, after.st_size) == (stat.st_mtime_ns, len(data)):
+            self.put(path, after, data)
+        return data
+
+    def peek(self, path: str) -> Optional[bytes]:
+        """搜索使用: 只在已缓存且仍有效时返回内容; 未缓存的路径不做stat, 也不计入未命中"""
+        with self._lock:
+            if path not in self._entries:
+                return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            data = self._lookup(path, stat)
+            if data is not None:
+                self.stats["search_hits"] += 1
+            return data
+
+    def invalidate(self, path: str):
+        with self._lock:
+            if path in self._entries:
+                self._drop(path)
+                self.stats["invalidations"] += 1
+
+    def status(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_entry_bytes": self.max_entry_bytes,
+            }
@@ -0,0 +1,329 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from walker import SNIFF_BYTES, Walker
+
+INDEX_VERSION = 2
+
+
+def trigrams(text: str) -> set[str]:
+    """文本(已转小写)中出现的所有三字符片段"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """单个允许目录的三字符倒排索引, 用于在搜索前筛选候选文件
+
+    - 按 (mtime_ns, size) 判断文件是否变化, refresh() 只重新读取变化的文件
+    - 关键词的每个三字符片段都出现过的文件才是候选, 候选文件仍需读取确认
+    - 超过 max_file_bytes 的文件不建索引, 始终作为候选; 二进制文件不参与搜索,
+      非UTF-8文件按替换字符解码后建索引(ASCII部分仍可筛选)
+    - 索引以gzip压缩的JSON保存在 index_dir 中, 重启后增量更新即可使用; 变化后最多每
+      save_interval 秒保存一次(close 时保存剩余变化), 未保存的变化在重启后由刷新补上
+    - 文件列表来自共享的 Walker, 被忽略规则排除的文件不进入索引
+    """
+
+    def __init__(self, root: Path, index_dir: Path, walker: Walker,
+                 max_file_bytes: int = 4 * 1024 * 1024, save_interval: float = 30.0):
+        self.root = root
+        self.walker = walker
+        self.max_file_bytes = max_file_bytes
+        self.save_interval = save_interval
+        digest = hashlib.sha1(str(root).encode()).hexdigest()[:16]
+        self.index_path = index_dir / f"{digest}.json.gz"
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = float("-inf")
+        # (目录前缀, 深度) -> 最近一次刷新该范围的时间(monotonic); ("", None) 表示整个索引
+        self._scope_refreshed: dict[tuple[str, int | None], float] = {}
+        self._next_id = 0
+        # 相对路径 -> [文件id, mtime_ns, size, 状态]; 状态: indexed / large / skipped
+        self._files: dict[str, list] = {}
+        self._paths: dict[int, str] = {}
+        self._postings: dict[str, set[int]] = {}
+        self._grams: dict[int, set[str]] = {}
+        self._large: set[int] = set()
+        self.stats = {
+            "refreshes": 0,
+            "last_refresh_ms": 0.0,
+            "last_refreshed_at": None,
+            "files_read": 0,
+            "queries": 0,
+            "query_ms_total": 0.0,
+            "candidates_total": 0,
+        }
+        self._load()
+
+    # ---- 持久化 ----
+
+    def _load(self):
+        try:
+            with gzip.open(self.index_path, "rt", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION or data.get("root") != str(self.root):
+            return
+        for rel, entry in data["files"].items():
+            file_id = entry[0]
+            self._files[rel] = entry
+            self._paths[file_id] = rel
+            self._next_id = max(self._next_id, file_id + 1)
+            if entry[3] == "indexed":
+                self._grams[file_id] = set()
+            elif entry[3] == "large":
+                self._large.add(file_id)
+        for gram, ids in data["postings"].items():
+            self._postings[gram] = set(ids)
+            for file_id in ids:
+                self._grams[file_id].add(gram)
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                # 在锁内复制, 写盘期间不阻塞查询和刷新
+                data = {
+                    "version": INDEX_VERSION,
+                    "root": str(self.root),
+                    "files": dict(self._files),
+                    "postings": {gram: sorted(ids) for gram, ids in self._postings.items()},
+                }
+                self._dirty = False
+                self._saved_at = time.monotonic()
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.index_path.with_suffix(".tmp")
+            with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=1) as file:
+                json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, self.index_path)
+
+    def _save_if_due(self):
+        """有未保存的变化且距上次保存超过 save_interval 时保存"""
+        with self._lock:
+            due = self._dirty and time.monotonic() - self._saved_at >= self.save_interval
+        if due:
+            self.save()
+
+    def flush(self):
+        """保存所有未保存的变化(关闭时调用)"""
+        if self._dirty:
+            self.save()
+
+    # ---- 更新 ----
+
+    def _remove(self, rel: str):
+        entry = self._files.pop(rel, None)
+        if entry is None:
+            return
+        file_id = entry[0]
+        self._paths.pop(file_id, None)
+        self._large.discard(file_id)
+        for gram in self._grams.pop(file_id, ()):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(file_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def _add(self, rel: str, path: str, mtime_ns: int, size: int):
+        file_id = self._next_id
+        self._next_id += 1
+        status = "indexed"
+        grams: set[str] = set()
+        if size > self.max_file_bytes:
+            status = "large"
+        else:
+            try:
+                with open(path, "rb") as file:
+                    data = file.read()
+                self.stats["files_read"] += 1
+                if b"\0" in data[:SNIFF_BYTES]:
+                    status = "skipped"
+                else:
+                    grams = trigrams(data.decode("utf-8", errors="replace").lower())
+            except OSError:
+                status = "skipped"
+        self._files[rel] = [file_id, mtime_ns, size, status]
+        self._paths[file_id] = rel
+        if status == "large":
+            self._large.add(file_id)
+        elif status == "indexed":
+            self._grams[file_id] = grams
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(file_id)
+
+    def update_file(self, path: Path):
+        """单个文件变化(如write_file)后立即更新索引"""
+        rel = Path(os.path.relpath(path, self.root)).as_posix()
+        with self._lock:
+            self._remove(rel)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return
+            self._add(rel, str(path), stat.st_mtime_ns, stat.st_size)
+            self._dirty = True
+
+    def _prefix(self, directory: Path) -> str:
+        prefix = Path(os.path.relpath(directory, self.root)).as_posix()
+        return "" if prefix == "." else prefix + "/"
+
+    @staticmethod
+    def _in_scope(rel: str, prefix: str, max_depth: int | None) -> bool:
+        if not rel.startswith(prefix):
+            return False
+        return max_depth is None or rel[len(prefix):].count("/") + 1 <= max_depth
+
+    def refresh_scope(self, directory: Path, max_depth: int, min_interval: float) -> dict | None:
+        """搜索前使用: 只刷新directory下(深度不超过max_depth)的文件
+
+        min_interval 秒内刷新过同一范围或整个索引时跳过, 返回None。
+        """
+        key = (self._prefix(directory), max_depth)
+        now = time.monotonic()
+        with self._lock:
+            recent = [self._scope_refreshed.get(key), self._scope_refreshed.get(("", None))]
+            if any(at is not None and now - at < min_interval for at in recent):
+                return None
+        return self.refresh(directory=directory, max_depth=max_depth)
+
+    def refresh(self, full: bool = False, directory: Path | None = None,
+                max_depth: int | None = None) -> dict:
+        """遍历目录, 重新索引新增或变化(mtime/size不同)的文件, 删除已不存在的文件
+
+        指定directory/max_depth时只遍历该范围, 也只删除该范围内已不存在的文件。
+        """
+        started = time.perf_counter()
+        scope_root = self.root if directory is None else directory
+        prefix = self._prefix(scope_root)
+        with self._lock:
+            if full:
+                self._files.clear()
+                self._paths.clear()
+                self._postings.clear()
+                self._grams.clear()
+                self._large.clear()
+            seen = set()
+            added = updated = 0
+            for item in self.walker.walk(scope_root, max_depth=max_depth, base=self.root):
+                rel = item.rel
+                seen.add(rel)
+                entry = self._files.get(rel)
+                if entry is not None and entry[1] == item.mtime_ns and entry[2] == item.size:
+                    continue
+                if entry is None:
+                    added += 1
+                else:
+                    updated += 1
+                    self._remove(rel)
+                self._add(rel, item.path, item.mtime_ns, item.size)
+            removed = [rel for rel in self._files
+                       if rel not in seen and self._in_scope(rel, prefix, max_depth)]
+            for rel in removed:
+                self._remove(rel)
+            if added or updated or removed:
+                self._dirty = True
+
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stats["refreshes"] += 1
+            self.stats["last_refresh_ms"] = elapsed
+            self.stats["last_refreshed_at"] = time.time()
+            now = time.monotonic()
+            if len(self._scope_refreshed) > 256:
+                self._scope_refreshed.clear()
+            self._scope_refreshed[(prefix, max_depth)] = now
+        # 整体重建立即保存, 其余变化按 save_interval 合并保存
+        if full:
+            self.save()
+        else:
+            self._save_if_due()
+        return {"added": added, "updated": updated, "removed": len(removed), "elapsed_ms": elapsed}
+
+    # ---- 查询 ----
+
+    def candidates(self, keyword: str, directory: Path, max_depth: int) -> list[Path]:
+        """directory下(深度不超过max_depth)可能包含keyword的文件"""
+        started = time.perf_counter()
+        needed = trigrams(keyword.lower())
+        prefix = self._prefix(directory)
+        with self._lock:
+            if needed:
+                # 从最稀有的片段开始求交集
+                postings = sorted((self._postings.get(gram, set()) for gram in needed), key=len)
+                ids = set(postings[0])
+                for other in postings[1:]:
+                    ids &= other
+                    if not ids:
+                        break
+                ids |= self._large
+            else:
+                # 关键词不足三个字符, 无法筛选
+                ids = set(self._grams) | self._large
+            paths = []
+            for file_id in ids:
+                rel = self._paths[file_id]
+                if self._in_scope(rel, prefix, max_depth):
+                    paths.append(self.root / rel)
+            self.stats["queries"] += 1
+            self.stats["query_ms_total"] += (time.perf_counter() - started) * 1000
+            self.stats["candidates_total"] += len(paths)
+        paths.sort()
+        return paths
+
+    def status(self) -> dict:
+        with self._lock:
+            counts = {"indexed": 0, "large": 0, "skipped": 0}
+            indexed_bytes = 0
+            for _, _, size, state in self._files.values():
+                counts[state] += 1
+                if state == "indexed":
+                    indexed_bytes += size
+            queries = self.stats["queries"]
+            return {
+                "root": str(self.root),
+                "index_path": str(self.index_path),
+                "index_bytes": self.index_path.stat().st_size if self.index_path.exists() else 0,
+                "files": len(self._files),
+                "indexed_files": counts["indexed"],
+                "large_files": counts["large"],
+                "skipped_files": counts["skipped"],
+                "indexed_bytes": indexed_bytes,
+                "trigrams": len(self._postings),
+                "postings": sum(len(ids) for ids in self._postings.values()),
+                "refreshes": self.stats["refreshes"],
+                "last_refresh_ms": round(self.stats["last_refresh_ms"], 2),
+                "last_refreshed_at": self.stats["last_refreshed_at"],
+                "files_read": self.stats["files_read"],
+                "queries": queries,
+                "avg_query_ms": round(self.stats["query_ms_total"] / queries, 3) if queries else 0.0,
+                "avg_candidates": round(self.stats["candidates_total"] / queries, 1) if queries else 0.0,
+            }
+
+
+class IndexWatcher(threading.Thread):
+    """后台线程, 每隔interval秒增量刷新所有索引(轮询mtime/size, 不依赖平台文件通知)"""
+
+    def __init__(self, indexes: list[TrigramIndex], interval: float = 5.0):
+        super().__init__(name="fs-index-watcher", daemon=True)
+        self.indexes = indexes
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            for index in self.indexes:
+                try:
+                    index.refresh()
+                except Exception:
+                    continue
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def default_index_dir() -> Path:
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "filesystem-mcp"
@@ -1,124 +1,555 @@
+import fnmatch
 import json
 import os
+import re
+import sys
+import threading
+import contextvars
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 import asyncio
+import itertools
+from file_index import IndexWatcher, TrigramIndex, default_index_dir
+from search import decode_cursor, encode_cursor, search_files_iter
+from walker import SNIFF_BYTES, Walker
+from matcher import compile_pattern
+from reader import MAX_READ_BYTES, TextFile, detect_encoding
+from content_cache import ContentCache
+from writer import WRITE_MODES, EditError, append_bytes, apply_edits, atomic_write
+
+try:
+    import orjson
+except ImportError:  # 可选依赖: 未安装时使用标准库json
+    orjson = None
+
+# list_directory 的排序方式
+LIST_SORTS = ("name", "size", "mtime")
+
+# read_files 单次最多读取的文件数, 以及总字节预算的默认值和上限
+MAX_BATCH_FILES = 100
+DEFAULT_BATCH_BYTES = 4 * 1024 * 1024
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+
+# 单条JSON-RPC消息的最大长度(write_file的内容可能很大)
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+# 支持的MCP协议版本(按时间顺序); 从 2025-06-18 起工具结果可以放在 structuredContent 中
+PROTOCOL_VERSIONS = ("2024-11-05", "2025-03-26", "2025-06-18")
+STRUCTURED_CONTENT_VERSION = "2025-06-18"
+
+
+def _json_bytes(obj) -> bytes:
+    """序列化为UTF-8编码的紧凑JSON, 非ASCII字符不转义; 安装了orjson时优先使用"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson不支持的类型(如超过64位的整数)交给标准库处理
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data: bytes | str) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+# 当前请求的取消标志, 工作线程中的长循环通过 _check_cancelled() 检查
+_cancel_event: contextvars.ContextVar = contextvars.ContextVar("cancel_event", default=None)
+
+
+class RequestCancelled(Exception):
+    """请求已被客户端取消(notifications/cancelled)"""
+
+
+def _check_cancelled():
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise RequestCancelled()
+
 
 class FilesystemMCPServer:
     """文件系统MCP服务器"""
     
-    def __init__(self, allowed_directories: list[str]):
+    def __init__(self, allowed_directories: list[str], max_concurrency: int = 8,
+                 index_dir: str | None = None, use_index: bool = True,
+                 watch_interval: float | None = None, index_refresh_interval: float = 2.0,
+                 ignore_globs: list[str] | None = None, use_gitignore: bool = True,
+                 process_workers: int | None = None, parallel_min_files: int = 256,
+                 cache_bytes: int = 64 * 1024 * 1024, structured_content: bool = True,
+                 text_content: bool = True):
         """初始化服务器
         
         Args:
             allowed_directories: 允许访问的目录列表(白名单)
+            max_concurrency: 同时处理的请求数上限
+            index_dir: 搜索索引的保存目录, 默认 ~/.cache/filesystem-mcp
+            use_index: search_files 是否使用三字符索引筛选候选文件
+            watch_interval: 设置后由后台线程按该间隔(秒)增量刷新索引, 搜索时不再逐次刷新
+            index_refresh_interval: 未启用后台刷新时, 搜索前只刷新被搜索的子目录, 且同一范围
+                在该间隔(秒)内只刷新一次
+            ignore_globs: 搜索和索引时忽略的文件/目录模式, 默认忽略 .git、node_modules 等
+            use_gitignore: 是否遵循各目录下的 .gitignore
+            process_workers: 搜索大量文件时使用的进程数, 默认CPU核数, 0表示不使用进程池
+            parallel_min_files: 候选文件达到该数量时才使用进程池
+            cache_bytes: 文件内容缓存的字节预算, 0表示不缓存
+            structured_content: 客户端协商的协议版本支持时, 工具结果同时以JSON对象放在
+                structuredContent 中返回, 客户端无需再解析文本
+            text_content: 返回 structuredContent 时是否同时返回序列化后的文本块(规范建议保留,
+                兼容只读取 content 的客户端); 确认客户端读取 structuredContent 时可关闭以减小响应
         """
         self.allowed_dirs = [Path(d).resolve() for d in allowed_directories]
         self.tools = self._register_tools()
+        self.structured_content = structured_content
+        self.text_content = text_content
+        # initialize 时与客户端协商的协议版本
+        self.protocol_version = PROTOCOL_VERSIONS[0]
+        self.max_concurrency = max_concurrency
+        # 文件I/O在工作线程中执行, 不阻塞事件循环
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix="fs-worker"
+        )
+        # 正在处理的请求: id -> (task, 取消标志)
+        self._inflight: dict[Any, tuple[asyncio.Task, threading.Event]] = {}
+        # 搜索、索引和目录列表共用的目录遍历器
+        self.walker = Walker(ignore_globs, use_gitignore)
+        # 每个允许目录一个搜索索引
+        self.indexes: list[TrigramIndex] = []
+        if use_index:
+            index_path = Path(index_dir) if index_dir else default_index_dir()
+            self.indexes = [
+                TrigramIndex(allowed_dir, index_path, self.walker)
+                for allowed_dir in self.allowed_dirs if allowed_dir.is_dir()
+            ]
+        # 匹配大量文件时使用的进程池, 首次需要时创建
+        self.process_workers = os.cpu_count() if process_workers is None else process_workers
+        self.parallel_min_files = parallel_min_files
+        self._process_pool = None
+        # read_file 与 search_files 共用的文件内容缓存
+        self.cache = ContentCache(cache_bytes)
+        self.index_refresh_interval = index_refresh_interval
+        self._watcher = None
+        if self.indexes and watch_interval:
+            self._watcher = IndexWatcher(self.indexes, watch_interval)
+            self._watcher.start()
     
     def _register_tools(self) -> dict:
         """注册可用工具"""
         return {
             "read_file": {
-                "description": "读取指定文件的内容",
+                "description": "读取文件内容, 支持按字节范围、行范围或末尾若干行读取大文件; 未读完时用next_offset继续",
                 "inputSchema": {
                     "type": "object",
                     "properties": {
-                        "path": {"type": "string", "description": "文件路径"}
+                        "path": {"type": "string", "description": "文件路径"},
+                        "offset": {"type": "integer", "description": "起始字节位置(默认0)"},
+                        "length": {"type": "integer", "description": f"读取的字节数, 最多{MAX_READ_BYTES}"},
+                        "start_line": {"type": "integer", "description": "起始行号(从1开始), 与offset、tail互斥"},
+                        "end_line": {"type": "integer", "description": "结束行号(包含), 配合start_line使用"},
+                        "tail": {"type": "integer", "description": "读取最后若干行"},
+                        "encoding": {"type": "string", "description": "指定文件编码, 默认自动检测"}
                     },
                     "required": ["path"]
                 }
             },
+            "read_files": {
+                "description": "一次读取多个文件(并发), 总字节数受max_bytes限制; 每个文件可单独指定读取范围, 单个文件出错不影响其他文件",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "files": {
+                            "type": "array",
+                            "description": f"文件路径, 或包含path及read_file读取参数的对象; 最多{MAX_BATCH_FILES}个",
+                            "items": {
+                                "anyOf": [
+                                    {"type": "string"},
+                                    {
+                                        "type": "object",
+                                        "properties": {
+                                            "path": {"type": "string"},
+                                            "offset": {"type": "integer"},
+                                            "length": {"type": "integer"},
+                                            "start_line": {"type": "integer"},
+                                            "end_line": {"type": "integer"},
+                                            "tail": {"type": "integer"},
+                                            "encoding": {"type": "string"}
+                                        },
+                                        "required": ["path"]
+                                    }
+                                ]
+                            }
+                        },
+                        "max_bytes": {"type": "integer", "description": f"总字节预算, 默认{DEFAULT_BATCH_BYTES}, 最多{MAX_BATCH_BYTES}"}
+                    },
+                    "required": ["files"]
+                }
+            },
             "write_file": {
-                "description": "写入内容到指定文件",
+                "description": "写入文件: write覆盖整个文件, append追加到末尾, edit在服务端按搜索替换或行范围修改; 只返回变化的字节数",
                 "inputSchema": {
                     "type": "object",
                     "properties": {
                         "path": {"type": "string", "description": "文件路径"},
-                        "content": {"type": "string", "description": "文件内容"}
+                        "content": {"type": "string", "description": "文件内容(write)或追加的内容(append)"},
+                        "mode": {"type": "string", "enum": list(WRITE_MODES), "default": "write"},
+                        "edits": {
+                            "type": "array",
+                            "description": "edit模式的编辑列表, 按顺序应用, 任一失败则不写入",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "search": {"type": "string", "description": "要替换的原文本, 默认须唯一匹配"},
+                                    "replace": {"type": "string", "description": "替换后的文本"},
+                                    "all": {"type": "boolean", "description": "替换所有匹配"},
+                                    "start_line": {"type": "integer", "description": "替换的起始行(从1开始)"},
+                                    "end_line": {"type": "integer", "description": "替换的结束行(包含); 为start_line-1时在起始行前插入"},
+                                    "content": {"type": "string", "description": "替换这些行的新内容"}
+                                }
+                            }
+                        },
+                        "fsync": {"type": "boolean", "description": "写入后同步到磁盘", "default": False}
                     },
-                    "required": ["path", "content"]
+                    "required": ["path"]
                 }
             },
             "search_files": {
-                "description": "在目录中搜索包含关键词的文件",
+                "description": "在目录中搜索包含关键词的文件, 返回匹配行号和上下文片段; 结果未取完时用next_cursor继续",
                 "inputSchema": {
                     "type": "object",
                     "properties": {
                         "directory": {"type": "string", "description": "搜索目录"},
-                        "keyword": {"type": "string", "description": "搜索关键词"}
+                        "keyword": {"type": "string", "description": "搜索关键词(大小写不敏感)"},
+                        "regex": {"type": "boolean", "description": "把keyword作为正则表达式按字节匹配(只对ASCII字母忽略大小写)", "default": False},
+                        "limit": {"type": "integer", "description": "最多返回的文件数(默认20), 找够即停止扫描", "default": 20},
+                        "offset": {"type": "integer", "description": "跳过前offset个匹配的文件", "default": 0},
+                        "cursor": {"type": "string", "description": "上一次返回的next_cursor, 从上次停止的位置继续"},
+                        "max_bytes": {"type": "integer", "description": "本次最多读取的字节数, 超出后停止并返回next_cursor"},
+                        "context": {"type": "integer", "description": "片段中匹配位置前后保留的字符数(默认40)", "default": 40}
                     },
                     "required": ["directory", "keyword"]
                 }
             },
             "list_directory": {
-                "description": "列出目录中的所有文件和子目录",
+                "description": "列出目录中的文件和子目录, 支持过滤、排序和分页; recursive为true时按目录汇总文件数和大小",
                 "inputSchema": {
                     "type": "object",
                     "properties": {
-                        "path": {"type": "string", "description": "目录路径"}
+                        "path": {"type": "string", "description": "目录路径"},
+                        "pattern": {"type": "string", "description": "按名称过滤的glob模式, 如 *.log"},
+                        "sort": {"type": "string", "enum": list(LIST_SORTS), "default": "name"},
+                        "reverse": {"type": "boolean", "description": "倒序排列", "default": False},
+                        "limit": {"type": "integer", "description": "本页最多返回的条目数(默认1000)", "default": 1000},
+                        "cursor": {"type": "string", "description": "上一页返回的next_cursor"},
+                        "recursive": {"type": "boolean", "description": "树模式: 只返回各级目录的文件数、子目录数和合计大小", "default": False},
+                        "max_depth": {"type": "integer", "description": "树模式的最大深度(默认3)", "default": 3}
                     },
                     "required": ["path"]
                 }
+            },
+            "index_status": {
+                "description": "查看搜索索引状态: 文件数、索引大小、刷新耗时和查询延迟",
+                "inputSchema": {"type": "object", "properties": {}}
+            },
+            "cache_stats": {
+                "description": "查看文件内容缓存的命中、未命中、淘汰次数和占用字节数",
+                "inputSchema": {"type": "object", "properties": {}}
+            },
+            "rebuild_index": {
+                "description": "重新构建搜索索引",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "path": {"type": "string", "description": "只重建包含该路径的允许目录的索引, 不传则全部重建"}
+                    }
+                }
             }
         }
     
+    async def _run_blocking(self, fn: Callable, *args) -> Any:
+        """在工作线程中执行阻塞的文件操作, 线程继承当前请求的取消标志"""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, context.run, fn, *args
+        )
+    
+    def _index_for(self, path: Path) -> TrigramIndex | None:
+        """包含path的允许目录对应的索引"""
+        path = path.resolve()
+        for index in self.indexes:
+            if path == index.root or index.root in path.parents:
+                return index
+        return None
+    
     def _is_path_allowed(self, path: str) -> bool:
         """检查路径是否在允许的目录中"""
-        target_path = Path(path).resolve()
+        return self._is_resolved_allowed(Path(path).resolve())
+    
+    def _is_resolved_allowed(self, target_path: Path) -> bool:
         return any(
             target_path == allowed_dir or 
             allowed_dir in target_path.parents
             for allowed_dir in self.allowed_dirs
         )
 
-    async def read_file(self, path: str) -> dict:
+    async def read_file(self, path: str, offset: int | None = None, length: int | None = None,
+                        start_line: int | None = None, end_line: int | None = None,
+                        tail: int | None = None, encoding: str | None = None) -> dict:
         """读取文件内容"""
-        if not self._is_path_allowed(path):
+        return await self._run_blocking(
+            self._read_file, path, offset, length, start_line, end_line, tail, encoding
+        )
+    
+    def _read_file(self, path: str, offset: int | None = None, length: int | None = None,
+                   start_line: int | None = None, end_line: int | None = None,
+                   tail: int | None = None, encoding: str | None = None) -> dict:
+        resolved = Path(path).resolve()
+        if not self._is_resolved_allowed(resolved):
             return {"error": f"访问被拒绝:{path}不在允许的目录中"}
+        return self._read_allowed(path, resolved, offset, length, start_line, end_line, tail, encoding)
+    
+    def _read_allowed(self, path: str, resolved: Path, offset: int | None = None,
+                      length: int | None = None, start_line: int | None = None,
+                      end_line: int | None = None, tail: int | None = None,
+                      encoding: str | None = None, max_bytes: int = MAX_READ_BYTES) -> dict:
+        """读取已通过权限检查的文件; max_bytes 为本次最多读取的字节数"""
+        if sum(mode is not None for mode in (offset, start_line, tail)) > 1:
+            return {"error": "offset、start_line和tail只能指定一个"}
+        if end_line is not None and start_line is None:
+            start_line = 1
+        if (offset is not None and offset < 0) or (length is not None and length <= 0):
+            return {"error": "offset不能为负数, length必须大于0"}
+        if (start_line is not None and start_line < 1) or (tail is not None and tail < 1):
+            return {"error": "start_line和tail必须大于0"}
+        if end_line is not None and end_line < start_line:
+            return {"error": "end_line不能小于start_line"}
         
         try:
             file_path = Path(path)
-            if not file_path.exists():
+            try:
+                stat = resolved.stat()
+            except FileNotFoundError:
                 return {"error": f"文件不存在:{path}"}
+            if not resolved.is_file():
+                return {"error": f"不是文件:{path}"}
             
-            # 限制文件大小(最大1MB)
-            if file_path.stat().st_size > 1024 * 1024:
-                return {"error": "文件过大(>1MB)"}
-            
-            content = file_path.read_text(encoding='utf-8')
-            return {
-                "path": str(file_path),
-                "content": content,
-                "size": len(content)
-            }
+            # 每次最多返回 max_bytes 字节, 大文件通过 next_offset 分段读取
+            limit = min(length or max_bytes, max_bytes)
+            # 小文件使用缓存内容(未缓存时读入), 大文件返回None, 改为内存映射
+            data = self.cache.read(str(resolved), stat)
+            try:
+                text = TextFile(resolved, encoding, data)
+            except LookupError:
+                return {"error": f"未知编码:{encoding}"}
+            with text:
+                if text.encoding is None:
+                    return {"error": f"二进制文件, 无法按文本读取:{path}"}
+                if (start_line is not None or tail is not None) and not text.line_based:
+                    return {"error": f"{text.encoding}编码的文件不支持按行读取, 请使用offset"}
+                
+                response = {"path": str(file_path)}
+                if tail is not None:
+                    start, truncated = text.tail_offset(tail, limit)
+                    end = text.size
+                elif start_line is not None:
+                    start = text.line_offset(start_line)
+                    count = None if end_line is None else end_line - start_line + 1
+                    end, lines, truncated = text.lines_end(start, count, limit)
+                    response["start_line"] = start_line
+                    response["end_line"] = start_line + lines - 1 if lines else None
+                    if end < text.size:
+                        response["next_line"] = start_line + lines
+                else:
+                    start, end = text.byte_range(offset or 0, limit)
+                    truncated = end < text.size and (length is None or length > limit)
+                content = text.decode(start, end)
+                
+                response.update({
+                    "content": content,
+                    "size": len(content),
+                    "encoding": text.encoding,
+                    "total_size": text.size,
+                    "offset": start,
+                    "next_offset": end if end < text.size else None
+                })
+                if truncated:
+                    response["truncated"] = True
+                return response
         except Exception as e:
             return {"error": f"读取失败:{str(e)}"}
     
-    async def write_file(self, path: str, content: str) -> dict:
+    async def read_files(self, files: list, max_bytes: int | None = None) -> dict:
+        """批量读取文件: 一次完成权限检查和预算分配, 各文件在工作线程中并发读取"""
+        plan = await self._run_blocking(self._plan_reads, files, max_bytes)
+        if "error" in plan:
+            return plan
+        reads = [
+            item if "error" in item else self._run_blocking(self._read_allowed, *item["args"])
+            for item in plan["reads"]
+        ]
+        pending = [read for read in reads if not isinstance(read, dict)]
+        done = iter(await asyncio.gather(*pending))
+        results = [read if isinstance(read, dict) else next(done) for read in reads]
+        # 读取错误不含路径, 补上以便与请求对应
+        results = [{"path": item["path"], **result} for item, result in zip(plan["reads"], results)]
+        
+        total_bytes = sum(
+            (result["next_offset"] or result["total_size"]) - result["offset"]
+            for result in results if "error" not in result
+        )
+        return {
+            "files": results,
+            "total_bytes": total_bytes,
+            "max_bytes": plan["max_bytes"],
+            "errors": sum("error" in result for result in results)
+        }
+    
+    def _plan_reads(self, files: list, max_bytes: int | None = None) -> dict:
+        """检查所有路径的权限, 并按输入顺序分配字节预算
+
+        每个文件预计读取 min(单次上限, 剩余文件大小) 字节, 按行读取时以文件大小估计;
+        预算用完后其余文件不读取, 返回错误。
+        """
+        if not isinstance(files, list) or not files:
+            return {"error": "files必须是非空列表"}
+        if len(files) > MAX_BATCH_FILES:
+            return {"error": f"一次最多读取{MAX_BATCH_FILES}个文件"}
+        budget = min(max_bytes or DEFAULT_BATCH_BYTES, MAX_BATCH_BYTES)
+        remaining = budget
+        options = ("offset", "length", "start_line", "end_line", "tail", "encoding")
+        reads = []
+        for item in files:
+            spec = {"path": item} if isinstance(item, str) else item
+            path = spec.get("path") if isinstance(spec, dict) else None
+            if not isinstance(path, str):
+                reads.append({"path": path, "error": "每一项必须是路径字符串或包含path的对象"})
+                continue
+            resolved = Path(path).resolve()
+            if not self._is_resolved_allowed(resolved):
+                reads.append({"path": path, "error": f"访问被拒绝:{path}不在允许的目录中"})
+                continue
+            args = [spec.get(name) for name in options]
+            offset, length = args[0], args[1]
+            try:
+                size = resolved.stat().st_size
+            except OSError:
+                # 交给读取时报告具体错误
+                size = 0
+            if offset is not None and spec.get("start_line") is None and spec.get("tail") is None:
+                size = max(0, size - offset)
+            want = min(size, length or MAX_READ_BYTES, MAX_READ_BYTES)
+            if want > remaining:
+                if remaining <= 0:
+                    reads.append({"path": path, "error": f"超出总字节预算({budget}), 未读取"})
+                    continue
+                want = remaining
+            remaining -= want
+            reads.append({"path": path, "args": [path, resolved, *args, max(want, 1)]})
+        return {"reads": reads, "max_bytes": budget}
+    
+    async def write_file(self, path: str, content: str | None = None, mode: str = "write",
+                         edits: list[dict] | None = None, fsync: bool = False) -> dict:
         """写入文件内容"""
+        return await self._run_blocking(self._write_file, path, content, mode, edits, fsync)
+    
+    def _existing_text(self, file_path: Path) -> tuple[bytes, str, int]:
+        """读取已有文件, 返回 (原始字节, 编码, BOM长度); 二进制文件抛出ValueError"""
+        data = self.cache.read(str(file_path))
+        if data is None:
+            data = file_path.read_bytes()
+        encoding, bom = detect_encoding(data[:SNIFF_BYTES], final=len(data) <= SNIFF_BYTES)
+        if encoding is None:
+            raise ValueError("二进制文件, 无法按文本编辑")
+        return data, encoding, bom
+    
+    def _existing_encoding(self, file_path: Path) -> str:
+        """只读取文件开头SNIFF_BYTES字节判断编码; 二进制文件抛出ValueError"""
+        with open(file_path, "rb") as f:
+            sample = f.read(SNIFF_BYTES + 1)
+        encoding, _ = detect_encoding(sample[:SNIFF_BYTES], final=len(sample) <= SNIFF_BYTES)
+        if encoding is None:
+            raise ValueError("二进制文件, 无法按文本追加")
+        return encoding
+    
+    def _write_file(self, path: str, content: str | None = None, mode: str = "write",
+                    edits: list[dict] | None = None, fsync: bool = False) -> dict:
         if not self._is_path_allowed(path):
             return {"error": f"访问被拒绝:{path}不在允许的目录中"}
+        if mode not in WRITE_MODES:
+            return {"error": f"不支持的写入模式:{mode}, 可选{', '.join(WRITE_MODES)}"}
+        if mode in ("write", "append") and not isinstance(content, str):
+            return {"error": f"{mode}模式需要content"}
+        if mode == "edit" and not edits:
+            return {"error": "edit模式需要edits"}
         
         try:
             file_path = Path(path)
+            # 写入解析后的路径: 符号链接指向的文件被替换, 链接本身保留
+            target = file_path.resolve()
+            response = {"path": str(file_path), "mode": mode}
             
-            # 确保父目录存在
-            file_path.parent.mkdir(parents=True, exist_ok=True)
+            if mode == "edit":
+                if not target.is_file():
+                    return {"error": f"文件不存在:{path}"}
+                data, encoding, bom = self._existing_text(target)
+                try:
+                    text = data[bom:].decode(encoding)
+                except UnicodeDecodeError:
+                    return {"error": f"无法按{encoding}解码文件, 不能编辑"}
+                try:
+                    text, stats = apply_edits(text, edits, encoding)
+                except EditError as e:
+                    return {"error": f"编辑失败:{str(e)}"}
+                new_data = data[:bom] + text.encode(encoding)
+                atomic_write(target, new_data, fsync)
+                response.update(stats)
+                response["bytes_written"] = len(new_data)
+            elif mode == "append" and target.is_file():
+                # 按已有文件的编码追加, 只嗅探文件开头, 不读入整个文件
+                encoding = self._existing_encoding(target)
+                new_data = content.encode(encoding)
+                append_bytes(target, new_data, fsync)
+                response["bytes_written"] = len(new_data)
+            else:
+                # 确保父目录存在
+                target.parent.mkdir(parents=True, exist_ok=True)
+                new_data = content.encode("utf-8")
+                if mode == "append":
+                    append_bytes(target, new_data, fsync)
+                else:
+                    atomic_write(target, new_data, fsync)
+                response["bytes_written"] = len(new_data)
             
-            # 写入文件
-            file_path.write_text(content, encoding='utf-8')
+            self.cache.invalidate(str(target))
+            index = self._index_for(target)
+            if index is not None:
+                index.update_file(target)
             
-            return {
-                "path": str(file_path),
-                "size": len(content),
-                "message": "文件写入成功"
-            }
+            response["size"] = target.stat().st_size
+            response["message"] = "文件写入成功"
+            return response
         except Exception as e:
             return {"error": f"写入失败:{str(e)}"}
     
-    async def search_files(self, directory: str, keyword: str) -> dict:
+    async def search_files(self, directory: str, keyword: str, limit: int = 20,
+                           offset: int = 0, cursor: str | None = None,
+                           max_bytes: int | None = None, context: int = 40,
+                           regex: bool = False) -> dict:
         """搜索包含关键词的文件"""
+        return await self._run_blocking(
+            self._search_files, directory, keyword, limit, offset, cursor, max_bytes, context, regex
+        )
+    
+    def _search_pool(self) -> ProcessPoolExecutor | None:
+        if not self.process_workers:
+            return None
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._process_pool
+    
+    def _search_files(self, directory: str, keyword: str, limit: int = 20,
+                      offset: int = 0, cursor: str | None = None,
+                      max_bytes: int | None = None, context: int = 40,
+                      regex: bool = False) -> dict:
         if not self._is_path_allowed(directory):
             return {"error": f"访问被拒绝:{directory}不在允许的目录中"}
         
@@ -127,52 +558,192 @@ class FilesystemMCPServer:
             if not dir_path.is_dir():
                 return {"error": f"不是有效目录:{directory}"}
             
+            if not keyword:
+                return {"error": "关键词不能为空"}
+            try:
+                compile_pattern(keyword, regex)
+            except re.error as e:
+                return {"error": f"正则表达式错误:{str(e)}"}
+            start = 0
+            if cursor:
+                state = decode_cursor(cursor)
+                if (state.get("d") != str(dir_path) or state.get("k") != keyword
+                        or state.get("r", False) != regex):
+                    return {"error": "cursor与本次搜索的目录或关键词不一致"}
+                start = state["p"]
+            
+            index = self._index_for(dir_path)
+            if index is not None:
+                # 后台线程未运行或尚未刷新过时, 先按mtime/size增量刷新被搜索的范围
+                if self._watcher is None or index.stats["last_refreshed_at"] is None:
+                    index.refresh_scope(dir_path.resolve(), 3, self.index_refresh_interval)
+                # 递归搜索(限制深度为3层), 只读取索引筛选出的候选文件
+                # 正则无法拆成三字符片段, 所有已索引文件都是候选
+                files = index.candidates("" if regex else keyword, dir_path.resolve(), max_depth=3)
+                pool = self._search_pool() if len(files) - start >= self.parallel_min_files else None
+            else:
+                # 超过3层的目录在遍历时直接跳过; 使用解析后的路径, 与缓存的键一致
+                files = self.walker.files(dir_path.resolve(), max_depth=3, skip_binary=True)
+                # 先遍历出足够判断的文件数, 文件不多时不值得把匹配分发到进程池
+                head = list(itertools.islice(files, start + self.parallel_min_files))
+                pool = self._search_pool() if len(head) - start >= self.parallel_min_files else None
+                files = itertools.chain(head, files)
+            
+            # 惰性流水线: 拿够limit个结果或超出字节预算即停止, 之后的文件不会被读取
+            files = itertools.islice(files, start, None)
+            matches = search_files_iter(
+                files, keyword, regex, context=max(0, context), pool=pool,
+                check_cancelled=_check_cancelled, cache=self.cache
+            )
             results = []
-            # 递归搜索(限制深度为3层)
-            for file_path in dir_path.rglob("*"):
-                if file_path.is_file() and len(file_path.parts) - len(dir_path.parts) <= 3:
-                    try:
-                        content = file_path.read_text(encoding='utf-8')
-                        if keyword.lower() in content.lower():
-                            results.append({
-                                "path": str(file_path),
-                                "matches": content.lower().count(keyword.lower())
-                            })
-                    except:
-                        continue  # 跳过无法读取的文件
+            skipped = scanned_files = scanned_bytes = 0
+            next_position = None
+            stopped_by = None
+            for position, size, result in matches:
+                scanned_files += 1
+                scanned_bytes += size
+                if result is not None:
+                    if skipped < offset:
+                        skipped += 1
+                    else:
+                        results.append(result)
+                if len(results) >= limit:
+                    stopped_by = "limit"
+                elif max_bytes is not None and scanned_bytes >= max_bytes:
+                    stopped_by = "max_bytes"
+                if stopped_by:
+                    next_position = start + position + 1
+                    break
+            matches.close()
             
-            return {
+            response = {
                 "directory": str(dir_path),
                 "keyword": keyword,
-                "results": results[:20]  # 限制返回20个结果
+                "results": results,
+                "scanned_files": scanned_files,
+                "scanned_bytes": scanned_bytes
             }
+            if next_position is not None:
+                response["stopped_by"] = stopped_by
+                response["next_cursor"] = encode_cursor(
+                    {"d": str(dir_path), "k": keyword, "r": regex, "p": next_position}
+                )
+            return response
         except Exception as e:
             return {"error": f"搜索失败:{str(e)}"}
     
-    async def list_directory(self, path: str) -> dict:
+    async def list_directory(self, path: str, pattern: str | None = None, sort: str = "name",
+                             reverse: bool = False, limit: int = 1000, cursor: str | None = None,
+                             recursive: bool = False, max_depth: int = 3) -> dict:
         """列出目录内容"""
+        return await self._run_blocking(
+            self._list_directory, path, pattern, sort, reverse, limit, cursor, recursive, max_depth
+        )
+    
+    def _list_directory(self, path: str, pattern: str | None = None, sort: str = "name",
+                        reverse: bool = False, limit: int = 1000, cursor: str | None = None,
+                        recursive: bool = False, max_depth: int = 3) -> dict:
         if not self._is_path_allowed(path):
             return {"error": f"访问被拒绝:{path}不在允许的目录中"}
+        if sort not in LIST_SORTS:
+            return {"error": f"不支持的排序方式:{sort}, 可选{', '.join(LIST_SORTS)}"}
+        if limit < 1 or max_depth < 1:
+            return {"error": "limit和max_depth必须大于0"}
         
         try:
             dir_path = Path(path)
             if not dir_path.is_dir():
                 return {"error": f"不是有效目录:{path}"}
             
-            items = []
-            for item in sorted(dir_path.iterdir()):
-                items.append({
-                    "name": item.name,
-                    "type": "directory" if item.is_dir() else "file",
-                    "size": item.stat().st_size if item.is_file() else None
-                })
+            # 游标记录查询条件和下一页的起始位置, 条件不一致时拒绝
+            query = [pattern, sort, reverse, recursive, max_depth if recursive else 1]
+            start = 0
+            if cursor:
+                state = decode_cursor(cursor)
+                if state.get("d") != str(dir_path) or state.get("q") != query:
+                    return {"error": "cursor与本次列表的目录或条件不一致"}
+                start = state["o"]
             
-            return {
+            if recursive:
+                # 树模式: 只输出目录, 文件只计入所在目录及上级目录的统计
+                items = self.walker.summarize(dir_path, max_depth, pattern, check=_check_cancelled)
+                keys = {"name": "path", "size": "total_size", "mtime": "mtime_ns"}
+                items.sort(key=lambda item: (item[keys[sort]], item["path"]), reverse=reverse)
+                root = next(item for item in items if item["path"] == ".")
+                summary = {
+                    "directories": len(items) - 1,
+                    "files": root["total_files"],
+                    "total_size": root["total_size"],
+                    "complete": root["complete"]
+                }
+            else:
+                # DirEntry 自带类型, stat结果在遍历时已取得, 每个条目最多一次stat
+                items = []
+                files = directories = total_size = 0
+                for entry in self.walker.walk(dir_path, max_depth=1, include_dirs=True, ignore=False):
+                    _check_cancelled()
+                    if pattern is not None and not fnmatch.fnmatch(entry.rel, pattern):
+                        continue
+                    if entry.is_dir:
+                        directories += 1
+                    else:
+                        files += 1
+                        total_size += entry.size
+                    items.append({
+                        "name": entry.rel,
+                        "type": "directory" if entry.is_dir else "file",
+                        "size": None if entry.is_dir else entry.size,
+                        "mtime_ns": entry.mtime_ns
+                    })
+                if sort == "size":
+                    items.sort(key=lambda item: (item["size"] or 0, item["name"]), reverse=reverse)
+                elif sort == "mtime":
+                    items.sort(key=lambda item: (item["mtime_ns"], item["name"]), reverse=reverse)
+                elif reverse:
+                    # 遍历结果已按名称排序
+                    items.reverse()
+                summary = {"directories": directories, "files": files, "total_size": total_size}
+            
+            page = items[start:start + limit]
+            response = {
                 "path": str(dir_path),
-                "items": items
+                "items": page,
+                "total": len(items),
+                **summary
             }
+            if start + limit < len(items):
+                response["next_cursor"] = encode_cursor(
+                    {"d": str(dir_path), "q": query, "o": start + limit}
+                )
+            return response
         except Exception as e:
             return {"error": f"列表失败:{str(e)}"}
+    
+    async def index_status(self) -> dict:
+        """搜索索引状态"""
+        return {
+            "watcher_interval": self._watcher.interval if self._watcher else None,
+            "indexes": [index.status() for index in self.indexes]
+        }
+    
+    async def cache_stats(self) -> dict:
+        """文件内容缓存统计"""
+        return self.cache.status()
+    
+    async def rebuild_index(self, path: str | None = None) -> dict:
+        """整体重建索引"""
+        return await self._run_blocking(self._rebuild_index, path)
+    
+    def _rebuild_index(self, path: str | None = None) -> dict:
+        if path is not None and not self._is_path_allowed(path):
+            return {"error": f"访问被拒绝:{path}不在允许的目录中"}
+        indexes = self.indexes if path is None else [self._index_for(Path(path))]
+        rebuilt = []
+        for index in indexes:
+            if index is None:
+                continue
+            rebuilt.append({**index.refresh(full=True), "root": str(index.root)})
+        return {"rebuilt": rebuilt, "indexes": [index.status() for index in indexes if index]}
 
     async def handle_request(self, request: dict) -> dict:
         """处理MCP请求"""
@@ -181,11 +752,14 @@ class FilesystemMCPServer:
         
         # 初始化握手
         if method == "initialize":
+            # 客户端请求的版本受支持时使用该版本, 否则返回服务器支持的最新版本
+            requested = params.get("protocolVersion")
+            self.protocol_version = requested if requested in PROTOCOL_VERSIONS else PROTOCOL_VERSIONS[-1]
             return {
                 "jsonrpc": "2.0",
                 "id": request.get("id"),
                 "result": {
-                    "protocolVersion": "2024-11-05",
+                    "protocolVersion": self.protocol_version,
                     "capabilities": {
                         "tools": {}
                     },
@@ -220,12 +794,20 @@ class FilesystemMCPServer:
             try:
                 if tool_name == "read_file":
                     result = await self.read_file(**tool_args)
+                elif tool_name == "read_files":
+                    result = await self.read_files(**tool_args)
                 elif tool_name == "write_file":
                     result = await self.write_file(**tool_args)
                 elif tool_name == "search_files":
                     result = await self.search_files(**tool_args)
                 elif tool_name == "list_directory":
                     result = await self.list_directory(**tool_args)
+                elif tool_name == "index_status":
+                    result = await self.index_status()
+                elif tool_name == "cache_stats":
+                    result = await self.cache_stats()
+                elif tool_name == "rebuild_index":
+                    result = await self.rebuild_index(**tool_args)
                 else:
                     return {
                         "jsonrpc": "2.0",
@@ -233,10 +815,17 @@ class FilesystemMCPServer:
                         "error": {"code": -32601, "message": f"未知工具:{tool_name}"}
                     }
                 
+                payload = {"content": []}
+                structured = self.structured_content and self.protocol_version >= STRUCTURED_CONTENT_VERSION
+                if structured:
+                    # 结果作为JSON对象嵌入响应, 客户端不必再解析文本
+                    payload["structuredContent"] = result
+                if not structured or self.text_content:
+                    payload["content"].append({"type": "text", "text": _json_bytes(result).decode("utf-8")})
                 return {
                     "jsonrpc": "2.0",
                     "id": request.get("id"),
-                    "result": {"content": [{"type": "text", "text": json.dumps(result, ensure_ascii=False)}]}
+                    "result": payload
                 }
             except Exception as e:
                 return {
@@ -245,28 +834,184 @@ class FilesystemMCPServer:
                     "error": {"code": -32000, "message": str(e)}
                 }
         
-        return {"error": f"未知方法:{method}"}
+        return {
+            "jsonrpc": "2.0",
+            "id": request.get("id"),
+            "error": {"code": -32601, "message": f"未知方法:{method}"}
+        }
+    
+    async def _open_stdin(self) -> asyncio.StreamReader:
+        """把标准输入包装为异步流; 标准输入是普通文件等无法注册到事件循环时改用线程读取"""
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_MESSAGE_BYTES)
+        try:
+            await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+            )
+        except (ValueError, OSError):
+            def pump():
+                for chunk in iter(lambda: sys.stdin.buffer.read1(65536), b""):
+                    loop.call_soon_threadsafe(reader.feed_data, chunk)
+                loop.call_soon_threadsafe(reader.feed_eof)
+            threading.Thread(target=pump, name="fs-stdin", daemon=True).start()
+        return reader
+    
+    async def _write_responses(self, queue: asyncio.Queue):
+        """唯一的输出协程: 响应按完成顺序逐条写出, 避免多个任务交错写入stdout"""
+        while True:
+            line = await queue.get()
+            if line is None:
+                break
+            sys.stdout.buffer.write(line + b"\n")
+            sys.stdout.flush()
+    
+    async def _dispatch(self, request: dict, cancel_event: threading.Event,
+                        slots: asyncio.Semaphore) -> dict | None:
+        """处理一个请求, 返回响应(通知返回None)"""
+        _cancel_event.set(cancel_event)
+        async with slots:
+            try:
+                response = await self.handle_request(request)
+            except Exception as e:
+                response = {
+                    "jsonrpc": "2.0",
+                    "id": request.get("id"),
+                    "error": {"code": -32603, "message": str(e)}
+                }
+        # 没有id的消息是通知, 按JSON-RPC规范不回复, 出错(如未知方法)时也不回复
+        return response if "id" in request else None
+    
+    def _start(self, request: Any, slots: asyncio.Semaphore) -> asyncio.Task | dict | None:
+        """为一个请求创建处理任务并登记id, 以便 notifications/cancelled 中止
+
+        非对象或缺少method的请求直接返回错误响应(无法确定id时id为null);
+        取消通知在此处理, 返回None。
+        """
+        if not isinstance(request, dict):
+            return {
+                "jsonrpc": "2.0", "id": None,
+                "error": {"code": -32600, "message": "请求必须是JSON对象"}
+            }
+        if not isinstance(request.get("method"), str):
+            return {
+                "jsonrpc": "2.0", "id": request.get("id"),
+                "error": {"code": -32600, "message": "请求缺少method"}
+            }
+        if request.get("method") == "notifications/cancelled":
+            self._cancel_request(request.get("params") or {})
+            return None
+        
+        cancel_event = threading.Event()
+        task = asyncio.create_task(self._dispatch(request, cancel_event, slots))
+        request_id = request.get("id")
+        if request_id is not None:
+            self._inflight[request_id] = (task, cancel_event)
+            task.add_done_callback(
+                lambda _, request_id=request_id: self._inflight.pop(request_id, None)
+            )
+        return task
+    
+    @staticmethod
+    async def _result(item: asyncio.Task | dict | None) -> dict | None:
+        """等待任务完成并取出响应; 被取消的请求不返回响应"""
+        if not isinstance(item, asyncio.Task):
+            return item
+        try:
+            return await item
+        except asyncio.CancelledError:
+            return None
+    
+    async def _respond(self, item: asyncio.Task | dict | None, queue: asyncio.Queue):
+        response = await self._result(item)
+        if response is not None:
+            queue.put_nowait(_json_bytes(response))
+    
+    async def _respond_batch(self, items: list, queue: asyncio.Queue):
+        """批量请求: 各项已并发处理, 全部完成后作为一个数组写出; 全是通知时不写出"""
+        responses = [response for response in [await self._result(item) for item in items]
+                     if response is not None]
+        if responses:
+            queue.put_nowait(_json_bytes(responses))
+    
+    def _cancel_request(self, params: dict):
+        entry = self._inflight.get(params.get("requestId"))
+        if entry is not None:
+            task, cancel_event = entry
+            cancel_event.set()
+            task.cancel()
     
     async def run(self):
-        """启动服务器(标准输入输出通信)"""
+        """启动服务器(标准输入输出通信)
+        
+        每个请求在独立任务中处理, 最多同时处理 max_concurrency 个, 响应按完成顺序
+        写出(客户端按JSON-RPC id对应); 收到 notifications/cancelled 时中止对应请求。
+        JSON-RPC批量请求(数组)中的各项同样并发处理, 响应合并为一个数组返回。
+        """
         print("MCP文件系统服务器已启动", file=sys.stderr, flush=True)
+        reader = await self._open_stdin()
+        queue: asyncio.Queue = asyncio.Queue()
+        writer = asyncio.create_task(self._write_responses(queue))
+        slots = asyncio.Semaphore(self.max_concurrency)
+        tasks: set[asyncio.Task] = set()
+        
         while True:
             try:
-                line = await asyncio.get_event_loop().run_in_executor(
-                    None, input
-                )
-                request = json.loads(line)
-                response = await self.handle_request(request)
-                if response is not None:
-                    print(json.dumps(response), flush=True)
-            except EOFError:
+                line = await reader.readline()
+            except ValueError:
+                # 单行超过长度上限, 已读入的部分被丢弃
+                queue.put_nowait(_json_bytes({
+                    "jsonrpc": "2.0", "id": None,
+                    "error": {"code": -32600, "message": f"消息超过{MAX_MESSAGE_BYTES}字节"}
+                }))
+                continue
+            if not line:
                 break
-            except Exception as e:
-                error_response = {"error": str(e)}
-                print(json.dumps(error_response), flush=True)
+            if not line.strip():
+                continue
+            try:
+                request = _json_loads(line)
+            except ValueError as e:
+                queue.put_nowait(_json_bytes({
+                    "jsonrpc": "2.0", "id": None,
+                    "error": {"code": -32700, "message": f"JSON解析失败:{str(e)}"}
+                }))
+                continue
+            
+            if isinstance(request, list):
+                if not request:
+                    queue.put_nowait(_json_bytes({
+                        "jsonrpc": "2.0", "id": None,
+                        "error": {"code": -32600, "message": "批量请求不能为空"}
+                    }))
+                    continue
+                task = asyncio.create_task(
+                    self._respond_batch([self._start(item, slots) for item in request], queue)
+                )
+            else:
+                task = asyncio.create_task(self._respond(self._start(request, slots), queue))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        
+        # 输入结束: 等待处理中的请求写出响应后退出
+        await asyncio.gather(*tasks, return_exceptions=True)
+        queue.put_nowait(None)
+        await writer
+        self.close()
+    
+    def close(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+        for index in self.indexes:
+            try:
+                index.flush()
+            except OSError as e:
+                print(f"保存搜索索引失败: {e}", file=sys.stderr)
+        self._executor.shutdown(wait=False)
+        self.walker.close()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
-    import sys
     # 从命令行参数获取允许的目录
     if len(sys.argv) < 2:
         print("Usage: python filesystem_server.py <allowed_dir1> [allowed_dir2 ...]")
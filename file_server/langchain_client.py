@@ -2,6 +2,7 @@ from langchain_openai import ChatOpenAI
 from langchain_classic.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import Tool
+import itertools
 import subprocess
 import json
 import os
@@ -25,22 +26,40 @@ class MCPFilesystemClient:
             text=True
         )
         
-        # 读取启动消息
-        startup_line = self.process.stdout.readline()
-        if "MCP文件系统服务器已启动" not in startup_line:
-            raise RuntimeError(f"MCP服务器启动失败: {startup_line}")
+        # JSON-RPC请求id, 响应按id对应
+        self._ids = itertools.count(1)
+        
+        # 初始化握手(启动消息输出在stderr, 不能作为启动成功的依据)
+        response = self._request("initialize", {
+            "protocolVersion": "2025-06-18",
+            "capabilities": {},
+            "clientInfo": {"name": "langchain-client", "version": "1.0.0"}
+        })
+        if "error" in response:
+            raise RuntimeError(f"MCP服务器启动失败: {response['error']}")
+        self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
 
         self.tools = self._create_tools()
     
+    def _send(self, message: dict):
+        self.process.stdin.write(json.dumps(message) + "\n")
+        self.process.stdin.flush()
+    
+    def _request(self, method: str, params: dict) -> dict:
+        """发送请求并等待id相同的响应; 没有id的消息是通知, 服务器不会回复"""
+        request_id = next(self._ids)
+        self._send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError("MCP服务器已退出")
+            response = json.loads(line)
+            if isinstance(response, dict) and response.get("id") == request_id:
+                return response
+    
     def _call_mcp_tool(self, tool_name: str, **kwargs) -> str:
         """调用MCP工具"""
-        request = {
-            "method": "tools/call",
-            "params": {"name": tool_name, "arguments": kwargs}
-        }
-        self.process.stdin.write(json.dumps(request) + "\n")
-        self.process.stdin.flush()
-        response = json.loads(self.process.stdout.readline())
+        response = self._request("tools/call", {"name": tool_name, "arguments": kwargs})
         return json.dumps(response, ensure_ascii=False, indent=2)
     
     def _create_tools(self) -> list:
@@ -0,0 +1,167 @@
+import mmap
+import re
+from concurrent.futures import Executor
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+
+class MatchResult(NamedTuple):
+    path: str
+    size: int                # 扫描的字节数, 无法读取时为0
+    count: int               # 匹配次数
+    lines: list[dict]        # 前几个匹配行的行号和片段
+
+
+def _literal_pattern(keyword: str) -> bytes:
+    """把关键词编码为大小写不敏感的字节正则
+
+    bytes 正则的 IGNORECASE 只折叠ASCII字母, 其他大小写不同的字符(如 Ä/ä)展开为
+    各自UTF-8编码的二选一, 从而不必把文件解码为 str 也能正确匹配。
+    """
+    parts = []
+    for char in keyword:
+        variants = {char, char.lower(), char.upper()}
+        variants = {variant for variant in variants if len(variant) == 1}
+        if len(variants) > 1 and not char.isascii():
+            parts.append(b"(?:" + b"|".join(re.escape(v.encode("utf-8")) for v in sorted(variants)) + b")")
+        else:
+            parts.append(re.escape(char.encode("utf-8")))
+    return b"".join(parts)
+
+
+@lru_cache(maxsize=64)
+def compile_pattern(keyword: str, regex: bool = False) -> re.Pattern:
+    """literal模式大小写不敏感(UTF-8感知); regex模式按字节匹配, 只对ASCII字母忽略大小写"""
+    pattern = keyword.encode("utf-8") if regex else _literal_pattern(keyword)
+    return re.compile(pattern, re.IGNORECASE)
+
+
+@lru_cache(maxsize=64)
+def prefilter_needle(keyword: str) -> Optional[bytes]:
+    """关键词中最长的一段"ASCII或无大小写区分的字符", 小写后用于快速排除不匹配的文件
+
+    bytes.lower() 只转换ASCII字母, 多字节UTF-8字符不会被改变, 所以对这样的片段
+    "块转小写 + find" 与大小写不敏感匹配等价, 且比 IGNORECASE 正则快得多。
+    """
+    best = current = ""
+    for char in keyword:
+        if char.isascii() or char.lower() == char.upper():
+            current += char
+        else:
+            best, current = max(best, current, key=len), ""
+    best = max(best, current, key=len)
+    return best.lower().encode("utf-8") if best else None
+
+
+def contains(data, needle: bytes, chunk_size: int = 1 << 20) -> bool:
+    """按块转小写查找needle(已小写), 块之间重叠 len(needle)-1 字节, 内存占用固定"""
+    overlap = len(needle) - 1
+    for start in range(0, len(data), chunk_size):
+        if data[start:start + chunk_size + overlap].lower().find(needle) != -1:
+            return True
+    return False
+
+
+def _char_boundary(data, index: int, forward: bool) -> int:
+    """把切片位置移到UTF-8字符边界, 避免片段两端出现半个字符"""
+    while 0 < index < len(data) and 0x80 <= data[index] < 0xC0:
+        index += 1 if forward else -1
+    return index
+
+
+def scan_buffer(data, pattern: re.Pattern, context: int = 40,
+                max_snippets: int = 3) -> tuple[int, list[dict]]:
+    """在字节缓冲区(bytes或mmap)中查找, 返回(匹配次数, 前max_snippets个匹配行的行号和片段)"""
+    count = 0
+    snippets = []
+    line, scanned, last_line = 1, 0, None
+    for match in pattern.finditer(data):
+        count += 1
+        if len(snippets) >= max_snippets:
+            continue
+        position = match.start()
+        line += data[scanned:position].count(b"\n")
+        scanned = position
+        if line == last_line:
+            continue
+        line_start = data.rfind(b"\n", 0, position) + 1
+        line_end = data.find(b"\n", position)
+        line_end = len(data) if line_end == -1 else line_end
+        start = _char_boundary(data, max(line_start, position - context), forward=True)
+        end = _char_boundary(data, min(line_end, match.end() + context), forward=False)
+        snippet = data[start:end].decode("utf-8", errors="replace").strip()
+        if start > line_start:
+            snippet = "…" + snippet
+        if end < line_end:
+            snippet += "…"
+        snippets.append({"line": line, "snippet": snippet})
+        last_line = line
+    return count, snippets
+
+
+def scan_data(path: str, data, keyword: str, regex: bool = False, context: int = 40,
+              max_snippets: int = 3) -> MatchResult:
+    """搜索已在内存中的文件内容(bytes或mmap)"""
+    # 字面量模式先快速排除不包含关键词的文件, 只对可能匹配的文件运行正则
+    needle = None if regex else prefilter_needle(keyword)
+    if needle is not None and not contains(data, needle):
+        return MatchResult(path, len(data), 0, [])
+    count, snippets = scan_buffer(data, compile_pattern(keyword, regex), context, max_snippets)
+    return MatchResult(path, len(data), count, snippets)
+
+
+def scan_file(path: str, keyword: str, regex: bool = False, context: int = 40,
+              max_snippets: int = 3) -> MatchResult:
+    """内存映射文件并按字节搜索, 不解码整个文件, 非UTF-8文件也能匹配"""
+    try:
+        with open(path, "rb") as file:
+            size = file.seek(0, 2)
+            if size == 0:
+                return MatchResult(path, 0, 0, [])
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return scan_data(path, data, keyword, regex, context, max_snippets)
+    except (OSError, ValueError):
+        return MatchResult(path, 0, 0, [])
+
+
+def _scan_chunk(paths: list[str], keyword: str, regex: bool, context: int,
+                max_snippets: int) -> list[MatchResult]:
+    """(子进程)扫描一批文件"""
+    return [scan_file(path, keyword, regex, context, max_snippets) for path in paths]
+
+
+def scan_files(paths: Iterable, keyword: str, regex: bool = False, context: int = 40,
+               max_snippets: int = 3, pool: Optional[Executor] = None,
+               chunk_size: int = 64, prefetch: int = 4, cache=None) -> Iterator[MatchResult]:
+    """按输入顺序逐个产生扫描结果
+
+    提供 pool(进程池)时文件按 chunk_size 分批提交, 最多预先提交 prefetch 批;
+    调用方停止迭代后, 尚未开始的批次会被取消, 不会继续读取剩余文件。
+    单进程扫描时, cache(ContentCache)中已有的文件直接在缓存内容上匹配。
+    """
+    if pool is None:
+        for path in paths:
+            path = str(path)
+            data = cache.peek(path) if cache is not None else None
+            if data is not None:
+                yield scan_data(path, data, keyword, regex, context, max_snippets)
+            else:
+                yield scan_file(path, keyword, regex, context, max_snippets)
+        return
+
+    paths = iter(paths)
+    pending = []
+    try:
+        while True:
+            while len(pending) < prefetch:
+                chunk = [str(path) for path in islice(paths, chunk_size)]
+                if not chunk:
+                    break
+                pending.append(pool.submit(_scan_chunk, chunk, keyword, regex, context, max_snippets))
+            if not pending:
+                return
+            yield from pending.pop(0).result()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,223 @@
+import codecs
+import mmap
+import os
+import re
+from typing import Optional
+from walker import SNIFF_BYTES
+
+# 单次read_file最多返回的字节数
+MAX_READ_BYTES = 1024 * 1024
+
+# 按行定位时每次统计换行符的块大小
+LINE_SCAN_CHUNK = 1024 * 1024
+
+# 顺序重要: UTF-32 LE 的BOM以 UTF-16 LE 的BOM开头
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+# 定长编码单元的字节数, 切片位置需按此对齐
+UNIT_WIDTH = {"utf-16-le": 2, "utf-16-be": 2, "utf-32-le": 4, "utf-32-be": 4}
+
+# 每个字节都是完整字符的编码, 任何位置都是字符边界
+SINGLE_BYTE = {"iso8859-1", "ascii"}
+
+# GB18030、Shift_JIS、Big5等多字节编码的后续字节都不小于0x30, 这些字节之后必然是字符边界
+_SYNC_BYTE = re.compile(rb"[\x00-\x2f]")
+
+
+def _decodes(sample: bytes, encoding: str, final: bool) -> bool:
+    """样本能否按encoding严格解码; 样本被截断时允许结尾是不完整的字符"""
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=final)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def detect_encoding(sample: bytes, final: bool = False) -> tuple[Optional[str], int]:
+    """根据文件开头判断编码, 返回 (编码, BOM长度); 二进制文件返回 (None, 0)
+
+    依次检查: BOM → NUL字节(二进制) → UTF-8 → GB2312(常见中文文本, 按GB18030解码)
+    → latin-1(任意字节都能解码, 作为兜底)。GB2312 要求双字节都在高位区, 避免把
+    "é" 加ASCII字母这样的latin-1文本误判为中文。
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, len(bom)
+    if b"\0" in sample:
+        return None, 0
+    if _decodes(sample, "utf-8", final):
+        return "utf-8", 0
+    if _decodes(sample, "gb2312", final):
+        return "gb18030", 0
+    return "latin-1", 0
+
+
+class TextFile:
+    """只读内存映射的文本文件, 读取代价与返回的片段大小成正比
+
+    - 字节范围: 直接切片, 起止位置对齐到字符边界(多字节编码从附近的ASCII控制字符或标点处解码定位)
+    - 行范围: 按块统计换行符定位起始行, 不逐行解码
+    - tail: 从文件末尾向前查找换行符
+    行模式按 b"\\n" 分行, 只适用于兼容ASCII的编码(UTF-16/32除外)。
+    提供 data(如缓存中的内容)时直接在其上操作, 不打开文件。
+    """
+
+    def __init__(self, path, encoding: Optional[str] = None, data: Optional[bytes] = None):
+        self._file = None
+        if data is not None:
+            self.size, self.data = len(data), data
+        else:
+            self._file = open(path, "rb")
+            try:
+                self.size = os.fstat(self._file.fileno()).st_size
+                self.data = (mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                             if self.size else b"")
+            except Exception:
+                self._file.close()
+                raise
+        sample = self.data[:SNIFF_BYTES]
+        self.encoding, self.bom = detect_encoding(sample, final=self.size <= SNIFF_BYTES)
+        if encoding is not None:
+            codecs.lookup(encoding)
+            self.encoding = encoding
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        if self._file is not None:
+            self._file.close()
+
+    @property
+    def line_based(self) -> bool:
+        return self.encoding not in UNIT_WIDTH
+
+    def align(self, position: int, forward: bool) -> int:
+        """把字节位置限制在正文范围内并移到字符边界"""
+        position = max(self.bom, min(position, self.size))
+        width = UNIT_WIDTH.get(self.encoding)
+        if width:
+            misaligned = (position - self.bom) % width
+            if misaligned:
+                position += width - misaligned if forward else -misaligned
+            return min(position, self.size)
+        if self.encoding == "utf-8":
+            step = 1 if forward else -1
+            while self.bom < position < self.size and 0x80 <= self.data[position] < 0xC0:
+                position += step
+            return position
+        if position in (self.bom, self.size) or codecs.lookup(self.encoding).name in SINGLE_BYTE:
+            return position
+        start = self._char_start(position)
+        return self._char_end(start) if forward and start < position else start
+
+    def _char_start(self, position: int) -> int:
+        """(多字节编码)position所在字符的起始位置: 从之前最近的同步字节开始增量解码到position"""
+        window, sync = 256, self.bom
+        while True:
+            low = max(self.bom, position - window)
+            last = None
+            for last in _SYNC_BYTE.finditer(self.data, low, position):
+                pass
+            if last is not None or low == self.bom:
+                sync = last.end() if last is not None else self.bom
+                break
+            window *= 16
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        for chunk_start in range(sync, position, LINE_SCAN_CHUNK):
+            decoder.decode(self.data[chunk_start:min(chunk_start + LINE_SCAN_CHUNK, position)])
+        # 解码器缓存的是末尾不完整字符的字节
+        return position - len(decoder.getstate()[0])
+
+    def _char_end(self, start: int) -> int:
+        """(多字节编码)从字符起始位置start开始的这个字符的结束位置"""
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        end = start
+        while end < self.size:
+            end += 1
+            if decoder.decode(self.data[end - 1:end]) and not decoder.getstate()[0]:
+                break
+        return end
+
+    def decode(self, start: int, end: int) -> str:
+        return self.data[start:end].decode(self.encoding, errors="replace")
+
+    def byte_range(self, offset: int, length: int) -> tuple[int, int]:
+        start = self.align(offset, forward=True)
+        end = self.align(start + length, forward=False)
+        if end == start < self.size:
+            # length小于一个字符时至少返回一个字符, 保证续读能前进
+            end = self.align(start + 1, forward=True)
+        return start, end
+
+    def line_offset(self, line: int) -> int:
+        """第line行(从1开始)的起始字节; 超出文件行数时返回文件大小"""
+        position, current = self.bom, 1
+        while current < line and position < self.size:
+            chunk_end = min(position + LINE_SCAN_CHUNK, self.size)
+            newlines = self.data[position:chunk_end].count(b"\n")
+            if current + newlines < line:
+                current += newlines
+                position = chunk_end
+                continue
+            while current < line:
+                position = self.data.find(b"\n", position, chunk_end) + 1
+                current += 1
+        return position if current == line else self.size
+
+    def lines_end(self, start: int, count: Optional[int], limit: int) -> tuple[int, int, bool]:
+        """从start开始读count行(None表示不限), 不超过limit字节
+
+        返回 (结束位置, 读到的行数, 是否因字节上限截断)。第一行本身超过上限时
+        按字节截断并计为一行, 保证续读能前进。
+        """
+        stop = min(self.size, start + limit)
+        position, lines = start, 0
+        while (count is None or lines < count) and position < stop:
+            newline = self.data.find(b"\n", position, stop)
+            if newline != -1:
+                position = newline + 1
+            elif stop == self.size:
+                position = stop
+            elif lines == 0:
+                return self.align(stop, forward=False), 1, True
+            else:
+                return position, lines, True
+            lines += 1
+        truncated = position < self.size and (count is None or lines < count)
+        return position, lines, truncated
+
+    def tail_offset(self, count: int, limit: int) -> tuple[int, bool]:
+        """最后count行的起始字节, 超过limit字节时从上限内的第一个完整行开始
+
+        文件末尾的换行符不算作空行。返回 (起始位置, 是否因字节上限截断)。
+        向前查找换行符时不越过字节上限, 超长的行或大量短行都不会扫描上限以外的内容。
+        """
+        position = self.size
+        if position > self.bom and self.data[position - 1] == 0x0A:
+            position -= 1
+        # 起始位置不能早于 size - limit, 即行首的换行符不能早于 floor
+        floor = self.size - limit - 1
+        for _ in range(count):
+            newline = self.data.rfind(b"\n", max(floor, self.bom), position)
+            if newline == -1:
+                if floor >= self.bom:
+                    break
+                return self.bom, False
+            position = newline
+        else:
+            return position + 1, False
+        cut = self.size - limit
+        newline = self.data.find(b"\n", cut, self.size - 1)
+        return (newline + 1 if newline != -1 else self.align(cut, forward=True)), True
@@ -0,0 +1,45 @@
+import base64
+import json
+from concurrent.futures import Executor
+from typing import Iterable, Iterator, Optional
+from matcher import scan_files
+
+
+def encode_cursor(state: dict) -> str:
+    """续查游标: 记录目录、关键词和已处理的候选文件数"""
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise ValueError(f"无效的cursor:{cursor}")
+
+
+def search_files_iter(files: Iterable, keyword: str, regex: bool = False, context: int = 40,
+                      max_snippets: int = 3, pool: Optional[Executor] = None,
+                      check_cancelled=None, cache=None) -> Iterator[tuple[int, int, Optional[dict]]]:
+    """逐个匹配候选文件, 惰性产生 (候选序号, 读取字节数, 结果或None)
+
+    调用方拿够结果或超出字节预算时停止迭代, 剩余文件不会被读取。
+    匹配在字节上进行(见 matcher), 文件数较多时可交给进程池分批并行。
+    提供 cache 时优先使用缓存内容, 匹配到的文件被读入缓存, 随后的 read_file 直接命中。
+    """
+    matches = scan_files(files, keyword, regex, context, max_snippets, pool=pool, cache=cache)
+    try:
+        for position, match in enumerate(matches):
+            if check_cancelled is not None:
+                check_cancelled()
+            result = None
+            if match.count:
+                result = {"path": match.path, "matches": match.count, "lines": match.lines}
+                if cache is not None:
+                    try:
+                        cache.warm(match.path)
+                    except OSError:
+                        pass
+            yield position, match.size, result
+    finally:
+        matches.close()
@@ -0,0 +1,192 @@
+import fnmatch
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+# 默认忽略的目录和文件(按名称匹配)
+DEFAULT_IGNORES = (".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", ".DS_Store")
+
+# 判断二进制文件时读取的字节数
+SNIFF_BYTES = 8192
+
+
+def is_binary(path: str) -> bool:
+    """开头包含NUL字节视为二进制文件; 无法读取时也视为二进制(跳过)"""
+    try:
+        with open(path, "rb") as file:
+            return b"\0" in file.read(SNIFF_BYTES)
+    except OSError:
+        return True
+
+
+class WalkEntry(NamedTuple):
+    path: str        # 完整路径
+    rel: str         # 相对遍历根目录(或指定的base)的路径, 以 / 分隔
+    depth: int       # 根目录下的直接子项深度为1
+    is_dir: bool
+    size: int
+    mtime_ns: int
+
+
+class IgnoreRules:
+    """gitignore风格的忽略规则(支持 # 注释、! 取反、/ 结尾只匹配目录、含 / 的规则相对所在目录)
+
+    每条规则记录所属目录, 进入子目录时追加该目录下 .gitignore 中的规则; 后出现的规则优先。
+    """
+
+    def __init__(self, rules: tuple = ()):
+        self.rules = rules
+
+    @staticmethod
+    def parse(lines, base: str = "") -> tuple:
+        rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if line.startswith("**/"):
+                line = line[3:]
+            anchored = "/" in line
+            rules.append((base, line.lstrip("/"), negate, dir_only, anchored))
+        return tuple(rules)
+
+    def child(self, dir_path: str, dir_rel: str) -> "IgnoreRules":
+        """进入目录时合并该目录下的 .gitignore"""
+        try:
+            with open(os.path.join(dir_path, ".gitignore"), encoding="utf-8", errors="replace") as file:
+                extra = self.parse(file, dir_rel)
+        except OSError:
+            return self
+        return IgnoreRules(self.rules + extra) if extra else self
+
+    def ignored(self, rel: str, name: str, is_dir: bool) -> bool:
+        result = False
+        for base, pattern, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            target = rel
+            if base:
+                if not rel.startswith(base + "/"):
+                    continue
+                target = rel[len(base) + 1:]
+            if fnmatch.fnmatchcase(target if anchored else name, pattern):
+                result = not negate
+        return result
+
+
+def _scan(path: str) -> list[os.DirEntry]:
+    try:
+        with os.scandir(path) as entries:
+            return sorted(entries, key=lambda entry: entry.name)
+    except OSError:
+        return []
+
+
+class Walker:
+    """基于 os.scandir 的目录遍历, 供搜索、索引和目录列表共用
+
+    - 按层遍历, 同一层的目录在线程池中并发读取, 输出顺序固定(逐层、按名称排序)
+    - 超过 max_depth 的目录不会被读取, 而不是读取后再丢弃
+    - 大小和修改时间取自 DirEntry 的缓存信息, 每个条目最多一次stat
+    - 符号链接指向的目录不进入, 避免循环
+    """
+
+    def __init__(self, ignore_globs: Optional[list[str]] = None, use_gitignore: bool = True,
+                 max_workers: int = 4):
+        self.ignore_globs = list(DEFAULT_IGNORES if ignore_globs is None else ignore_globs)
+        self.use_gitignore = use_gitignore
+        self._base_rules = IgnoreRules(IgnoreRules.parse(self.ignore_globs))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fs-walker")
+
+    def walk(self, root, max_depth: Optional[int] = None, include_dirs: bool = False,
+             skip_binary: bool = False, ignore: bool = True, base=None) -> Iterator[WalkEntry]:
+        """遍历root; 指定base(root的上级目录)时rel相对base, base到root沿途的忽略规则同样生效"""
+        root = str(root)
+        base = root if base is None else str(base)
+        root_rel = "" if base == root else Path(os.path.relpath(root, base)).as_posix()
+        rules = None
+        if ignore:
+            rules = self._base_rules.child(base, "") if self.use_gitignore else self._base_rules
+            dir_path, dir_rel = base, ""
+            for name in root_rel.split("/") if root_rel else ():
+                dir_path = os.path.join(dir_path, name)
+                dir_rel = f"{dir_rel}/{name}" if dir_rel else name
+                if rules.ignored(dir_rel, name, True):
+                    return
+                if self.use_gitignore:
+                    rules = rules.child(dir_path, dir_rel)
+        level = [(root, root_rel, rules)]
+        depth = 1
+        while level:
+            listings = self._executor.map(_scan, [dir_path for dir_path, _, _ in level])
+            next_level = []
+            for (dir_path, dir_rel, dir_rules), entries in zip(level, listings):
+                for entry in entries:
+                    rel = f"{dir_rel}/{entry.name}" if dir_rel else entry.name
+                    try:
+                        is_dir = entry.is_dir()
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if dir_rules is not None and dir_rules.ignored(rel, entry.name, is_dir):
+                        continue
+                    if is_dir:
+                        if include_dirs:
+                            yield WalkEntry(entry.path, rel, depth, True, 0, stat.st_mtime_ns)
+                        if (max_depth is None or depth < max_depth) and not entry.is_symlink():
+                            child_rules = dir_rules
+                            if dir_rules is not None and self.use_gitignore:
+                                child_rules = dir_rules.child(entry.path, rel)
+                            next_level.append((entry.path, rel, child_rules))
+                        continue
+                    if skip_binary and is_binary(entry.path):
+                        continue
+                    yield WalkEntry(entry.path, rel, depth, False, stat.st_size, stat.st_mtime_ns)
+            level = next_level
+            depth += 1
+
+    def summarize(self, root, max_depth: int, pattern: Optional[str] = None,
+                  ignore: bool = False, check=None) -> list[dict]:
+        """按目录汇总: 每个目录的直接文件数、子目录数, 以及子树内(不超过max_depth)的文件总数和总大小
+
+        只输出目录而不列出文件; pattern(glob, 按文件名)限制参与统计的文件。
+        处于深度上限的目录不会被读取, 其统计为0; 它和所有上级目录标记 complete=False。
+        """
+        root_stat = os.stat(root)
+        nodes = {"": {"path": ".", "depth": 0, "files": 0, "directories": 0,
+                      "total_files": 0, "total_size": 0, "mtime_ns": root_stat.st_mtime_ns,
+                      "complete": True}}
+        for entry in self.walk(root, max_depth=max_depth, include_dirs=True, ignore=ignore):
+            if check is not None:
+                check()
+            parent = nodes[entry.rel.rpartition("/")[0]]
+            if entry.is_dir:
+                parent["directories"] += 1
+                nodes[entry.rel] = {"path": entry.rel, "depth": entry.depth, "files": 0, "directories": 0,
+                                    "total_files": 0, "total_size": 0, "mtime_ns": entry.mtime_ns,
+                                    "complete": entry.depth < max_depth}
+            elif pattern is None or fnmatch.fnmatch(entry.rel.rpartition("/")[2], pattern):
+                parent["files"] += 1
+                parent["total_files"] += 1
+                parent["total_size"] += entry.size
+        # 由深到浅把子目录的合计累加到父目录
+        for rel in sorted(nodes, key=lambda rel: -nodes[rel]["depth"]):
+            if rel:
+                node, parent = nodes[rel], nodes[rel.rpartition("/")[0]]
+                parent["total_files"] += node["total_files"]
+                parent["total_size"] += node["total_size"]
+                parent["complete"] = parent["complete"] and node["complete"]
+        return list(nodes.values())
+
+    def files(self, root, max_depth: Optional[int] = None, skip_binary: bool = False) -> Iterator[Path]:
+        for entry in self.walk(root, max_depth, skip_binary=skip_binary):
+            yield Path(entry.path)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,126 @@
+import os
+import tempfile
+from pathlib import Path
+
+WRITE_MODES = ("write", "append", "edit")
+
+# 新建文件的权限按进程umask计算(mkstemp创建的临时文件权限为0600)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class EditError(ValueError):
+    """编辑无法应用: 找不到搜索文本、匹配不唯一或行号超出范围"""
+
+
+def atomic_write(path: Path, data: bytes, fsync: bool = False):
+    """先写同目录下的临时文件再重命名替换, 其他进程只会看到旧内容或完整的新内容
+
+    保留已有文件的权限位; fsync=True 时在重命名前后分别同步文件和目录, 断电后也不会丢失。
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            if fsync:
+                os.fsync(file.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def append_bytes(path: Path, data: bytes, fsync: bool = False):
+    """追加写入, 只写新增部分(不重写整个文件)"""
+    with open(path, "ab") as file:
+        file.write(data)
+        file.flush()
+        if fsync:
+            os.fsync(file.fileno())
+
+
+def _line_span(text: str, start_line: int, end_line: int) -> tuple[int, int]:
+    """第start_line到end_line行(包含, 从1开始)的字符范围; end_line = start_line-1 表示在该行前插入"""
+    position = 0
+    for _ in range(start_line - 1):
+        newline = text.find("\n", position)
+        if newline == -1:
+            raise EditError(f"起始行{start_line}超出文件行数")
+        position = newline + 1
+    start = position
+    for line in range(start_line, end_line + 1):
+        if position >= len(text):
+            raise EditError(f"结束行{end_line}超出文件行数(共{line - 1}行)")
+        newline = text.find("\n", position)
+        position = len(text) if newline == -1 else newline + 1
+    return start, position
+
+
+def apply_edits(text: str, edits: list[dict], encoding: str) -> tuple[str, dict]:
+    """按顺序应用编辑, 每个编辑作用于前一个编辑的结果; 任一编辑失败时抛出EditError, 整体不生效
+
+    编辑格式:
+      {"search": 原文本, "replace": 新文本, "all": 是否替换全部(默认只允许唯一匹配)}
+      {"start_line": n, "end_line": m, "content": 新内容}  替换第n到m行; m = n-1 时在第n行前插入
+    返回 (新文本, 统计), 统计中的字节数按文件编码计算。
+    """
+    stats = {"edits": len(edits), "replacements": 0, "removed_bytes": 0, "inserted_bytes": 0}
+
+    def size(value: str) -> int:
+        return len(value.encode(encoding))
+
+    for number, edit in enumerate(edits, 1):
+        if not isinstance(edit, dict):
+            raise EditError(f"第{number}个编辑必须是对象")
+        if "search" in edit:
+            search, replace = edit["search"], edit.get("replace", "")
+            if not isinstance(search, str) or not search or not isinstance(replace, str):
+                raise EditError(f"第{number}个编辑: search必须是非空字符串, replace必须是字符串")
+            count = text.count(search)
+            if count == 0:
+                raise EditError(f"第{number}个编辑: 未找到搜索文本")
+            if count > 1 and not edit.get("all"):
+                raise EditError(f"第{number}个编辑: 搜索文本出现{count}次, 请提供更多上下文或设置all")
+            text = text.replace(search, replace) if edit.get("all") else text.replace(search, replace, 1)
+            stats["replacements"] += count if edit.get("all") else 1
+            stats["removed_bytes"] += size(search) * (count if edit.get("all") else 1)
+            stats["inserted_bytes"] += size(replace) * (count if edit.get("all") else 1)
+        elif "start_line" in edit:
+            start_line = edit["start_line"]
+            end_line = edit.get("end_line", start_line)
+            content = edit.get("content", "")
+            if (not isinstance(start_line, int) or not isinstance(end_line, int)
+                    or start_line < 1 or end_line < start_line - 1):
+                raise EditError(f"第{number}个编辑: 行号无效")
+            if not isinstance(content, str):
+                raise EditError(f"第{number}个编辑: content必须是字符串")
+            try:
+                start, end = _line_span(text, start_line, end_line)
+            except EditError as e:
+                raise EditError(f"第{number}个编辑: {e}")
+            removed = text[start:end]
+            # 新内容缺少结尾换行时补上, 避免与下一行连在一起
+            if content and not content.endswith("\n") and (removed.endswith("\n") or (start == end < len(text))):
+                content += "\n"
+            text = text[:start] + content + text[end:]
+            stats["replacements"] += 1
+            stats["removed_bytes"] += size(removed)
+            stats["inserted_bytes"] += size(content)
+        else:
+            raise EditError(f"第{number}个编辑缺少search或start_line")
+    return text, stats